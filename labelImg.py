@@ -4,11 +4,11 @@ import codecs
 import distutils.spawn
 import os
 import shutil
+import sqlite3
 import platform
 import re
 import sys
 import subprocess
-import xml.etree.ElementTree as EleTr
 
 from datetime import datetime
 from functools import partial
@@ -42,87 +42,80 @@ from libs.labelDialog import LabelDialog
 from libs.colorDialog import ColorDialog
 from libs.labelFile import LabelFile, LabelFileError
 from libs.toolBar import ToolBar
-from libs.pascal_voc_io import PascalVocReader
+from libs.pascal_voc_io import PascalVocReader, PascalVocWriter
 from libs.pascal_voc_io import XML_EXT
-from libs.yolo_io import YoloReader
 from libs.yolo_io import TXT_EXT
 from libs.ustr import ustr
+from libs.core import Box, addBoxes
 from libs.version import __version__
 from libs.hashableQListWidgetItem import HashableQListWidgetItem
+from libs.imageCache import ImageCache, DEFAULT_CACHE_SIZE, fileStamp
+from libs.imageSize import imageSize
+from libs.prefetcher import Prefetcher, DEFAULT_PREFETCH_NEXT, DEFAULT_PREFETCH_PREV
+from libs.undoStack import UndoStack, DEFAULT_UNDO_LIMIT
+from libs.historyModel import HistoryModel
+from libs.saveQueue import SaveQueue
+from libs.annotationIndex import AnnotationIndex, AnnotationIndexer, indexPath
+from libs.fileListModel import FileListModel
+from libs.dirScanner import DirScanner, iterImages, imageExtensions
+from libs.dirWatcher import DirWatcher
+from libs.undoJournal import JournalWriter, UndoJournal, journalPath, readJournal, decodeEdit, decodeState, \
+    BASE, RECORD, UNDO, REDO, SAVED
 
 __appname__ = 'labelImg'
 
 def xml_object_finder(xml_file):
-    tree = EleTr.parse(xml_file)
-    root = tree.getroot()
-    ob_ori = root.find('object')
-    output_TF = bool(ob_ori)
-    return output_TF
-
-def annoDuplicatecheck(objectlist, namelist):
-    for a in objectlist:
-        name = a.find('name').text
-        points = a.find('bndbox')
-        xmin = points.find('xmin').text
-        ymin = points.find('ymin').text
-        xmax = points.find('xmax').text
-        ymax = points.find('ymax').text
-        namelist.append([name, xmin, ymin, xmax, ymax])
+    return bool(PascalVocReader(xml_file).shapes)
+
+def annoDuplicatecheck(shapes, namelist):
+    for shape in shapes:
+        box = Box.fromShape(shape)
+        namelist.append([box.label, box.xmin, box.ymin, box.xmax, box.ymax])
 
     return namelist
 
-def next_xml_maker(pre_xml_name, next_xml_name, next_jpg_name):
-    tree = EleTr.parse(pre_xml_name)
-    root = tree.getroot()
-    f_ori = root.find('filename')
-    p_ori = root.find('path')
+def next_xml_writer(prereader, next_jpg_name):
+    """Writer for next_jpg_name holding the header read from the previous annotation."""
     slashpoint = next_jpg_name.rfind('\\')
+    imgSize = prereader.imgSize or LabelFile.imageShape(next_jpg_name)
+    writer = PascalVocWriter(os.path.basename(os.path.dirname(next_jpg_name)),
+                             next_jpg_name[slashpoint+1:], imgSize, localImgPath=next_jpg_name)
+    writer.verified = prereader.verified
+    return writer
 
-    f_ori.text = next_jpg_name[slashpoint+1:]
-    p_ori.text = next_jpg_name
-    tree.write(next_xml_name, encoding="UTF-8")
-
-def xmlmerge(prexml, nextxml, nextjpg):
-    pretree = EleTr.parse(prexml)
-    preroot = pretree.getroot()
-    prefilename = preroot.find('filename')
-    prepath = preroot.find('path')
+def next_xml_maker(prereader, next_xml_name, next_jpg_name, saveQueue):
+    writer = next_xml_writer(prereader, next_jpg_name)
+    addBoxes(writer, [Box.fromShape(shape) for shape in prereader.shapes])
+    LabelFile.write(writer.files(targetFile=next_xml_name), saveQueue)
 
-    slashpoint = nextjpg.rfind('\\')
-    prefilename.text = nextjpg[slashpoint+1:]
-    prepath.text = nextjpg
-
-    tree = EleTr.parse(nextxml)
-    root = tree.getroot()
-    addobject = root.findall('object')
-    preobjectall = preroot.findall('object')
+def xmlmerge(prereader, nextreader, nextxml, nextjpg, saveQueue):
+    writer = next_xml_writer(prereader, nextjpg)
 
     originlist = []
     addlist = []
 
-    originlist = annoDuplicatecheck(preobjectall, originlist)
-    addlist = annoDuplicatecheck(addobject, addlist)
+    originlist = annoDuplicatecheck(prereader.shapes, originlist)
+    addlist = annoDuplicatecheck(nextreader.shapes, addlist)
 
-    for aa in range(0, len(addobject)):
+    boxes = [Box.fromShape(shape) for shape in prereader.shapes]
+    for aa in range(0, len(nextreader.shapes)):
         if addlist[aa] not in originlist:
-            preroot.append(addobject[aa])
-    pretree.write(nextxml, encoding="UTF-8")
+            boxes.append(Box.fromShape(nextreader.shapes[aa]))
+    addBoxes(writer, boxes)
+    LabelFile.write(writer.files(targetFile=nextxml), saveQueue)
 
-def previmageSize(filename):
+def previmageSize(reader):
     # based by xmlfile
-    tree = EleTr.parse(filename)
-    root = tree.getroot()
-    size = root.find('size')
-    width = size.find('width')
-    height = size.find('height')
-    return [int(width.text), int(height.text)]
+    if reader.imgSize is None:
+        return None
+    return [reader.imgSize[1], reader.imgSize[0]]
 
 def nextimageSize(filename):
-    # based by imgfile
-    nextImage = read(ustr(filename), None)
-    nextImage = QImage.fromData(nextImage)
-    nextImage = (QPixmap.fromImage(nextImage))
-    return [nextImage.width(), nextImage.height()]
+    # based by imgfile header
+    size = imageSize(ustr(filename))
+    if size is None:
+        return [0, 0]
+    return [size[0], size[1]]
 
 class WindowMixin(object):
 
@@ -184,8 +177,20 @@ class MainWindow(QMainWindow, WindowMixin):
         self.resizeStatus = False
 
         # Undo / Redo
-        self.undoList = []
-        self.redoList = []
+        self.undoStack = UndoStack(self.shapeUndoState, self.shapeUndoVersion)
+        self.history = HistoryModel(self.undoStack, self)
+        # On-disk log of the history of the current image
+        self.journalWriter = JournalWriter(self)
+        self.journalWriter.failed.connect(self.journalFailed)
+        self.journal = None
+        # Annotations are written behind the UI
+        # Saved through the directory watcher, which then need not rescan
+        self.saveQueue = SaveQueue(self, write=lambda path, data: self.dirWatcher.writeAtomic(path, data))
+        self.saveQueue.failed.connect(self.saveFailed)
+        # Dataset-wide facts about the open directory
+        self.annotationIndex = None
+        self.indexer = AnnotationIndexer(self)
+        self.indexer.failed.connect(self.indexFailed)
         self.mergeShapeChecker = False
 
         #Auto Input
@@ -360,8 +365,23 @@ class MainWindow(QMainWindow, WindowMixin):
         currenttotalQHBoxLayout.addWidget(self.currenttotalLabel)
         currenttotalQHBoxLayout.addWidget(self.currenttotalBrowser)
 
-        self.fileListWidget = QListWidget()
-        self.fileListWidget.itemDoubleClicked.connect(self.fileitemDoubleClicked)
+        # Filled in batches while the directory is scanned
+        self.fileListModel = FileListModel(self)
+        self.mImgList = self.fileListModel.paths
+        self.scanner = DirScanner(self)
+        self.scanner.found.connect(self.imagesFound)
+        self.scanner.finished.connect(self.scanFinished)
+        self.scanner.failed.connect(self.scanFailed)
+        self.scanGeneration = None
+        # Then kept up to date with the directory
+        self.dirWatcher = DirWatcher(self)
+        self.dirWatcher.added.connect(self.imagesAdded)
+        self.dirWatcher.removed.connect(self.imagesRemoved)
+        self.dirWatcher.failed.connect(self.watchFailed)
+        self.fileListWidget = QListView()
+        self.fileListWidget.setUniformItemSizes(True)
+        self.fileListWidget.setModel(self.fileListModel)
+        self.fileListWidget.doubleClicked.connect(self.fileitemDoubleClicked)
         filelistLayout = QVBoxLayout()
         filelistLayout.setContentsMargins(0, 0, 0, 0)
         filelistLayout.addLayout(currenttotalQHBoxLayout)
@@ -375,12 +395,13 @@ class MainWindow(QMainWindow, WindowMixin):
         # undo dock
         executedlistLayout = QVBoxLayout()
         executedlistLayout.setContentsMargins(0, 0, 0, 0)
-        self.executedList = QListWidget()
+        self.executedList = QListView()
+        self.executedList.setModel(self.history)
+        self.executedList.setUniformItemSizes(True)
         executedListContainer = QWidget()
         executedListContainer.setLayout(executedlistLayout)
 
-        # self.executedList.itemActivated.connect(self.undoSelectionChanged)
-        #self.executedList.itemSelectionChanged.connect(self.undoSelectionChanged)
+        self.executedList.clicked.connect(self.undoSelectionChanged)
 
         executedlistLayout.addWidget(self.executedList)
 
@@ -812,6 +833,24 @@ class MainWindow(QMainWindow, WindowMixin):
         # Add Chris
         self.difficult = False
 
+        # Decoded images and parsed annotations shared by loading, prefetching and auto-copy
+        self.imageCache = ImageCache(settings.get(SETTING_CACHE_SIZE, DEFAULT_CACHE_SIZE) * 1024 * 1024)
+
+        # Read and decode the neighbouring images in the background
+        self.prefetcher = Prefetcher(self.imageCache, self.annotationPaths,
+                                     settings.get(SETTING_PREFETCH_NEXT, DEFAULT_PREFETCH_NEXT),
+                                     settings.get(SETTING_PREFETCH_PREV, DEFAULT_PREFETCH_PREV),
+                                     parent=self)
+        self.prefetcher.loaded.connect(self.asyncLoaded)
+        self.prefetcher.failed.connect(self.prefetchFailed)
+
+        self.undoStack.limit = max(1, settings.get(SETTING_UNDO_LIMIT, DEFAULT_UNDO_LIMIT))
+
+        # (filePath, callback) of the image being decoded by loadFileAsync
+        self.pendingLoad = None
+        # (filePath, row) once the image on screen has been removed from mImgList
+        self.removedRow = None
+
         ## Fix the compatible issue for qt4 and qt5. Convert the QStringList to python list
         if settings.get(SETTING_RECENT_FILES):
             if have_qstring():
@@ -1080,9 +1119,9 @@ class MainWindow(QMainWindow, WindowMixin):
         self.shapesToItems.clear()
         self.labelList.clear()
 
-        self.undoList = []
-        self.redoList = []
-        self.executedList.clear()
+        # Leaving unsaved changes behind means they were discarded
+        self.closeJournal(discard=self.dirty)
+        self.history.clear()
 
         self.cancelCutmethod()
         self.filePath = None
@@ -1222,7 +1261,7 @@ class MainWindow(QMainWindow, WindowMixin):
                     self.undoAppend('라벨 이름 수정 (' + undotext + ") -> (" + self.canvas.selectedShape.label + ")")
 
     # Tzutalin 20160906 : Add file list and dock to move faster
-    def fileitemDoubleClicked(self, item=None):
+    def fileitemDoubleClicked(self, index):
         if self.autoSaving.isChecked():
             if self.defaultSaveDir is not None:
                 if self.dirty is True:
@@ -1234,11 +1273,8 @@ class MainWindow(QMainWindow, WindowMixin):
         if not self.mayContinue():
             return
 
-        currIndex = self.mImgList.index(ustr(item.text()))
-        if currIndex < len(self.mImgList):
-            filename = self.mImgList[currIndex]
-            if filename:
-                self.loadFile(filename)
+        if index.isValid():
+            self.loadFileAsync(self.fileListModel.path(index.row()))
 
     # Add chris
     def btnstate(self, item= None):
@@ -1381,12 +1417,14 @@ class MainWindow(QMainWindow, WindowMixin):
                 if annotationFilePath[-4:].lower() != ".xml":
                     annotationFilePath += XML_EXT
                 self.labelFile.savePascalVocFormat(annotationFilePath, shapes, self.filePath, self.imageData,
-                                                   self.lineColor.getRgb(), self.fillColor.getRgb())
+                                                   self.lineColor.getRgb(), self.fillColor.getRgb(),
+                                                   saveQueue=self.saveQueue)
             elif self.usingYoloFormat is True:
                 if annotationFilePath[-4:].lower() != ".txt":
                     annotationFilePath += TXT_EXT
                 self.labelFile.saveYoloFormat(annotationFilePath, shapes, self.filePath, self.imageData, self.labelHist,
-                                                   self.lineColor.getRgb(), self.fillColor.getRgb())
+                                                   self.lineColor.getRgb(), self.fillColor.getRgb(),
+                                                   saveQueue=self.saveQueue)
             else:
                 self.labelFile.save(annotationFilePath, shapes, self.filePath, self.imageData,
                                     self.lineColor.getRgb(), self.fillColor.getRgb())
@@ -1397,6 +1435,32 @@ class MainWindow(QMainWindow, WindowMixin):
             self.errorMessage(u'Error saving label data', u'<b>%s</b>' % e)
             return False
 
+    def saveFailed(self, path, reason):
+        """A queued write did not reach the disk: keep the changes unsaved."""
+        if self.filePath is not None and ustr(path) in self.annotationPaths(self.filePath):
+            self.setDirty()
+        self.errorMessage(u'Error saving label data', u'<b>%s</b><br/>%s' % (path, reason))
+
+    def indexFailed(self, path, reason):
+        """Indexing is best effort: lookups fall back to reading the files."""
+        self.status(u'Indexing %s failed: %s' % (path, reason))
+
+    def scanFailed(self, path, reason):
+        """A folder could not be listed and is left out, or the scan cache could not be written."""
+        self.status(u'Scanning %s failed: %s' % (path, reason))
+
+    def watchFailed(self, path, reason):
+        """A changed folder could not be listed; it is tried again on its next change."""
+        self.status(u'Watching %s failed: %s' % (path, reason))
+
+    def journalFailed(self, path, reason):
+        """The undo journal could not be written; editing goes on without it."""
+        self.status(u'Writing undo journal %s failed: %s' % (path, reason))
+
+    def prefetchFailed(self, path, reason):
+        """Reading ahead failed; loading the image will tell if it matters."""
+        self.status(u'Prefetch failed for %s: %s' % (path, reason))
+
     def copySelectedShape(self):
         if self.canvas.selectedShape:
             self.addLabel(self.canvas.copySelectedShape())
@@ -1420,6 +1484,7 @@ class MainWindow(QMainWindow, WindowMixin):
         if label != shape.label:
             shape.label = item.text()
             shape.line_color = self.presetColorSelect(shape.label)
+            self.canvas.invalidateLayer()
             self.setDirty()
         else:  # User probably changed item visibility
             self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
@@ -1850,11 +1915,17 @@ class MainWindow(QMainWindow, WindowMixin):
 
     def emptyLabeldelete(self):
         xmlpath = self.filePath[:-4] + ".xml"
+        self.saveQueue.wait(xmlpath)
         xmlexist = os.path.isfile(xmlpath)
         if xmlexist is True:
            os.remove(xmlpath)
+        if self.annotationIndex is not None:
+            self.indexer.update(self.annotationIndex, self.filePath)
 
     def fileDeletemethod(self):
+        if self.filePath not in self.mImgList:
+            # Already removed from outside
+            return
         question = self.deleteMessage()
         imglistlength = len(self.mImgList)
         if question == QMessageBox.No:
@@ -1862,17 +1933,19 @@ class MainWindow(QMainWindow, WindowMixin):
         else:
             deleteindex = self.mImgList.index(self.filePath)
             deletefilepath = self.filePath
-            del self.mImgList[deleteindex]
-            self.fileListWidget.takeItem(deleteindex)
+            self.fileListModel.removeRow(deleteindex)
             self.dirty = False
             self.appendDeletefilenameLog()
 
             xmlpath = deletefilepath[:-4] + ".xml"
+            self.saveQueue.wait(xmlpath)
             xmlexist = os.path.isfile(xmlpath)
 
             if xmlexist is True:
                 os.remove(xmlpath)
             os.remove(deletefilepath)
+            if self.annotationIndex is not None:
+                self.annotationIndex.remove(deletefilepath)
 
             if imglistlength == 1:
                 self.infoMessage('Message', '이미지가 한 장 뿐입니다. 삭제 후 폴더 열기로 넘어갑니다.')
@@ -1969,44 +2042,71 @@ class MainWindow(QMainWindow, WindowMixin):
 
 # undo / redo method
 
-    def undoShapedatamake(self):
-        currentshapes = []
-        for ccc in self.canvas.shapes:
-            tempxy = []
-            for xyxy in ccc.points:
-                tempxy.append((xyxy.x(), xyxy.y()))
-            currentshapes.append((ccc.label, tempxy, None, None, ccc.difficult))
-
-        return currentshapes
-
-    def undoShapevisible(self):
-        visibleShapelist = []
-        for i in range(0, len(self.canvas.shapes)):
-            check = self.labelList.item(i).checkState()
-            if check == Qt.Unchecked:
-                visibleShapelist.append(i)
-
-        return visibleShapelist
-
-    def reloadShapes(self, currentshapes):
-        self.itemsToShapes.clear()
-        self.shapesToItems.clear()
-        self.labelList.clear()
-        self.labelCoordinates.clear()
-
-        self.loadLabels(currentshapes)
-
-        if self.labelList.count() > 0:
-            self.labelList.setCurrentItem(self.labelList.item(self.labelList.count() - 1))
-            self.labelList.item(self.labelList.count() - 1).setSelected(True)
+    def shapeUndoState(self, shape):
+        return (shape.label, tuple((p.x(), p.y()) for p in shape.points),
+                shape.difficult, self.canvas.isVisible(shape))
+
+    def shapeUndoVersion(self, shape):
+        return (shape.revision, shape.label, shape.difficult, self.canvas.isVisible(shape))
+
+    def restoreShapeState(self, shape, state):
+        label, points, difficult, visible = state
+        if shape.label != label:
+            shape.label = label
+            shape.line_color = self.presetColorSelect(label)
+            shape.fill_color = self.presetColorSelect(label)
+        if [(p.x(), p.y()) for p in shape.points] != list(points):
+            shape.points = [QPointF(x, y) for x, y in points]
+        shape.difficult = difficult
+        self.canvas.visible[shape] = visible
+
+        item = self.shapesToItems.get(shape)
+        if item is not None:
+            item.setText(label)
+            item.setBackground(self.presetColorLightSelect(label))
+            item.setCheckState(Qt.Checked if visible else Qt.Unchecked)
+
+    def insertLabel(self, row, shape):
+        self.addLabel(shape)
+        item = self.shapesToItems[shape]
+        item.setCheckState(Qt.Checked if self.canvas.isVisible(shape) else Qt.Unchecked)
+        if row < self.labelList.count() - 1:
+            self.labelList.takeItem(self.labelList.count() - 1)
+            self.labelList.insertItem(row, item)
+
+    def applyShapeEdit(self, edit):
+        """Patch the canvas and the label list with an edit of the undo stack."""
+        self.canvas.deSelectShape()
+        self.canvas.hShape = None
+        self.labelList.blockSignals(True)
+        for index, shape, state in reversed(edit.removed):
+            self.canvas.removeShape(shape)
+            self.remLabel(shape)
+        for index, shape, state in edit.inserted:
+            self.restoreShapeState(shape, state)
+            self.canvas.insertShape(index, shape)
+            self.insertLabel(index, shape)
+        for shape, before, after in edit.changed:
+            self.restoreShapeState(shape, after)
+            self.canvas.shapeChanged(shape)
+        self.labelList.blockSignals(False)
+        self.canvas.invalidateLayer()
+
+        touched = [shape for _, shape, _ in edit.inserted] + [shape for shape, _, _ in edit.changed]
+        touched = [shape for shape in touched if self.canvas.isVisible(shape)]
+        if touched:
+            item = self.shapesToItems[touched[-1]]
+        else:
+            item = self.labelList.item(self.labelList.count() - 1)
+        if item is not None and item.checkState() == Qt.Checked:
+            self.labelList.setCurrentItem(item)
+            item.setSelected(True)
+        self.canvas.update()
         self.setDirty()
 
     # After Shapes Save
     def undoAppend(self, do_name):
-        inputdata = self.undoShapedatamake()
-        visibledata = self.undoShapevisible()
-        self.undoList.append([do_name, inputdata, visibledata])
-        self.redoList.clear()
+        self.history.record(do_name, self.canvas.shapes)
         self.executedList_update()
 
     # Ctrl + Z
@@ -2014,104 +2114,192 @@ class MainWindow(QMainWindow, WindowMixin):
         if self.canvas.autotrackingMode is True:
             self.canvas.autotracking_undochecker = True
             self.canvas.autotrackingEnd()
-        if len(self.undoList) > 1:
-            shape = self.undoList.pop(-1)
-            self.redoList.append(shape)
-            self.reloadShapes(self.undoList[-1][1])
-            for cc in self.undoList[-1][2]:
-                item = self.labelList.item(cc)
-                self.labelList.setCurrentItem(item)
-                item.setSelected(True)
-                self.labelList.currentItem().setCheckState(Qt.Unchecked)
-                self.canvas.setShapeVisible(self.canvas.selectedShape, False)
-                self.canvas.deSelectShape()
-            self.executedList_update()
-            self.cancelCutmethod()
-            self.canvas.autotracking_undochecker = False
-
-            if len(self.canvas.shapes) == 0:
-                self.actions.delete.setEnabled(False)
-                self.actions.copy.setEnabled(False)
-                self.actions.edit.setEnabled(False)
-                self.actions.shapeLineColor.setEnabled(False)
-                self.actions.shapeFillColor.setEnabled(False)
-
-                self.actions.autotrackingLabel.setChecked(False)
-                self.canvas.autotrackingMode = False
-                self.actions.autotrackingLabel.setEnabled(False)
+        if self.undoStack.canUndo():
+            self.history.undo(self.applyShapeEdit)
+            self.afterUndoRedo()
 
     # Ctrl + Y
     def redomethod(self):
         if self.canvas.autotrackingMode is True:
             self.canvas.autotracking_undochecker = True
             self.canvas.autotrackingEnd()
-        if len(self.redoList) > 0:
-            shape = self.redoList.pop(-1)
-            self.undoList.append(shape)
-            self.reloadShapes(self.undoList[-1][1])
-            for cc in self.undoList[-1][2]:
-                item = self.labelList.item(cc)
-                self.labelList.setCurrentItem(item)
-                item.setSelected(True)
-                self.labelList.currentItem().setCheckState(Qt.Unchecked)
-                self.canvas.setShapeVisible(self.canvas.selectedShape, False)
-                self.canvas.deSelectShape()
-            self.executedList_update()
-            self.cancelCutmethod()
-            self.canvas.autotracking_undochecker = False
+        if self.undoStack.canRedo():
+            self.history.redo(self.applyShapeEdit)
+            self.afterUndoRedo()
 
-            if len(self.canvas.shapes) == 0:
-                self.actions.delete.setEnabled(False)
-                self.actions.copy.setEnabled(False)
-                self.actions.edit.setEnabled(False)
-                self.actions.shapeLineColor.setEnabled(False)
-                self.actions.shapeFillColor.setEnabled(False)
+    def afterUndoRedo(self):
+        self.executedList_update()
+        self.cancelCutmethod()
+        self.canvas.autotracking_undochecker = False
 
-                self.actions.autotrackingLabel.setChecked(False)
-                self.canvas.autotrackingMode = False
-                self.actions.autotrackingLabel.setEnabled(False)
+        if len(self.canvas.shapes) == 0:
+            for action in self.actions.onShapesPresent:
+                action.setEnabled(False)
+            self.actions.delete.setEnabled(False)
+            self.actions.copy.setEnabled(False)
+            self.actions.edit.setEnabled(False)
+            self.actions.shapeLineColor.setEnabled(False)
+            self.actions.shapeFillColor.setEnabled(False)
+
+            self.actions.autotrackingLabel.setChecked(False)
+            self.canvas.autotrackingMode = False
+            self.actions.autotrackingLabel.setEnabled(False)
 
     def executedList_update(self):
-        self.executedList.clear()
-        if bool(self.undoList) is True:
-            for a in self.undoList:
-                name = a[0]
-                self.executedList.addItem(name)
-
-        if bool(self.redoList) is True:
-            for b in reversed(self.redoList):
-                name = b[0]
-                self.executedList.addItem(name)
-
-        self.executedList.setCurrentItem(self.executedList.item(len(self.undoList) - 1))
-        self.executedList.item(len(self.undoList) - 1).setSelected(True)
-
-        currentitem = self.executedList.selectedItems()
-        currentitem[0].setBackground(QColor(255, 125, 125))
-
-    # def undoSelectionChanged(self):
-    #     currentpos = len(self.undoList) - 1
-    #     currentitem = self.executedList.item(currentpos)
-        # print(currentpos)
-        # print(currentitem)
-        #currentitem[0].setBackground(QColor(255, 125, 125))
-        # selecteditem = self.executedList.selectedItems()
-        # print(self.undoList)
-        # print(self.executedList.count())
-        # print(selecteditem.)
-        # # selecteditem[0].setBackground(QColor(255, 125, 125))
-        # clickpos = self.executedList.row(selecteditem[0])
-        #
-        # if clickpos > currentpos:
-        #     for aa in range(0, clickpos - currentpos):
-        #         ss = self.redoList.pop(-1)
-        #         self.undoList.append(ss)
-        #     self.reloadShapes(self.undoList[-1][1])
-        # elif clickpos < currentpos:
-        #     for aa in range(0, currentpos - clickpos):
-        #         ss = self.undoList.pop(-1)
-        #         self.redoList.append(ss)
-        #     self.reloadShapes(self.undoList[-1][1])
+        index = self.history.currentIndex()
+        if index.isValid():
+            self.executedList.setCurrentIndex(index)
+            self.executedList.scrollTo(index)
+
+    # Click on the history: jump to that state
+    def undoSelectionChanged(self, index):
+        if not index.isValid() or index.row() == self.undoStack.position():
+            return
+        if self.canvas.autotrackingMode is True:
+            self.canvas.autotracking_undochecker = True
+            self.canvas.autotrackingEnd()
+        self.history.jump(index.row(), self.applyShapeEdit)
+        self.afterUndoRedo()
+
+    # Dataset index
+    def openAnnotationIndex(self):
+        """Index the images of the open directory, in the folder annotations are saved to."""
+        folder = self.defaultSaveDir or self.dirname
+        path = indexPath(folder) if folder and os.path.isdir(folder) else None
+        if self.annotationIndex is None or self.annotationIndex.path != path:
+            self.closeAnnotationIndex()
+            if path is None:
+                return
+            try:
+                self.annotationIndex = AnnotationIndex(path, self.annotationPaths, self.saveQueue.wait,
+                                                       self.indexer.failed.emit)
+            except sqlite3.Error as e:
+                self.status(u'Cannot index %s: %s' % (folder, e))
+                return
+        self.indexer.schedule(self.annotationIndex, self.mImgList)
+
+    def closeAnnotationIndex(self):
+        if self.annotationIndex is not None:
+            self.indexer.cancel()
+            self.annotationIndex.close()
+            self.annotationIndex = None
+
+    def indexedAnnotation(self, imagePath, annotationPath):
+        """Index entry of imagePath if it describes annotationPath, otherwise None."""
+        if self.annotationIndex is None:
+            return None
+        try:
+            entry = self.annotationIndex.entry(imagePath)
+        except sqlite3.Error:
+            return None
+        if entry.annotation is None or \
+                os.path.normpath(entry.annotation) != os.path.normpath(annotationPath):
+            return None
+        return entry
+
+    def annotationHasShapes(self, imagePath, xmlPath):
+        entry = self.indexedAnnotation(imagePath, xmlPath)
+        if entry is not None:
+            return entry.boxes > 0
+        return bool(self.imageCache.pascalVocReader(xmlPath).shapes)
+
+    # Undo journal
+    def journalAnnotationPath(self, filePath):
+        xmlPath, txtPath = self.annotationPaths(filePath)
+        return txtPath if self.usingYoloFormat else xmlPath
+
+    def openJournal(self):
+        """Log the history of the image just loaded, restoring the one left by an earlier session."""
+        annotationPath = self.journalAnnotationPath(self.filePath)
+        self.journal = UndoJournal(journalPath(annotationPath), self.journalWriter)
+        # Not flush(): the previous image's journal may still wait for its save
+        self.journalWriter.wait(self.journal.path)
+        frames = readJournal(self.journal.path)
+        if not frames or frames[0][0] != BASE or not self.restoreJournal(frames, annotationPath):
+            if frames is not None:
+                self.journal.discard()
+            self.journal.begin(self.undoStack.root, self.undoStack.rootShapes())
+        self.undoStack.journal = self.journal
+
+    def restoreJournal(self, frames, annotationPath):
+        """Restore the history of a journal, asking first if it holds unsaved changes.
+
+        A journal whose last save no longer matches the annotation file
+        describes a file that was rewritten since, e.g. by auto copy, and
+        is not restored.
+        """
+        saved = True
+        for kind, payload in frames[1:]:
+            if kind == SAVED:
+                # A save that failed leaves no stamp
+                saved = payload is not None
+            else:
+                saved = False
+        if saved:
+            stamp = fileStamp(annotationPath)
+            if stamp is None or frames[-1][1] != list(stamp):
+                return False
+        elif self.recoverJournalDialog() != QMessageBox.Yes:
+            return False
+
+        shapes = {}
+
+        def shapeFor(id, state):
+            if id not in shapes:
+                shapes[id] = self.journalShape(state)
+            return shapes[id]
+
+        base = frames[0][1]
+        baseShapes = [shapeFor(id, decodeState(state)) for id, state in base['shapes']]
+        self.itemsToShapes.clear()
+        self.shapesToItems.clear()
+        self.labelList.clear()
+        self.canvas.loadShapes(baseShapes)
+        self.labelList.blockSignals(True)
+        for shape in baseShapes:
+            self.insertLabel(self.labelList.count(), shape)
+        self.labelList.blockSignals(False)
+
+        self.history.reset(base['root'], baseShapes)
+        for kind, payload in frames[1:]:
+            if kind == RECORD:
+                self.history.push(decodeEdit(payload, shapeFor), self.applyShapeEdit)
+            elif kind == UNDO:
+                self.history.undo(self.applyShapeEdit)
+            elif kind == REDO:
+                self.history.redo(self.applyShapeEdit)
+        self.journal.attach(dict((shape, id) for id, shape in shapes.items()))
+
+        if saved:
+            self.setClean()
+        else:
+            self.setDirty()
+            self.status('Recovered unsaved changes of %s' % os.path.basename(self.filePath))
+        return True
+
+    def journalShape(self, state):
+        label, points, difficult, visible = state
+        shape = Shape(label=label)
+        shape.points = [QPointF(x, y) for x, y in points]
+        shape.difficult = difficult
+        shape.close()
+        shape.line_color = self.presetColorSelect(label)
+        shape.fill_color = self.presetColorSelect(label)
+        self.canvas.visible[shape] = visible
+        return shape
+
+    def restartJournal(self):
+        """Drop the journal of the image on screen and log from its current history."""
+        if self.journal is not None:
+            self.journal.discard()
+            self.journal.begin(self.undoStack.root, self.undoStack.rootShapes())
+
+    def closeJournal(self, discard=False):
+        if self.journal is not None:
+            if discard:
+                self.journal.discard()
+            self.undoStack.journal = None
+            self.journal = None
 
     def clickmoveUndosave(self):
         self.undoAppend('라벨 박스 클릭 이동' + " (" + self.canvas.selectedShape.label + ")")
@@ -2169,6 +2357,7 @@ class MainWindow(QMainWindow, WindowMixin):
             path = self.defaultSaveDir + '/BackupXml/' + filename
             exist = os.path.isfile(path)
             if exist is True:
+                self.saveQueue.wait(currentxmlpath)
                 os.remove(currentxmlpath)
                 os.rename(path, currentxmlpath)
                 tVocParseReader = PascalVocReader(currentxmlpath)
@@ -2180,6 +2369,9 @@ class MainWindow(QMainWindow, WindowMixin):
                 self.labelCoordinates.clear()
 
                 self.loadLabels(prevshapes)
+                # The journal described the file that was replaced
+                self.history.reset(u'저장 파일 복구', self.canvas.shapes)
+                self.restartJournal()
 
                 self.labelList.setCurrentItem(self.labelList.item(self.labelList.count() - 1))
                 self.labelList.item(self.labelList.count() - 1).setSelected(True)
@@ -2324,8 +2516,51 @@ class MainWindow(QMainWindow, WindowMixin):
         for item, shape in self.itemsToShapes.items():
             item.setCheckState(Qt.Checked if value else Qt.Unchecked)
 
-    def loadFile(self, filePath=None):
-        """Load the specified file, or the last opened file if None."""
+    def loadFileAsync(self, filePath, callback=None):
+        """Load filePath without blocking the UI.
+
+        The image is decoded on the prefetcher thread while the previous one
+        stays on screen; a newer call supersedes a pending one, so skipping
+        quickly through a directory only waits for the last image.
+        `callback` runs once the file has been loaded.
+        """
+        filePath = ustr(filePath)
+        self.pendingLoad = (filePath, callback)
+        if self.imageCache.contains(filePath):
+            self.prefetcher.cancel()
+            self.finishAsyncLoad()
+            return
+        self.canvas.setEnabled(False)
+        self.status("Loading %s..." % os.path.basename(filePath))
+        self.prefetcher.request(filePath)
+
+    def asyncLoaded(self, filePath, decoded=None):
+        if self.pendingLoad is not None and self.pendingLoad[0] == ustr(filePath):
+            self.finishAsyncLoad(decoded)
+
+    def finishAsyncLoad(self, decoded=None):
+        filePath, callback = self.pendingLoad
+        self.pendingLoad = None
+        if self.loadFile(filePath, decoded):
+            if callback is not None:
+                callback()
+        else:
+            # Disabled by loadFileAsync, and loadFile only enables it on success
+            self.canvas.setEnabled(True)
+
+    def targetPath(self):
+        """The file being loaded, or the current one if nothing is pending."""
+        if self.pendingLoad is not None:
+            return self.pendingLoad[0]
+        return self.filePath
+
+    def loadFile(self, filePath=None, decoded=None):
+        """Load the specified file, or the last opened file if None.
+
+        decoded is the (imageData, QImage) of the file if it has been read
+        already, e.g. by the prefetcher.
+        """
+        self.pendingLoad = None
         self.resetState()
         self.canvas.setEnabled(False)
         if filePath is None:
@@ -2337,10 +2572,9 @@ class MainWindow(QMainWindow, WindowMixin):
         unicodeFilePath = ustr(filePath)
         # Tzutalin 20160906 : Add file list and dock to move faster
         # Highlight the file item
-        if unicodeFilePath and self.fileListWidget.count() > 0:
+        if unicodeFilePath in self.mImgList:
             index = self.mImgList.index(unicodeFilePath)
-            fileWidgetItem = self.fileListWidget.item(index)
-            fileWidgetItem.setSelected(True)
+            self.fileListWidget.setCurrentIndex(self.fileListModel.index(index))
 
         if unicodeFilePath and os.path.exists(unicodeFilePath):
             if LabelFile.isLabelFile(unicodeFilePath):
@@ -2357,14 +2591,21 @@ class MainWindow(QMainWindow, WindowMixin):
                 self.lineColor = QColor(*self.labelFile.lineColor)
                 self.fillColor = QColor(*self.labelFile.fillColor)
                 self.canvas.verified = self.labelFile.verified
+                image = QImage.fromData(self.imageData)
             else:
                 # Load image:
                 # read data first and store for saving into label file.
-                self.imageData = read(unicodeFilePath, None)
+                # Prefetched images are already decoded, passed in or in the cache.
+                if decoded is not None:
+                    self.imageData, image = decoded
+                else:
+                    try:
+                        self.imageData, image = self.imageCache.loadImage(unicodeFilePath)
+                    except (IOError, OSError):
+                        self.imageData, image = None, QImage()
                 self.labelFile = None
                 self.canvas.verified = False
 
-            image = QImage.fromData(self.imageData)
             if image.isNull():
                 self.errorMessage(u'Error opening file',
                                   u"<p>Make sure <i>%s</i> is a valid image file." % unicodeFilePath)
@@ -2373,7 +2614,7 @@ class MainWindow(QMainWindow, WindowMixin):
             self.status("Loaded %s" % os.path.basename(unicodeFilePath))
             self.image = image
             self.filePath = unicodeFilePath
-            self.canvas.loadPixmap(QPixmap.fromImage(image))
+            self.canvas.loadImage(image)
             if self.labelFile:
                 self.loadLabels(self.labelFile.shapes)
             self.setClean()
@@ -2385,26 +2626,17 @@ class MainWindow(QMainWindow, WindowMixin):
 
             # Label xml file and show bound box according to its filename
             # if self.usingPascalVocFormat is True:
-            if self.defaultSaveDir is not None:
-                basename = os.path.basename(
-                    os.path.splitext(self.filePath)[0])
-                xmlPath = os.path.join(self.defaultSaveDir, basename + XML_EXT)
-                txtPath = os.path.join(self.defaultSaveDir, basename + TXT_EXT)
-
-                """Annotation file priority:
-                PascalXML > YOLO
-                """
-                if os.path.isfile(xmlPath):
-                    self.loadPascalXMLByFilename(xmlPath)
-                elif os.path.isfile(txtPath):
-                    self.loadYOLOTXTByFilename(txtPath)
-            else:
-                xmlPath = os.path.splitext(filePath)[0] + XML_EXT
-                txtPath = os.path.splitext(filePath)[0] + TXT_EXT
-                if os.path.isfile(xmlPath):
-                    self.loadPascalXMLByFilename(xmlPath)
-                elif os.path.isfile(txtPath):
-                    self.loadYOLOTXTByFilename(txtPath)
+            xmlPath, txtPath = self.annotationPaths(self.filePath)
+            self.saveQueue.wait(xmlPath)
+            self.saveQueue.wait(txtPath)
+
+            """Annotation file priority:
+            PascalXML > YOLO
+            """
+            if os.path.isfile(xmlPath):
+                self.loadPascalXMLByFilename(xmlPath)
+            elif os.path.isfile(txtPath):
+                self.loadYOLOTXTByFilename(txtPath)
 
             self.setWindowTitle(__appname__ + ' ' + filePath)
 
@@ -2415,18 +2647,31 @@ class MainWindow(QMainWindow, WindowMixin):
 
             self.canvas.setFocus(True)
             # current / total  number
-            if bool(self.mImgList) is True:
-                currentindex = self.mImgList.index(self.filePath) + 1
-                total_length = (len(self.mImgList))
-                indexstring = str(currentindex) + " / " + str(total_length)
-                self.currenttotalBrowser.setText(indexstring)
+            if self.filePath in self.mImgList:
+                self.showImageCounter()
             else:
                 self.currenttotalBrowser.setText("1 / 1")
             # undo / redo setting
-            self.undoAppend('파일 열기')
+            self.history.reset('파일 열기', self.canvas.shapes)
+            self.openJournal()
+            self.executedList_update()
+
+            if self.filePath in self.mImgList:
+                self.prefetcher.schedule(self.mImgList, self.mImgList.index(self.filePath))
             return True
         return False
 
+    def annotationPaths(self, filePath):
+        """Return the (xml, txt) annotation paths looked up for an image."""
+        if self.defaultSaveDir is not None:
+            basename = os.path.basename(os.path.splitext(filePath)[0])
+            xmlPath = os.path.join(self.defaultSaveDir, basename + XML_EXT)
+            txtPath = os.path.join(self.defaultSaveDir, basename + TXT_EXT)
+        else:
+            xmlPath = os.path.splitext(filePath)[0] + XML_EXT
+            txtPath = os.path.splitext(filePath)[0] + TXT_EXT
+        return xmlPath, txtPath
+
     def resizeEvent(self, event):
         if self.canvas and not self.image.isNull()\
            and self.zoomMode != self.MANUAL_ZOOM:
@@ -2463,6 +2708,13 @@ class MainWindow(QMainWindow, WindowMixin):
     def closeEvent(self, event):
         if not self.mayContinue():
             event.ignore()
+        else:
+            self.closeJournal(discard=self.dirty)
+            self.saveQueue.flush()
+            self.journalWriter.flush()
+            self.closeAnnotationIndex()
+            self.scanner.cancel()
+            self.dirWatcher.clear()
         settings = self.settings
         # If it loads images from dir, don't load it at the begining
         if self.dirname is None:
@@ -2491,6 +2743,10 @@ class MainWindow(QMainWindow, WindowMixin):
         settings[SETTING_SINGLE_CLASS] = self.singleClassMode.isChecked()
         settings[SETTING_PAINT_LABEL] = self.displayLabelOption.isChecked()
         settings[SETTING_DRAW_SQUARE] = self.drawSquaresOption.isChecked()
+        settings[SETTING_PREFETCH_NEXT] = self.prefetcher.nextDepth
+        settings[SETTING_PREFETCH_PREV] = self.prefetcher.prevDepth
+        settings[SETTING_CACHE_SIZE] = self.imageCache.budget // (1024 * 1024)
+        settings[SETTING_UNDO_LIMIT] = self.undoStack.limit
         settings.save()
 
     def loadRecent(self, filename):
@@ -2498,17 +2754,92 @@ class MainWindow(QMainWindow, WindowMixin):
             self.loadFile(filename)
 
     def scanAllImages(self, folderPath):
-        extensions = ['.%s' % fmt.data().decode("ascii").lower() for fmt in QImageReader.supportedImageFormats()]
-        images = []
-
-        for root, dirs, files in os.walk(folderPath):
-            for file in files:
-                if file.lower().endswith(tuple(extensions)):
-                    relativePath = os.path.join(root, file)
-                    path = ustr(os.path.abspath(relativePath))
-                    images.append(path)
-        natural_sort(images, key=lambda x: x.lower())
-        return images
+        return [ustr(path) for path in iterImages(folderPath, imageExtensions())]
+
+    def imagesFound(self, generation, paths, keys):
+        if generation != self.scanGeneration:
+            return
+        first = not self.mImgList
+        self.fileListModel.append(paths, keys)
+        if first:
+            self.openNextImg()
+        elif self.filePath in self.mImgList:
+            self.showImageCounter()
+
+    def scanFinished(self, generation):
+        if generation != self.scanGeneration:
+            return
+        self.scanGeneration = None
+        self.openAnnotationIndex()
+        self.dirWatcher.watch(self.dirname, self.mImgList)
+
+    def imagesAdded(self, paths):
+        """Images that appeared in the open directory after it was scanned."""
+        paths = [ustr(path) for path in paths]
+        first = not self.mImgList
+        self.fileListModel.insertSorted(paths)
+        if self.annotationIndex is not None:
+            for path in paths:
+                self.indexer.update(self.annotationIndex, path)
+        if first and self.filePath is None:
+            self.openNextImg()
+        elif self.filePath in self.mImgList:
+            self.showImageCounter()
+            # A large insertion resets the model and the selection with it
+            index = self.mImgList.index(self.filePath)
+            self.fileListWidget.setCurrentIndex(self.fileListModel.index(index))
+
+    def imagesRemoved(self, paths):
+        """Images that disappeared from the open directory.
+
+        The image on screen stays there and keeps its row for Next and
+        Prev; one still loading is replaced by the nearest image left.
+        """
+        paths = [ustr(path) for path in paths]
+        removed = set(paths)
+        followers = {}
+        for path in set([self.filePath, self.targetPath()]):
+            if path in removed and path in self.mImgList:
+                row = self.mImgList.index(path) + 1
+                while row < len(self.mImgList) and self.mImgList[row] in removed:
+                    row += 1
+                followers[path] = self.mImgList[row] if row < len(self.mImgList) else None
+        self.fileListModel.removePaths(paths)
+        if self.annotationIndex is not None:
+            for path in paths:
+                self.annotationIndex.remove(path)
+
+        def rowOf(follower):
+            return len(self.mImgList) if follower is None else self.mImgList.index(follower)
+        if self.filePath in followers:
+            self.removedRow = (self.filePath, rowOf(followers[self.filePath]))
+        if self.pendingLoad is not None and self.pendingLoad[0] in followers:
+            filePath, callback = self.pendingLoad
+            self.pendingLoad = None
+            row = min(rowOf(followers[filePath]), len(self.mImgList) - 1)
+            if row >= 0:
+                self.loadFileAsync(self.mImgList[row], callback)
+            else:
+                self.prefetcher.cancel()
+                self.canvas.setEnabled(True)
+        if self.filePath in self.mImgList:
+            self.showImageCounter()
+
+    def imageRow(self, path):
+        """(row, present) of path in mImgList.
+
+        Once removed, the image on screen keeps the row of the image that
+        followed it; any other path not in the list has no row.
+        """
+        if path in self.mImgList:
+            return self.mImgList.index(path), True
+        if self.removedRow is not None and self.removedRow[0] == path:
+            return self.removedRow[1], False
+        return None, False
+
+    def showImageCounter(self):
+        index = self.mImgList.index(self.filePath)
+        self.currenttotalBrowser.setText("%d / %d" % (index + 1, len(self.mImgList)))
 
     def changeSavedirDialog(self, _value=False):
         if self.defaultSaveDir is not None:
@@ -2522,6 +2853,8 @@ class MainWindow(QMainWindow, WindowMixin):
 
         if dirpath is not None and len(dirpath) > 1:
             self.defaultSaveDir = dirpath
+            if self.mImgList:
+                self.openAnnotationIndex()
 
         self.statusBar().showMessage('%s . Annotation will be saved to %s' %
                                      ('Change saved folder', self.defaultSaveDir))
@@ -2544,7 +2877,10 @@ class MainWindow(QMainWindow, WindowMixin):
             self.loadPascalXMLByFilename(filename)
 
     def openPrevXml(self, _value=False):
-        prevIndex = self.mImgList.index(self.filePath) - 1
+        currIndex, _ = self.imageRow(self.filePath)
+        if currIndex is None:
+            return
+        prevIndex = currIndex - 1
         if prevIndex < 0:
             self.infoMessage('Message', '이 이미지가 현재 폴더의 첫번째 이미지입니다.')
             return
@@ -2553,11 +2889,22 @@ class MainWindow(QMainWindow, WindowMixin):
             shapes = []
             prevfilename = self.mImgList[prevIndex]
             prevfilename = prevfilename[:-3] + 'xml'
+            self.saveQueue.wait(prevfilename)
 
-            previmagesize = previmageSize(prevfilename)
+            # The index knows about empty label files without parsing them
+            entry = self.indexedAnnotation(self.mImgList[prevIndex], prevfilename)
+            if entry is not None and entry.boxes == 0:
+                self.infoMessage('Message', '이전 이미지의 라벨 파일이 없습니다.')
+                return
+
+            # One parse for both the size and the shapes
+            tVocParseReader = self.imageCache.pascalVocReader(prevfilename)
+            previmagesize = previmageSize(tVocParseReader)
+            if previmagesize is None:
+                self.infoMessage('Message', '이전 이미지의 라벨 파일이 없습니다.')
+                return
             imagesize = [self.canvas.pixmap.width(), self.canvas.pixmap.height()]
             if previmagesize[0] <= imagesize[0] and previmagesize[1] <= imagesize[1]:
-                tVocParseReader = PascalVocReader(prevfilename)
                 prevshapes = tVocParseReader.getShapes()
 
                 currentshapeValues = self.itemsToShapes.values()
@@ -2621,12 +2968,12 @@ class MainWindow(QMainWindow, WindowMixin):
         self.lastOpenDir = dirpath
         self.dirname = dirpath
         self.filePath = None
-        self.fileListWidget.clear()
-        self.mImgList = self.scanAllImages(dirpath)
-        self.openNextImg()
-        for imgPath in self.mImgList:
-            item = QListWidgetItem(imgPath)
-            self.fileListWidget.addItem(item)
+        self.pendingLoad = None
+        self.closeAnnotationIndex()
+        self.dirWatcher.clear()
+        self.fileListModel.clear()
+        # The first batch opens the first image while the scan goes on
+        self.scanGeneration = self.scanner.scan(dirpath)
 
     def verifyImg(self, _value=False):
         # Proceding next image without dialog if having any label
@@ -2662,14 +3009,14 @@ class MainWindow(QMainWindow, WindowMixin):
         if len(self.mImgList) <= 0:
             return
 
-        if self.filePath is None:
+        currIndex, _ = self.imageRow(self.targetPath())
+        if currIndex is None:
             return
 
-        currIndex = self.mImgList.index(self.filePath)
         if currIndex - 1 >= 0:
             filename = self.mImgList[currIndex - 1]
             if filename:
-                self.loadFile(filename)
+                self.loadFileAsync(filename)
 
     def openNextImg(self, _value=False):
         # Proceding prev image without dialog if having any label
@@ -2692,47 +3039,68 @@ class MainWindow(QMainWindow, WindowMixin):
                 self.infoMessage('Message', '복사할 라벨이 저장되어 있지 않습니다.')
                 return
 
+        # Auto copy and auto input work from the image on screen,
+        # so they have to wait until it is actually loaded.
+        if self.pendingLoad is not None and \
+                (self.xmlautocopyMode.isChecked() or self.useAutoInputCheckbox.isChecked()):
+            return
+
         filename = None
-        if self.filePath is None:
+        currIndex, present = self.imageRow(self.targetPath())
+        if currIndex is None:
             filename = self.mImgList[0]
         else:
-            currIndex = self.mImgList.index(self.filePath)
-            if currIndex + 1 < len(self.mImgList):
-                filename = self.mImgList[currIndex + 1]
-                if self.xmlautocopyMode.isChecked():
+            # A removed image left its row to the one after it
+            nextIndex = currIndex + 1 if present else currIndex
+            if nextIndex < len(self.mImgList):
+                filename = self.mImgList[nextIndex]
+                if present and self.xmlautocopyMode.isChecked():
                     pre_filename = self.mImgList[currIndex]
                     pre_xml_name = pre_filename[:-4] + '.xml'
                     next_xml_name = filename[:-4] + '.xml'
+                    self.saveQueue.wait(pre_xml_name)
+                    self.saveQueue.wait(next_xml_name)
 
                     filesize = nextimageSize(filename)
                     if self.canvas.pixmap.width() <= filesize[0] and self.canvas.pixmap.height() <= filesize[1]:
 
                         pre_file_exist = os.path.isfile(pre_xml_name)
                         if pre_file_exist == True:
-                            pre_object_checker = xml_object_finder(pre_xml_name)
+                            pre_object_checker = self.annotationHasShapes(pre_filename, pre_xml_name)
 
                             if pre_object_checker == True:
                                 next_file_exist = os.path.isfile(next_xml_name)
                                 if next_file_exist == True:
-                                    next_object_checker = xml_object_finder(next_xml_name)
+                                    next_object_checker = self.annotationHasShapes(filename, next_xml_name)
                                     if next_object_checker == False:
-                                        next_xml_maker(pre_xml_name, next_xml_name, filename)
+                                        next_xml_maker(self.imageCache.pascalVocReader(pre_xml_name),
+                                                       next_xml_name, filename, self.saveQueue)
                                     else:
                                         self.automergeBackupxml(next_xml_name)
-                                        xmlmerge(pre_xml_name, next_xml_name, filename)
+                                        xmlmerge(self.imageCache.pascalVocReader(pre_xml_name),
+                                                 self.imageCache.pascalVocReader(next_xml_name),
+                                                 next_xml_name, filename, self.saveQueue)
                                 else:
-                                    next_xml_maker(pre_xml_name, next_xml_name, filename)
+                                    next_xml_maker(self.imageCache.pascalVocReader(pre_xml_name),
+                                                   next_xml_name, filename, self.saveQueue)
+                                # Its journal describes the annotation before the copy
+                                self.journalWriter.remove(journalPath(next_xml_name))
+                                if self.annotationIndex is not None:
+                                    self.indexer.update(self.annotationIndex, filename)
                     else:
                         self.infoMessage('Message', '현재 이미지가 다음 이미지보다 큽니다. 파일 복사를 하지 않습니다.')
 
         if filename:
-            self.loadFile(filename)
-
-        if filename is not None:
             if self.useAutoInputCheckbox.isChecked():
-                self.AutoInputStatus = True
-                self.AutoInputPreset()
-                self.AutoInputStatus = False
+                self.loadFileAsync(filename, self.autoInputAfterLoad)
+            else:
+                self.loadFileAsync(filename)
+
+    def autoInputAfterLoad(self):
+        if self.useAutoInputCheckbox.isChecked():
+            self.AutoInputStatus = True
+            self.AutoInputPreset()
+            self.AutoInputStatus = False
 
     def openFile(self, _value=False):
         if not self.mayContinue():
@@ -2792,12 +3160,21 @@ class MainWindow(QMainWindow, WindowMixin):
     def _saveFile(self, annotationFilePath):
         if annotationFilePath and self.saveLabels(annotationFilePath):
             self.setClean()
+            if self.journal is not None:
+                annotationPath = self.journalAnnotationPath(self.filePath)
+                saveQueue = self.saveQueue
+                self.journal.compact(self.undoStack, lambda: fileStamp(annotationPath)
+                                     if saveQueue.wait(annotationPath) else None)
+            if self.annotationIndex is not None:
+                self.indexer.update(self.annotationIndex, self.filePath)
             self.statusBar().showMessage('Saved to  %s' % annotationFilePath)
             self.statusBar().show()
 
     def closeFile(self, _value=False):
         if not self.mayContinue():
             return
+        self.pendingLoad = None
+        self.prefetcher.cancel()
         self.resetState()
         self.setClean()
         self.toggleActions(False)
@@ -2854,6 +3231,10 @@ class MainWindow(QMainWindow, WindowMixin):
         msg = u'현재 이미지와 라벨 파일이 삭제됩니다.'
         return QMessageBox.warning(self, u'이미지 파일 삭제', msg, QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
 
+    def recoverJournalDialog(self):
+        msg = u'저장되지 않은 작업 내역이 있습니다. 복구하시겠습니까?'
+        return QMessageBox.warning(self, u'작업 내역 복구', msg, QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+
     def rollbackMessage(self):
         msg = u'이전에 저장한 파일로 롤백합니다. 계속 하시겠습니까?'
         return QMessageBox.warning(self, u'저장 파일 복구', msg, QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
@@ -2868,7 +3249,7 @@ class MainWindow(QMainWindow, WindowMixin):
             self.lineColor = color
             Shape.line_color = color
             self.canvas.setDrawingColor(color)
-            self.canvas.update()
+            self.canvas.invalidateLayer()
             self.setDirty()
 
     def deleteSelectedShape(self):
@@ -2952,7 +3333,9 @@ class MainWindow(QMainWindow, WindowMixin):
 
         self.set_format(FORMAT_PASCALVOC)
 
-        tVocParseReader = PascalVocReader(xmlPath)
+        tVocParseReader = self.imageCache.pascalVocReader(xmlPath)
+        if tVocParseReader.error is not None:
+            self.status(u'Error reading %s' % tVocParseReader.error)
         shapes = tVocParseReader.getShapes()
         self.loadLabels(shapes)
         self.canvas.verified = tVocParseReader.verified
@@ -2964,7 +3347,7 @@ class MainWindow(QMainWindow, WindowMixin):
             return
 
         self.set_format(FORMAT_YOLO)
-        tYoloParseReader = YoloReader(txtPath, self.image)
+        tYoloParseReader = self.imageCache.yoloReader(txtPath, self.image)
         shapes = tYoloParseReader.getShapes()
         print (shapes)
         self.loadLabels(shapes)
@@ -2973,6 +3356,7 @@ class MainWindow(QMainWindow, WindowMixin):
     def togglePaintLabelsOption(self):
         for shape in self.canvas.shapes:
             shape.paintLabel = self.displayLabelOption.isChecked()
+        self.canvas.invalidateLayer()
 
     def toogleDrawSquare(self):
         self.canvas.setDrawingShapeToSquare(self.drawSquaresOption.isChecked())
@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from PyQt5.QtCore import QObject, pyqtSignal
+except ImportError:
+    from PyQt4.QtCore import QObject, pyqtSignal
+
+from libs.imageSize import imageSize
+from libs.pascal_voc_io import PascalVocReader, XML_EXT
+
+INDEX_FILE = 'AnnotationIndex.sqlite'
+
+# Images refreshed per transaction by the indexer
+INDEX_BATCH = 200
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    width INTEGER,
+    height INTEGER,
+    depth INTEGER,
+    mtime INTEGER,
+    annotation TEXT,
+    annotationStamp TEXT,
+    verified INTEGER NOT NULL,
+    boxes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS classes (
+    path TEXT NOT NULL,
+    label TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (path, label)
+);
+'''
+
+# width, height and depth are read from the image header, annotation is None
+# for an image without one and classes maps labels to their box counts.
+IndexEntry = namedtuple('IndexEntry', 'path width height depth mtime annotation verified boxes classes')
+
+
+def indexPath(folder):
+    return os.path.join(folder, INDEX_FILE)
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return '%d:%d' % (st.st_mtime_ns, st.st_size)
+
+
+def _classesPath(txtPath):
+    return os.path.join(os.path.dirname(os.path.realpath(txtPath)), 'classes.txt')
+
+
+def _readYolo(txtPath):
+    """(verified, [label]) of a YOLO file, labels named as in its classes.txt.
+
+    Lines that are not boxes are skipped, like YoloReader does.
+    """
+    try:
+        with open(_classesPath(txtPath), 'r') as f:
+            classes = f.read().strip('\n').split('\n')
+    except (IOError, OSError):
+        classes = []
+    labels = []
+    with open(txtPath, 'r') as f:
+        for line in f:
+            fields = line.split(' ')
+            if len(fields) != 5:
+                continue
+            try:
+                index = int(fields[0])
+            except ValueError:
+                continue
+            labels.append(classes[index] if 0 <= index < len(classes) else fields[0])
+    return False, labels
+
+
+class AnnotationIndex(object):
+    """SQLite index of the images of a dataset and of their annotations.
+
+    annotationPaths(imagePath) returns the (xmlPath, txtPath) pair looked up
+    for an image, ready(annotationPath), when given, waits for pending
+    writes of an annotation before it is read, and failed(path, reason),
+    when given, is told about annotations that could not be read completely
+    (they are indexed with what could be read). Entries are refreshed
+    whenever the image or its annotation changed on disk, so lookups are
+    always current. The index can be shared between threads.
+    """
+
+    def __init__(self, path, annotationPaths, ready=None, failed=None):
+        self.path = path
+        self.annotationPaths = annotationPaths
+        self.ready = ready
+        self.failed = failed
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def entry(self, imagePath):
+        """IndexEntry of imagePath, read again first if it is out of date."""
+        image, annotation, stamp = self._stamps(imagePath)
+        with self._lock:
+            if self._db is None:
+                # Closed, e.g. by another thread: read the files instead
+                return self._read(imagePath)[0]
+            row = self._db.execute(
+                'SELECT width, height, depth, mtime, annotation, annotationStamp, verified, boxes '
+                'FROM images WHERE path = ?', (imagePath,)).fetchone()
+            if row is not None and row[3] == image and row[4] == annotation and row[5] == stamp:
+                classes = dict(self._db.execute(
+                    'SELECT label, count FROM classes WHERE path = ?', (imagePath,)))
+                return IndexEntry(imagePath, row[0], row[1], row[2], row[3], row[4],
+                                  bool(row[6]), row[7], classes)
+        return self.refresh([imagePath])[0]
+
+    def isCurrent(self, imagePath):
+        image, annotation, stamp = self._stamps(imagePath)
+        with self._lock:
+            if self._db is None:
+                return True
+            row = self._db.execute('SELECT mtime, annotation, annotationStamp FROM images WHERE path = ?',
+                                   (imagePath,)).fetchone()
+        return row == (image, annotation, stamp)
+
+    def refresh(self, imagePaths):
+        """Read imagePaths again in one transaction, returning their entries."""
+        entries = [self._read(path) for path in imagePaths]
+        with self._lock:
+            if self._db is None:
+                # Closed while the files were read
+                return [entry for entry, _ in entries]
+            for entry, stamp in entries:
+                self._store(entry, stamp)
+            self._db.commit()
+        return [entry for entry, _ in entries]
+
+    def remove(self, imagePath):
+        """Forget imagePath; an index that cannot be written is reported to failed."""
+        with self._lock:
+            if self._db is None:
+                return
+            try:
+                self._db.execute('DELETE FROM images WHERE path = ?', (imagePath,))
+                self._db.execute('DELETE FROM classes WHERE path = ?', (imagePath,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                if self.failed is not None:
+                    self.failed(self.path, str(e))
+
+    def classCounts(self):
+        """{label: boxes} over the whole dataset."""
+        with self._lock:
+            if self._db is None:
+                return {}
+            return dict(self._db.execute('SELECT label, SUM(count) FROM classes GROUP BY label'))
+
+    def _annotation(self, imagePath):
+        """Annotation file of an image, Pascal VOC first, or None."""
+        for path in self.annotationPaths(imagePath):
+            if self.ready is not None:
+                self.ready(path)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def _stamps(self, imagePath):
+        try:
+            image = os.stat(imagePath).st_mtime_ns
+        except OSError:
+            image = None
+        annotation = self._annotation(imagePath)
+        if annotation is None:
+            return image, None, None
+        stamp = _stamp(annotation)
+        if not annotation.endswith(XML_EXT):
+            stamp = '%s;%s' % (stamp, _stamp(_classesPath(annotation)))
+        return image, annotation, stamp
+
+    def _read(self, imagePath):
+        image, annotation, stamp = self._stamps(imagePath)
+        size = imageSize(imagePath) or (None, None, None)
+        verified, labels = False, []
+        if annotation is not None:
+            try:
+                if annotation.endswith(XML_EXT):
+                    reader = PascalVocReader(annotation)
+                    verified, labels = reader.verified, [shape[0] for shape in reader.shapes]
+                    if reader.error is not None and self.failed is not None:
+                        self.failed(annotation, reader.error.reason)
+                else:
+                    verified, labels = _readYolo(annotation)
+            except (IOError, OSError, ValueError) as e:
+                if self.failed is not None:
+                    self.failed(annotation, str(e))
+        classes = {}
+        for label in labels:
+            classes[label] = classes.get(label, 0) + 1
+        entry = IndexEntry(imagePath, size[0], size[1], size[2], image, annotation,
+                           verified, len(labels), classes)
+        return entry, stamp
+
+    def _store(self, entry, stamp):
+        self._db.execute(
+            'INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (entry.path, entry.width, entry.height, entry.depth, entry.mtime, entry.annotation,
+             stamp, int(entry.verified), entry.boxes))
+        self._db.execute('DELETE FROM classes WHERE path = ?', (entry.path,))
+        self._db.executemany('INSERT INTO classes VALUES (?, ?, ?)',
+                             [(entry.path, label, count) for label, count in entry.classes.items()])
+
+
+class AnnotationIndexer(QObject):
+    """Keeps an AnnotationIndex current on a worker thread.
+
+    schedule() walks a whole image list, skipping images whose entry is
+    current and superseding the previous walk; update() refreshes a single
+    image, e.g. after it was saved, ahead of the walk. An index that cannot
+    be written is reported through failed(path, reason).
+    """
+
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, parent=None):
+        super(AnnotationIndexer, self).__init__(parent)
+        self._queue = queue.PriorityQueue()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._counter = 0
+        self._thread = None
+
+    def schedule(self, index, imagePaths):
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        self._put(1, generation, index, list(imagePaths))
+
+    def update(self, index, imagePath):
+        self._put(0, None, index, [imagePath])
+
+    def cancel(self):
+        with self._lock:
+            self._generation += 1
+
+    def flush(self):
+        """Block until everything queued so far is indexed."""
+        self._queue.join()
+
+    def _put(self, priority, generation, index, paths):
+        with self._lock:
+            self._counter += 1
+            self._queue.put((priority, self._counter, generation, index, paths))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='annotation-index')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _isCurrent(self, generation):
+        with self._lock:
+            return generation is None or generation == self._generation
+
+    def _run(self):
+        while True:
+            priority, _, generation, index, paths = self._queue.get()
+            try:
+                self._index(generation, index, paths)
+            except (sqlite3.Error, IOError, OSError) as e:
+                try:
+                    self.failed.emit(index.path, str(e))
+                except RuntimeError:
+                    # The window owning the indexer is already gone
+                    pass
+            finally:
+                self._queue.task_done()
+
+    def _index(self, generation, index, paths):
+        for start in range(0, len(paths), INDEX_BATCH):
+            if not self._isCurrent(generation):
+                return
+            batch = paths[start:start + INDEX_BATCH]
+            if generation is not None:
+                batch = [path for path in batch if not index.isCurrent(path)]
+            if batch:
+                index.refresh(batch)
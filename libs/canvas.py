@@ -8,9 +8,12 @@ except ImportError:
     from PyQt4.QtCore import *
 
 #from PyQt4.QtOpenGL import *
+import math
 
-from libs.shape import Shape
+from libs.shape import Shape, MIN_Y_LABEL
 from libs.utils import distance
+from libs.tilePyramid import PixmapExtent, TilePyramid, needsTiles
+from libs.spatialIndex import GridIndex
 
 CURSOR_DEFAULT = Qt.ArrowCursor
 CURSOR_POINT = Qt.PointingHandCursor
@@ -18,6 +21,9 @@ CURSOR_DRAW = Qt.CrossCursor
 CURSOR_MOVE = Qt.ClosedHandCursor
 CURSOR_GRAB = Qt.OpenHandCursor
 
+# Largest canvas, in device pixels, that gets a cached background layer
+LAYER_MAX_PIXELS = 4096 * 4096
+
 # class Canvas(QGLWidget):
 
 
@@ -46,6 +52,16 @@ class Canvas(QWidget):
         # Initialise local state.
         self.mode = self.EDIT
         self.shapes = []
+        # Bounding rects of self.shapes for hit-testing, see shapeChanged
+        self.shapeIndex = GridIndex()
+        # Widget area to repaint at the next updateDamage
+        self._damage = QRegion()
+        self._labelMetrics = None
+        # Image and inactive shapes pre-rendered at the current scale, see backgroundLayer
+        self._layer = None
+        self._layerKey = None
+        self._layerActive = frozenset()
+        self._layerDirty = QRegion()
         self.current = None
         self.selectedShape = None  # save the selected shape here
         self.selectedMultishape = []
@@ -57,6 +73,8 @@ class Canvas(QWidget):
         self.offsets = QPointF(), QPointF()
         self.scale = 1.0
         self.pixmap = QPixmap()
+        # Tiles of a very large image, see loadImage
+        self.tiles = None
         self.visible = {}
         self._hideBackround = False
         self.hideBackround = False
@@ -128,7 +146,7 @@ class Canvas(QWidget):
             self.unHighlight()
             self.deSelectShape()
         self.prevPoint = QPointF()
-        self.repaint()
+        self.update()
 
     def unHighlight(self):
         if self.hShape:
@@ -188,7 +206,7 @@ class Canvas(QWidget):
                 self.current.highlightClear()
             else:
                 self.prevPoint = pos
-            self.repaint()
+            self.update()
             return
 
         # Polygon copy moving.
@@ -196,10 +214,10 @@ class Canvas(QWidget):
             if self.selectedShapeCopy and self.prevPoint:
                 self.overrideCursor(CURSOR_MOVE)
                 self.boundedMoveShape(self.selectedShapeCopy, pos)
-                self.repaint()
+                self.update()
             elif self.selectedShape:
                 self.selectedShapeCopy = self.selectedShape.copy()
-                self.repaint()
+                self.update()
             return
 
         # Polygon/Vertex moving.
@@ -213,7 +231,7 @@ class Canvas(QWidget):
                                 self.modifyingVertexStatus = True
                             self.boundedMoveVertex(pos)
                             self.shapeMoved.emit()
-                            self.repaint()
+                            self.updateDamage()
                         elif self.selectedShape and self.prevPoint and self.setMoveoffMode is False:
                             if self.modifyingStatus is False:
                                 self.modifyingStatus = True
@@ -221,7 +239,7 @@ class Canvas(QWidget):
                             self.overrideCursor(CURSOR_MOVE)
                             self.boundedMoveShape(self.selectedShape, pos)
                             self.shapeMoved.emit()
-                            self.repaint()
+                            self.updateDamage()
 
                     else:
                         if len(self.selectedMultishape) > 1 and self.prevPoint and self.multiShapeMoveStatus is True and self.setMoveoffMode is False:
@@ -231,12 +249,12 @@ class Canvas(QWidget):
                             self.overrideCursor(CURSOR_MOVE)
                             self.boundedMoveShapeMulti(pos)
                             self.shapeMoved.emit()
-                            self.repaint()
+                            self.updateDamage()
 
                 return
             else:
                 self.moveDragpos = pos
-                self.repaint()
+                self.update()
 
         # Autotracking
         if self.autotrackingMode is True and self.prevPoint and self.selectedShape and len(self.selectedMultishape) == 1:
@@ -244,7 +262,7 @@ class Canvas(QWidget):
             if b_a[0][0] <= pos.x() <= b_a[1][0] and b_a[0][1] <= pos.y() <= b_a[1][1]:
                 self.boundedMoveShape(self.selectedShape, pos)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.updateDamage()
             else:
                 self.trackingMagnetShape(pos)
 
@@ -253,7 +271,8 @@ class Canvas(QWidget):
         # - Highlight vertex
         # Update shape/vertex fill and tooltip value accordingly.
         self.setToolTip("Image")
-        for shape in reversed([s for s in self.shapes if self.isVisible(s)]):
+        previous = self.hShape
+        for shape in self.shapesNear(pos, self.epsilon):
             # Look for a nearby vertex to highlight. If that fails,
             # check if we happen to be inside a shape.
 
@@ -274,7 +293,7 @@ class Canvas(QWidget):
                 self.overrideCursor(CURSOR_POINT)
                 self.setToolTip("Click & drag to move point")
                 self.setStatusTip(self.toolTip())
-                self.update()
+                self.updateHighlight(previous)
                 break
             elif shape.containsPoint(pos):
                 if self.selectedVertex():
@@ -287,12 +306,12 @@ class Canvas(QWidget):
                     self.overrideCursor(CURSOR_GRAB)
                 else:
                     self.overrideCursor(CURSOR_DEFAULT)
-                self.update()
+                self.updateHighlight(previous)
                 break
         else:  # Nothing found, clear highlights, reset state.
             if self.hShape:
                 self.hShape.highlightClear()
-                self.update()
+                self.updateHighlight(previous)
             self.hVertex, self.hShape = None, None
             self.overrideCursor(CURSOR_DEFAULT)
 
@@ -329,13 +348,13 @@ class Canvas(QWidget):
                 # Single shape status
                 if len(self.selectedMultishape) >= 1:
                     self.selectShapePointShift(pos)
-                    self.repaint()
+                    self.update()
 
                 # None shape status
                 else:
                     self.selectShapePoint(pos)
                     self.prevPoint = pos
-                    self.repaint()
+                    self.update()
 
             elif mod == Qt.ControlModifier:
                 if len(self.selectedMultishape) > 1 and self.prevPoint:
@@ -350,17 +369,17 @@ class Canvas(QWidget):
                 else:
                     self.selectShapePoint(pos)
                     self.prevPoint = pos
-                    self.repaint()
+                    self.update()
 
             else:
                 self.selectShapePoint(pos)
                 self.prevPoint = pos
-                self.repaint()
+                self.update()
 
         elif ev.button() == Qt.RightButton and self.editing():
             self.selectShapePoint(pos)
             self.prevPoint = pos
-            self.repaint()
+            self.update()
 
     def mouseReleaseEvent(self, ev):
         pos = self.transformPos(ev.pos())
@@ -373,7 +392,7 @@ class Canvas(QWidget):
                and self.selectedShapeCopy:
                 # Cancel the move by deleting the shadow copy.
                 self.selectedShapeCopy = None
-                self.repaint()
+                self.update()
 
         elif ev.button() == Qt.LeftButton and mod == Qt.ShiftModifier:
             self.endDragpos = pos
@@ -418,12 +437,13 @@ class Canvas(QWidget):
         #del shape.fill_color
         #del shape.line_color
         if copy:
-            self.shapes.append(shape)
+            self.appendShape(shape)
             self.selectedShape.selected = False
             self.selectedShape = shape
-            self.repaint()
+            self.update()
         else:
             self.selectedShape.points = [p for p in shape.points]
+            self.shapeChanged(self.selectedShape)
         self.selectedShapeCopy = None
 
     def hideBackroundShapes(self, value):
@@ -432,7 +452,7 @@ class Canvas(QWidget):
             # Only hide other shapes if there is a current selection.
             # Otherwise the user will not be able to select a shape.
             self.setHiding(True)
-            self.repaint()
+            self.update()
 
     def handleDrawing(self, pos):
         if self.current and self.current.reachMaxPoints() is False:
@@ -504,8 +524,8 @@ class Canvas(QWidget):
                     shape.highlightVertex(index, shape.MOVE_VERTEX)
                     self.selectShape(shape)
                     return
-                for shape in reversed(self.shapes):
-                    if self.isVisible(shape) and shape.containsPoint(point):
+                for shape in self.shapesNear(point):
+                    if shape.containsPoint(point):
                         self.selectShape(shape)
                         self.calculateOffsets(shape, point)
                         return
@@ -516,15 +536,15 @@ class Canvas(QWidget):
                 shape.highlightVertex(index, shape.MOVE_VERTEX)
                 self.selectShape(shape)
                 return
-            for shape in reversed(self.shapes):
-                if self.isVisible(shape) and shape.containsPoint(point):
+            for shape in self.shapesNear(point):
+                if shape.containsPoint(point):
                     self.selectShape(shape)
                     self.calculateOffsets(shape, point)
                     return
 
     def selectShapePointShift(self, point):
-        for shape in reversed(self.shapes):
-            if self.isVisible(shape) and shape.containsPoint(point):
+        for shape in self.shapesNear(point):
+            if shape.containsPoint(point):
                 if len(self.selectedMultishape) > 1:
                     if shape not in self.selectedMultishape:
                         self.selectedMultishape.append(shape)
@@ -555,45 +575,46 @@ class Canvas(QWidget):
     def dragSelectionShape(self):
         pos1 = self.startDragpos
         pos2 = self.endDragpos
-        xlist = [pos1.x(), pos2.x()]
-        ylist = [pos1.y(), pos2.y()]
-
-        if len(self.shapes) > 0:
-            for shape in self.shapes:
-                if self.isVisible(shape):
-                    xsetlist = set(range(int(min(xlist)), int(max(xlist))))
-                    ysetlist = set(range(int(min(ylist)), int(max(ylist))))
-                    pp = self.minmaxShapepoint(shape)
-                    shapexlist = set(range(int(pp[0][0]), int(pp[1][0])))
-                    shapeylist = set(range(int(pp[0][1]), int(pp[1][1])))
-                    xinter = xsetlist & shapexlist
-                    yinter = ysetlist & shapeylist
-                    if bool(xinter) is True and bool(yinter) is True:
-                        appendcheck = True
-                    else:
-                        appendcheck = False
-
-                    if appendcheck is True:
-                        if len(self.selectedMultishape) > 1:
-                            if shape not in self.selectedMultishape:
-                                self.selectedMultishape.append(shape)
-                                self.selectedMultishape[-1].multifill = True
-                                self.update()
-
-                        elif len(self.selectedMultishape) == 1:
-                            if shape not in self.selectedMultishape:
-                                originshape = self.selectedMultishape[0]
-                                self.deSelectShape()
-                                self.selectedMultishape.append(originshape)
-                                self.selectedMultishape.append(shape)
-                                self.selectedMultishape[0].multifill = True
-                                self.selectedMultishape[1].multifill = True
-                                self.selectionMulti.emit(True)
-                                self.update()
-
-                        elif len(self.selectedMultishape) == 0:
-                            self.selectShape(shape)
-                            self.prevPoint = pos2
+        xmin, xmax = sorted([pos1.x(), pos2.x()])
+        ymin, ymax = sorted([pos1.y(), pos2.y()])
+        # Integer pixel spans [x0, x1) overlap when max(x0) < min(x1)
+        bx0, bx1, by0, by1 = int(xmin), int(xmax), int(ymin), int(ymax)
+
+        if len(self.shapeIndex) != len(self.shapes):
+            self.rebuildShapeIndex()
+        # Candidates from the index, in self.shapes order
+        candidates = reversed(self.shapeIndex.query((xmin, ymin, xmax, ymax)))
+        selected = set(self.selectedMultishape)
+        for shape in candidates:
+            if not self.isVisible(shape):
+                continue
+            sx0, sy0, sx1, sy1 = shape.extents()
+            if not (max(bx0, int(sx0)) < min(bx1, int(sx1)) and max(by0, int(sy0)) < min(by1, int(sy1))):
+                continue
+
+            if len(self.selectedMultishape) > 1:
+                if shape not in selected:
+                    self.selectedMultishape.append(shape)
+                    self.selectedMultishape[-1].multifill = True
+                    selected.add(shape)
+                    self.update()
+
+            elif len(self.selectedMultishape) == 1:
+                if shape not in selected:
+                    originshape = self.selectedMultishape[0]
+                    self.deSelectShape()
+                    self.selectedMultishape.append(originshape)
+                    self.selectedMultishape.append(shape)
+                    self.selectedMultishape[0].multifill = True
+                    self.selectedMultishape[1].multifill = True
+                    selected = set(self.selectedMultishape)
+                    self.selectionMulti.emit(True)
+                    self.update()
+
+            elif len(self.selectedMultishape) == 0:
+                self.selectShape(shape)
+                selected = set(self.selectedMultishape)
+                self.prevPoint = pos2
 
     def calculateOffsets(self, shape, point):
         rect = shape.boundingRect()
@@ -677,6 +698,7 @@ class Canvas(QWidget):
             rshift = QPointF(0, shiftPos.y())
         shape.moveVertexBy(rindex, rshift)
         shape.moveVertexBy(lindex, lshift)
+        self.shapeChanged(shape)
 
     def boundedMoveShape(self, shape, pos):
         if self.selectedShape:
@@ -697,6 +719,7 @@ class Canvas(QWidget):
             dp = pos - self.prevPoint
             if dp:
                 shape.moveBy(dp)
+                self.shapeChanged(shape)
                 self.prevPoint = pos
                 return True
             return False
@@ -717,6 +740,7 @@ class Canvas(QWidget):
         if dp:
             for shape in self.selectedMultishape:
                 shape.moveBy(dp)
+                self.shapeChanged(shape)
             self.prevPoint = pos
             return True
         return False
@@ -740,7 +764,7 @@ class Canvas(QWidget):
     def deleteSelected(self):
         if self.selectedShape:
             shape = self.selectedShape
-            self.shapes.remove(self.selectedShape)
+            self.removeShape(self.selectedShape)
             self.selectedShape = None
             self.update()
             return shape
@@ -749,7 +773,7 @@ class Canvas(QWidget):
         if self.selectedShape:
             shape = self.selectedShape.copy()
             self.deSelectShape()
-            self.shapes.append(shape)
+            self.appendShape(shape)
             shape.selected = True
             self.selectedShape = shape
             self.boundedShiftShape(shape)
@@ -776,7 +800,7 @@ class Canvas(QWidget):
         if shape is not None:
             self.deSelectShape()
             shape = shape.copy()
-            self.shapes.append(shape)
+            self.appendShape(shape)
             shape.selected = True
             self.selectedShape = shape
             diff = QPointF(0, 0)
@@ -787,8 +811,14 @@ class Canvas(QWidget):
         if not self.pixmap:
             return super(Canvas, self).paintEvent(event)
 
+        layer = self.backgroundLayer()
         p = self._painter
         p.begin(self)
+        if layer is not None:
+            dpr = layer.devicePixelRatio()
+            target = QRectF(event.rect())
+            p.drawPixmap(target, layer, QRectF(target.x() * dpr, target.y() * dpr,
+                                               target.width() * dpr, target.height() * dpr))
         p.setRenderHint(QPainter.Antialiasing)
         p.setRenderHint(QPainter.HighQualityAntialiasing)
         p.setRenderHint(QPainter.SmoothPixmapTransform)
@@ -796,12 +826,14 @@ class Canvas(QWidget):
         p.scale(self.scale, self.scale)
         p.translate(self.offsetToCenter())
 
-        p.drawPixmap(0, 0, self.pixmap)
+        exposed = self.imageRect(event.rect())
         Shape.scale = self.scale
-        for shape in self.shapes:
-            if (shape.selected or not self._hideBackround) and self.isVisible(shape):
-                shape.fill = shape.selected or shape == self.hShape
-                shape.paint(p)
+        if layer is not None:
+            # Only the shapes being interacted with are painted every frame
+            self.paintShapes(p, [s for s in self.shapes if s in self._layerActive], exposed)
+        else:
+            self.paintImage(p, exposed)
+            self.paintShapes(p, self.shapes, exposed)
         if self.current:
             self.current.paint(p)
             self.line.paint(p)
@@ -846,6 +878,94 @@ class Canvas(QWidget):
 
         p.end()
 
+    def imageRect(self, widgetRect):
+        """Widget rect to the covered image area, in image coordinates."""
+        widgetRect = QRectF(widgetRect)
+        return QRectF(self.transformPos(widgetRect.topLeft()),
+                      self.transformPos(widgetRect.bottomRight())).adjusted(-1, -1, 1, 1)
+
+    def paintImage(self, p, exposed):
+        if self.tiles is not None:
+            # Only the exposed tiles, at the resolution matching the zoom
+            p.save()
+            p.setRenderHint(QPainter.Antialiasing, False)
+            self.tiles.draw(p, exposed, self.scale)
+            p.restore()
+        else:
+            source = exposed.toAlignedRect().intersected(self.pixmap.rect())
+            p.drawPixmap(QRectF(source), self.pixmap, QRectF(source))
+
+    def paintShapes(self, p, shapes, exposed):
+        for shape in shapes:
+            if (shape.selected or not self._hideBackround) and self.isVisible(shape) \
+                    and self.paintedRect(shape).intersects(exposed):
+                shape.fill = shape.selected or shape == self.hShape
+                shape.paint(p)
+
+    def activeShapes(self):
+        """Shapes drawn on top of the background layer."""
+        active = set(self.selectedMultishape)
+        for shape in (self.selectedShape, self.hShape):
+            if shape is not None:
+                active.add(shape)
+        return active
+
+    def invalidateLayer(self):
+        """Rebuild the background layer, e.g. after shape colors or labels changed."""
+        self._layer = None
+        self.update()
+
+    def backgroundLayer(self):
+        """Offscreen pixmap of the image and of the shapes that are not
+        selected or hovered, or None if the canvas is too large to cache.
+
+        It is rebuilt when the scale or size change and patched where
+        inactive shapes change, so dragging or hovering one shape only
+        repaints that shape on top of it.
+        """
+        size = self.size()
+        dpr = self.devicePixelRatioF() if hasattr(self, 'devicePixelRatioF') else 1.0
+        if size.width() * size.height() * dpr * dpr > LAYER_MAX_PIXELS:
+            self._layer = None
+            return None
+
+        active = self.activeShapes()
+        key = (self.scale, size, dpr, self._hideBackround)
+        if self._layer is None or key != self._layerKey:
+            self._layer = QPixmap(int(math.ceil(size.width() * dpr)), int(math.ceil(size.height() * dpr)))
+            self._layer.setDevicePixelRatio(dpr)
+            # Gives the pixmap an alpha channel, outside the image the palette shows through
+            self._layer.fill(Qt.transparent)
+            self._layerKey = key
+            dirty = QRegion(self.rect())
+        else:
+            dirty = self._layerDirty
+            # Shapes that were selected or hovered move between the layers
+            for shape in active.symmetric_difference(self._layerActive):
+                if shape.points:
+                    dirty = dirty.united(self.widgetRect(self.paintedRect(shape)))
+        self._layerActive = frozenset(active)
+        self._layerDirty = QRegion()
+        if dirty.isEmpty():
+            return self._layer
+
+        p = QPainter(self._layer)
+        p.setClipRegion(dirty)
+        p.setCompositionMode(QPainter.CompositionMode_Source)
+        p.fillRect(dirty.boundingRect(), Qt.transparent)
+        p.setCompositionMode(QPainter.CompositionMode_SourceOver)
+        p.setRenderHint(QPainter.Antialiasing)
+        p.setRenderHint(QPainter.HighQualityAntialiasing)
+        p.setRenderHint(QPainter.SmoothPixmapTransform)
+        p.scale(self.scale, self.scale)
+        p.translate(self.offsetToCenter())
+        exposed = self.imageRect(dirty.boundingRect())
+        self.paintImage(p, exposed)
+        Shape.scale = self.scale
+        self.paintShapes(p, [s for s in self.shapes if s not in active], exposed)
+        p.end()
+        return self._layer
+
     def transformPos(self, point):
         """Convert from widget-logical coordinates to painter-logical coordinates."""
         return point / self.scale - self.offsetToCenter()
@@ -872,7 +992,7 @@ class Canvas(QWidget):
             return
 
         self.current.close()
-        self.shapes.append(self.current)
+        self.appendShape(self.current)
         self.current = None
         self.setHiding(False)
         self.newShape.emit()
@@ -937,21 +1057,21 @@ class Canvas(QWidget):
                 yield d, i, (x, y)
 
     def vertexPosition(self, shape):
-        xlist = [shape.points[0].x(), shape.points[1].x(), shape.points[2].x(), shape.points[3].x()]
-        ylist = [shape.points[0].y(), shape.points[1].y(), shape.points[2].y(), shape.points[3].y()]
+        minX, minY, maxX, maxY = shape.extents()
         indexlist = [None, None, None, None]
 
         for i in range(0, 4):
-            if xlist[i] == min(xlist) and ylist[i] == min(ylist):
+            x, y = shape.points[i].x(), shape.points[i].y()
+            if x == minX and y == minY:
                 indexlist[0] = i
                 continue
-            if xlist[i] == max(xlist) and ylist[i] == min(ylist):
+            if x == maxX and y == minY:
                 indexlist[1] = i
                 continue
-            if xlist[i] == max(xlist) and ylist[i] == max(ylist):
+            if x == maxX and y == maxY:
                 indexlist[2] = i
                 continue
-            if xlist[i] == min(xlist) and ylist[i] == max(ylist):
+            if x == minX and y == maxY:
                 indexlist[3] = i
                 continue
         return indexlist
@@ -1163,41 +1283,41 @@ class Canvas(QWidget):
                 changeStatus = True
 
             if changeStatus is True and changeMethod == 0:
-                self.selectedShape.points[ilist[0]] += QPointF(xvalue, yvalue)
-                self.selectedShape.points[ilist[1]] += QPointF(xvalue, yvalue)
-                self.selectedShape.points[ilist[2]] += QPointF(xvalue, yvalue)
-                self.selectedShape.points[ilist[3]] += QPointF(xvalue, yvalue)
+                self.selectedShape[ilist[0]] += QPointF(xvalue, yvalue)
+                self.selectedShape[ilist[1]] += QPointF(xvalue, yvalue)
+                self.selectedShape[ilist[2]] += QPointF(xvalue, yvalue)
+                self.selectedShape[ilist[3]] += QPointF(xvalue, yvalue)
 
             if changeStatus is True and changeMethod == 1:
-                self.selectedShape.points[ilist[directionVar[0][0]]] += QPointF(xvalue, yvalue)
-                self.selectedShape.points[ilist[directionVar[0][1]]] += QPointF(xvalue, yvalue)
+                self.selectedShape[ilist[directionVar[0][0]]] += QPointF(xvalue, yvalue)
+                self.selectedShape[ilist[directionVar[0][1]]] += QPointF(xvalue, yvalue)
 
         # Reduction (Normal)
         if changeMethod == 2 and reversed is False:
             if directionVar[2] == '-x' or directionVar[2] == '+x':
                 if self.selectedShape.points[ilist[0]].x() + changeValue < self.selectedShape.points[ilist[1]].x():
-                    self.selectedShape.points[ilist[directionVar[1][0]]] += QPointF(xvalue, yvalue)
-                    self.selectedShape.points[ilist[directionVar[1][1]]] += QPointF(xvalue, yvalue)
+                    self.selectedShape[ilist[directionVar[1][0]]] += QPointF(xvalue, yvalue)
+                    self.selectedShape[ilist[directionVar[1][1]]] += QPointF(xvalue, yvalue)
                     changeStatus = True
 
             elif directionVar[2] == '-y' or directionVar[2] == '+y':
                 if self.selectedShape.points[ilist[0]].y() + changeValue < self.selectedShape.points[ilist[3]].y():
-                    self.selectedShape.points[ilist[directionVar[1][0]]] += QPointF(xvalue, yvalue)
-                    self.selectedShape.points[ilist[directionVar[1][1]]] += QPointF(xvalue, yvalue)
+                    self.selectedShape[ilist[directionVar[1][0]]] += QPointF(xvalue, yvalue)
+                    self.selectedShape[ilist[directionVar[1][1]]] += QPointF(xvalue, yvalue)
                     changeStatus = True
 
         # Reduction (Reversed)
         if changeMethod == 2 and reversed is True:
             if directionVar[2] == '-x' or directionVar[2] == '+x':
                 if self.selectedShape.points[ilist[0]].x() + changeValue < self.selectedShape.points[ilist[1]].x():
-                    self.selectedShape.points[ilist[directionVar[0][0]]] -= QPointF(xvalue, yvalue)
-                    self.selectedShape.points[ilist[directionVar[0][1]]] -= QPointF(xvalue, yvalue)
+                    self.selectedShape[ilist[directionVar[0][0]]] -= QPointF(xvalue, yvalue)
+                    self.selectedShape[ilist[directionVar[0][1]]] -= QPointF(xvalue, yvalue)
                     changeStatus = True
 
             elif directionVar[2] == '-y' or directionVar[2] == '+y':
                 if self.selectedShape.points[ilist[0]].y() + changeValue < self.selectedShape.points[ilist[3]].y():
-                    self.selectedShape.points[ilist[directionVar[0][0]]] -= QPointF(xvalue, yvalue)
-                    self.selectedShape.points[ilist[directionVar[0][1]]] -= QPointF(xvalue, yvalue)
+                    self.selectedShape[ilist[directionVar[0][0]]] -= QPointF(xvalue, yvalue)
+                    self.selectedShape[ilist[directionVar[0][1]]] -= QPointF(xvalue, yvalue)
                     changeStatus = True
 
         if changeStatus is True:
@@ -1214,8 +1334,9 @@ class Canvas(QWidget):
                 self.arrowkeysPixelValue[1] = int(abs(yvalue))
 
             self.keypressUndo.emit()
+            self.shapeChanged(self.selectedShape)
             self.shapeMoved.emit()
-            self.repaint()
+            self.updateDamage()
 
     def setHorizontalcutMode(self, clicked):
         self.setHorizontalcutStatus = clicked
@@ -1241,13 +1362,14 @@ class Canvas(QWidget):
             imageheight = self.pixmap.height()
 
             if xcenter + ydiff <= imagewidth and ycenter + xdiff <= imageheight and ycenter - xdiff >= 0 and xcenter - ydiff >= 0:
-                self.selectedShape.points[0] = QPointF(xcenter - ydiff, ycenter - xdiff)
-                self.selectedShape.points[1] = QPointF(xcenter + ydiff, ycenter - xdiff)
-                self.selectedShape.points[2] = QPointF(xcenter + ydiff, ycenter + xdiff)
-                self.selectedShape.points[3] = QPointF(xcenter - ydiff, ycenter + xdiff)
+                self.selectedShape[0] = QPointF(xcenter - ydiff, ycenter - xdiff)
+                self.selectedShape[1] = QPointF(xcenter + ydiff, ycenter - xdiff)
+                self.selectedShape[2] = QPointF(xcenter + ydiff, ycenter + xdiff)
+                self.selectedShape[3] = QPointF(xcenter - ydiff, ycenter + xdiff)
+                self.shapeChanged(self.selectedShape)
                 self.shapeMoved.emit()
                 self.rotateUndo.emit()
-                self.repaint()
+                self.updateDamage()
 
     def clickmoveShape(self, clickpos):
         if self.selectedShape:
@@ -1267,102 +1389,111 @@ class Canvas(QWidget):
 
             # normal
             if clickpos.x() + xdiff <= imagewidth and clickpos.y() + ydiff <= imageheight and clickpos.y() - ydiff >= 0 and clickpos.x() - xdiff >= 0:
-                self.selectedShape.points[0] = QPointF(clickpos.x() - xdiff, clickpos.y() - ydiff)
-                self.selectedShape.points[1] = QPointF(clickpos.x() + xdiff, clickpos.y() - ydiff)
-                self.selectedShape.points[2] = QPointF(clickpos.x() + xdiff, clickpos.y() + ydiff)
-                self.selectedShape.points[3] = QPointF(clickpos.x() - xdiff, clickpos.y() + ydiff)
+                self.selectedShape[0] = QPointF(clickpos.x() - xdiff, clickpos.y() - ydiff)
+                self.selectedShape[1] = QPointF(clickpos.x() + xdiff, clickpos.y() - ydiff)
+                self.selectedShape[2] = QPointF(clickpos.x() + xdiff, clickpos.y() + ydiff)
+                self.selectedShape[3] = QPointF(clickpos.x() - xdiff, clickpos.y() + ydiff)
+                self.shapeChanged(self.selectedShape)
                 self.shapeMoved.emit()
                 if len(self.shapes) > 0:
                     self.clickmoveUndo.emit()
-                self.repaint()
+                self.updateDamage()
 
             # Left Top
             elif clickpos.x() + xdiff <= imagewidth and clickpos.y() + ydiff <= imageheight and clickpos.y() - ydiff < 0 and clickpos.x() - xdiff < 0:
-                self.selectedShape.points[0] = QPointF(0.0, 0.0)
-                self.selectedShape.points[1] = QPointF(xdiff * 2, 0.0)
-                self.selectedShape.points[2] = QPointF(xdiff * 2, ydiff * 2)
-                self.selectedShape.points[3] = QPointF(0.0, ydiff * 2)
+                self.selectedShape[0] = QPointF(0.0, 0.0)
+                self.selectedShape[1] = QPointF(xdiff * 2, 0.0)
+                self.selectedShape[2] = QPointF(xdiff * 2, ydiff * 2)
+                self.selectedShape[3] = QPointF(0.0, ydiff * 2)
+                self.shapeChanged(self.selectedShape)
                 self.shapeMoved.emit()
                 if len(self.shapes) > 0:
                     self.clickmoveUndo.emit()
-                self.repaint()
+                self.updateDamage()
 
             # Left
             elif clickpos.x() + xdiff <= imagewidth and clickpos.y() + ydiff <= imageheight and clickpos.y() - ydiff >= 0 and clickpos.x() - xdiff < 0:
-                self.selectedShape.points[0] = QPointF(0.0, clickpos.y() - ydiff)
-                self.selectedShape.points[1] = QPointF(xdiff * 2, clickpos.y() - ydiff)
-                self.selectedShape.points[2] = QPointF(xdiff * 2, clickpos.y() + ydiff)
-                self.selectedShape.points[3] = QPointF(0.0, clickpos.y() + ydiff)
+                self.selectedShape[0] = QPointF(0.0, clickpos.y() - ydiff)
+                self.selectedShape[1] = QPointF(xdiff * 2, clickpos.y() - ydiff)
+                self.selectedShape[2] = QPointF(xdiff * 2, clickpos.y() + ydiff)
+                self.selectedShape[3] = QPointF(0.0, clickpos.y() + ydiff)
+                self.shapeChanged(self.selectedShape)
                 self.shapeMoved.emit()
                 if len(self.shapes) > 0:
                     self.clickmoveUndo.emit()
-                self.repaint()
+                self.updateDamage()
 
             # Left Bottom
             elif clickpos.x() + xdiff <= imagewidth and clickpos.y() + ydiff > imageheight and clickpos.y() - ydiff >= 0 and clickpos.x() - xdiff < 0:
-                self.selectedShape.points[0] = QPointF(0.0, imageheight - (ydiff * 2))
-                self.selectedShape.points[1] = QPointF(xdiff * 2, imageheight - (ydiff * 2))
-                self.selectedShape.points[2] = QPointF(xdiff * 2, imageheight)
-                self.selectedShape.points[3] = QPointF(0.0, imageheight)
+                self.selectedShape[0] = QPointF(0.0, imageheight - (ydiff * 2))
+                self.selectedShape[1] = QPointF(xdiff * 2, imageheight - (ydiff * 2))
+                self.selectedShape[2] = QPointF(xdiff * 2, imageheight)
+                self.selectedShape[3] = QPointF(0.0, imageheight)
+                self.shapeChanged(self.selectedShape)
                 self.shapeMoved.emit()
                 if len(self.shapes) > 0:
                     self.clickmoveUndo.emit()
-                self.repaint()
+                self.updateDamage()
 
             # Top
             elif clickpos.x() + xdiff <= imagewidth and clickpos.y() + ydiff <= imageheight and clickpos.y() - ydiff < 0 and clickpos.x() - xdiff >= 0:
-                self.selectedShape.points[0] = QPointF(clickpos.x() - xdiff, 0.0)
-                self.selectedShape.points[1] = QPointF(clickpos.x() + xdiff, 0.0)
-                self.selectedShape.points[2] = QPointF(clickpos.x() + xdiff, ydiff * 2)
-                self.selectedShape.points[3] = QPointF(clickpos.x() - xdiff, ydiff * 2)
+                self.selectedShape[0] = QPointF(clickpos.x() - xdiff, 0.0)
+                self.selectedShape[1] = QPointF(clickpos.x() + xdiff, 0.0)
+                self.selectedShape[2] = QPointF(clickpos.x() + xdiff, ydiff * 2)
+                self.selectedShape[3] = QPointF(clickpos.x() - xdiff, ydiff * 2)
+                self.shapeChanged(self.selectedShape)
                 self.shapeMoved.emit()
                 if len(self.shapes) > 0:
                     self.clickmoveUndo.emit()
-                self.repaint()
+                self.updateDamage()
 
             # Bottom
             elif clickpos.x() + xdiff <= imagewidth and clickpos.y() + ydiff > imageheight and clickpos.y() - ydiff >= 0 and clickpos.x() - xdiff >= 0:
-                self.selectedShape.points[0] = QPointF(clickpos.x() - xdiff, imageheight - (ydiff * 2))
-                self.selectedShape.points[1] = QPointF(clickpos.x() + xdiff, imageheight - (ydiff * 2))
-                self.selectedShape.points[2] = QPointF(clickpos.x() + xdiff, imageheight)
-                self.selectedShape.points[3] = QPointF(clickpos.x() - xdiff, imageheight)
+                self.selectedShape[0] = QPointF(clickpos.x() - xdiff, imageheight - (ydiff * 2))
+                self.selectedShape[1] = QPointF(clickpos.x() + xdiff, imageheight - (ydiff * 2))
+                self.selectedShape[2] = QPointF(clickpos.x() + xdiff, imageheight)
+                self.selectedShape[3] = QPointF(clickpos.x() - xdiff, imageheight)
+                self.shapeChanged(self.selectedShape)
                 self.shapeMoved.emit()
                 if len(self.shapes) > 0:
                     self.clickmoveUndo.emit()
-                self.repaint()
+                self.updateDamage()
 
             # Right Top
             elif clickpos.x() + xdiff > imagewidth and clickpos.y() + ydiff <= imageheight and clickpos.y() - ydiff < 0 and clickpos.x() - xdiff >= 0:
-                self.selectedShape.points[0] = QPointF(imagewidth - (xdiff * 2), 0.0)
-                self.selectedShape.points[1] = QPointF(imagewidth, 0.0)
-                self.selectedShape.points[2] = QPointF(imagewidth, ydiff * 2)
-                self.selectedShape.points[3] = QPointF(imagewidth - (xdiff * 2), ydiff * 2)
+                self.selectedShape[0] = QPointF(imagewidth - (xdiff * 2), 0.0)
+                self.selectedShape[1] = QPointF(imagewidth, 0.0)
+                self.selectedShape[2] = QPointF(imagewidth, ydiff * 2)
+                self.selectedShape[3] = QPointF(imagewidth - (xdiff * 2), ydiff * 2)
+                self.shapeChanged(self.selectedShape)
                 self.shapeMoved.emit()
                 if len(self.shapes) > 0:
                     self.clickmoveUndo.emit()
-                self.repaint()
+                self.updateDamage()
 
             # Right
             elif clickpos.x() + xdiff > imagewidth and clickpos.y() + ydiff <= imageheight and clickpos.y() - ydiff >= 0 and clickpos.x() - xdiff >= 0:
-                self.selectedShape.points[0] = QPointF(imagewidth - (xdiff * 2), clickpos.y() - ydiff)
-                self.selectedShape.points[1] = QPointF(imagewidth, clickpos.y() - ydiff)
-                self.selectedShape.points[2] = QPointF(imagewidth, clickpos.y() + ydiff)
-                self.selectedShape.points[3] = QPointF(imagewidth - (xdiff * 2), clickpos.y() + ydiff)
+                self.selectedShape[0] = QPointF(imagewidth - (xdiff * 2), clickpos.y() - ydiff)
+                self.selectedShape[1] = QPointF(imagewidth, clickpos.y() - ydiff)
+                self.selectedShape[2] = QPointF(imagewidth, clickpos.y() + ydiff)
+                self.selectedShape[3] = QPointF(imagewidth - (xdiff * 2), clickpos.y() + ydiff)
+                self.shapeChanged(self.selectedShape)
                 self.shapeMoved.emit()
                 if len(self.shapes) > 0:
                     self.clickmoveUndo.emit()
-                self.repaint()
+                self.updateDamage()
 
             # Right Bottom
             elif clickpos.x() + xdiff > imagewidth and clickpos.y() + ydiff > imageheight and clickpos.y() - ydiff >= 0 and clickpos.x() - xdiff >= 0:
-                self.selectedShape.points[0] = QPointF(imagewidth - (xdiff * 2), imageheight - (ydiff * 2))
-                self.selectedShape.points[1] = QPointF(imagewidth, imageheight - (ydiff * 2))
-                self.selectedShape.points[2] = QPointF(imagewidth, imageheight)
-                self.selectedShape.points[3] = QPointF(imagewidth - (xdiff * 2), imageheight)
+                self.selectedShape[0] = QPointF(imagewidth - (xdiff * 2), imageheight - (ydiff * 2))
+                self.selectedShape[1] = QPointF(imagewidth, imageheight - (ydiff * 2))
+                self.selectedShape[2] = QPointF(imagewidth, imageheight)
+                self.selectedShape[3] = QPointF(imagewidth - (xdiff * 2), imageheight)
+                self.shapeChanged(self.selectedShape)
                 self.shapeMoved.emit()
                 if len(self.shapes) > 0:
                     self.clickmoveUndo.emit()
-                self.repaint()
+                self.updateDamage()
 
             # pointlist = []
             # boollist = []
@@ -1393,38 +1524,40 @@ class Canvas(QWidget):
             ydiff = ycenter - min(ylist)
 
             if clickpos is None:
-                self.selectedShape.points[0] = QPointF(xcenter - xdiff, ycenter - ydiff)
-                self.selectedShape.points[1] = QPointF(xcenter + xdiff, ycenter - ydiff)
-                self.selectedShape.points[2] = QPointF(xcenter + xdiff, ycenter)
-                self.selectedShape.points[3] = QPointF(xcenter - xdiff, ycenter)
+                self.selectedShape[0] = QPointF(xcenter - xdiff, ycenter - ydiff)
+                self.selectedShape[1] = QPointF(xcenter + xdiff, ycenter - ydiff)
+                self.selectedShape[2] = QPointF(xcenter + xdiff, ycenter)
+                self.selectedShape[3] = QPointF(xcenter - xdiff, ycenter)
+                self.shapeChanged(self.selectedShape)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.updateDamage()
 
                 shape = self.selectedShape.copy()
-                shape.points[0] = QPointF(xcenter - xdiff, ycenter)
-                shape.points[1] = QPointF(xcenter + xdiff, ycenter)
-                shape.points[2] = QPointF(xcenter + xdiff, ycenter + ydiff)
-                shape.points[3] = QPointF(xcenter - xdiff, ycenter + ydiff)
+                shape[0] = QPointF(xcenter - xdiff, ycenter)
+                shape[1] = QPointF(xcenter + xdiff, ycenter)
+                shape[2] = QPointF(xcenter + xdiff, ycenter + ydiff)
+                shape[3] = QPointF(xcenter - xdiff, ycenter + ydiff)
 
             else:
-                self.selectedShape.points[0] = QPointF(xcenter - xdiff, ycenter - ydiff)
-                self.selectedShape.points[1] = QPointF(xcenter + xdiff, ycenter - ydiff)
-                self.selectedShape.points[2] = QPointF(xcenter + xdiff, clickpos.y())
-                self.selectedShape.points[3] = QPointF(xcenter - xdiff, clickpos.y())
+                self.selectedShape[0] = QPointF(xcenter - xdiff, ycenter - ydiff)
+                self.selectedShape[1] = QPointF(xcenter + xdiff, ycenter - ydiff)
+                self.selectedShape[2] = QPointF(xcenter + xdiff, clickpos.y())
+                self.selectedShape[3] = QPointF(xcenter - xdiff, clickpos.y())
+                self.shapeChanged(self.selectedShape)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.updateDamage()
 
                 shape = self.selectedShape.copy()
-                shape.points[0] = QPointF(xcenter - xdiff, clickpos.y())
-                shape.points[1] = QPointF(xcenter + xdiff, clickpos.y())
-                shape.points[2] = QPointF(xcenter + xdiff, ycenter + ydiff)
-                shape.points[3] = QPointF(xcenter - xdiff, ycenter + ydiff)
+                shape[0] = QPointF(xcenter - xdiff, clickpos.y())
+                shape[1] = QPointF(xcenter + xdiff, clickpos.y())
+                shape[2] = QPointF(xcenter + xdiff, ycenter + ydiff)
+                shape[3] = QPointF(xcenter - xdiff, ycenter + ydiff)
 
             self.setHorizontalcutStatus = False
             self.prevCutpos = None
 
             self.deSelectShape()
-            self.shapes.append(shape)
+            self.appendShape(shape)
             shape.selected = True
             self.selectedShape = shape
             return shape
@@ -1439,38 +1572,40 @@ class Canvas(QWidget):
             ydiff = ycenter - min(ylist)
 
             if clickpos is None:
-                self.selectedShape.points[0] = QPointF(xcenter - xdiff, ycenter - ydiff)
-                self.selectedShape.points[1] = QPointF(xcenter, ycenter - ydiff)
-                self.selectedShape.points[2] = QPointF(xcenter, ycenter + ydiff)
-                self.selectedShape.points[3] = QPointF(xcenter - xdiff, ycenter + ydiff)
+                self.selectedShape[0] = QPointF(xcenter - xdiff, ycenter - ydiff)
+                self.selectedShape[1] = QPointF(xcenter, ycenter - ydiff)
+                self.selectedShape[2] = QPointF(xcenter, ycenter + ydiff)
+                self.selectedShape[3] = QPointF(xcenter - xdiff, ycenter + ydiff)
+                self.shapeChanged(self.selectedShape)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.updateDamage()
 
                 shape = self.selectedShape.copy()
-                shape.points[0] = QPointF(xcenter, ycenter - ydiff)
-                shape.points[1] = QPointF(xcenter + xdiff, ycenter - ydiff)
-                shape.points[2] = QPointF(xcenter + xdiff, ycenter + ydiff)
-                shape.points[3] = QPointF(xcenter, ycenter + ydiff)
+                shape[0] = QPointF(xcenter, ycenter - ydiff)
+                shape[1] = QPointF(xcenter + xdiff, ycenter - ydiff)
+                shape[2] = QPointF(xcenter + xdiff, ycenter + ydiff)
+                shape[3] = QPointF(xcenter, ycenter + ydiff)
 
             else:
-                self.selectedShape.points[0] = QPointF(xcenter - xdiff, ycenter - ydiff)
-                self.selectedShape.points[1] = QPointF(clickpos.x(), ycenter - ydiff)
-                self.selectedShape.points[2] = QPointF(clickpos.x(), ycenter + ydiff)
-                self.selectedShape.points[3] = QPointF(xcenter - xdiff, ycenter + ydiff)
+                self.selectedShape[0] = QPointF(xcenter - xdiff, ycenter - ydiff)
+                self.selectedShape[1] = QPointF(clickpos.x(), ycenter - ydiff)
+                self.selectedShape[2] = QPointF(clickpos.x(), ycenter + ydiff)
+                self.selectedShape[3] = QPointF(xcenter - xdiff, ycenter + ydiff)
+                self.shapeChanged(self.selectedShape)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.updateDamage()
 
                 shape = self.selectedShape.copy()
-                shape.points[0] = QPointF(clickpos.x(), ycenter - ydiff)
-                shape.points[1] = QPointF(xcenter + xdiff, ycenter - ydiff)
-                shape.points[2] = QPointF(xcenter + xdiff, ycenter + ydiff)
-                shape.points[3] = QPointF(clickpos.x(), ycenter + ydiff)
+                shape[0] = QPointF(clickpos.x(), ycenter - ydiff)
+                shape[1] = QPointF(xcenter + xdiff, ycenter - ydiff)
+                shape[2] = QPointF(xcenter + xdiff, ycenter + ydiff)
+                shape[3] = QPointF(clickpos.x(), ycenter + ydiff)
 
             self.setVerticalcutStatus = False
             self.prevCutpos = None
 
             self.deSelectShape()
-            self.shapes.append(shape)
+            self.appendShape(shape)
             shape.selected = True
             self.selectedShape = shape
             return shape
@@ -1488,60 +1623,62 @@ class Canvas(QWidget):
             shapelist = []
 
             if clickpos is None:
-                self.selectedShape.points[0] = QPointF(xcenter - xdiff, ycenter - ydiff)
-                self.selectedShape.points[1] = QPointF(xcenter, ycenter - ydiff)
-                self.selectedShape.points[2] = QPointF(xcenter, ycenter)
-                self.selectedShape.points[3] = QPointF(xcenter - xdiff, ycenter)
+                self.selectedShape[0] = QPointF(xcenter - xdiff, ycenter - ydiff)
+                self.selectedShape[1] = QPointF(xcenter, ycenter - ydiff)
+                self.selectedShape[2] = QPointF(xcenter, ycenter)
+                self.selectedShape[3] = QPointF(xcenter - xdiff, ycenter)
+                self.shapeChanged(self.selectedShape)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.updateDamage()
 
                 shape1 = self.selectedShape.copy()
-                shape1.points[0] = QPointF(xcenter, ycenter - ydiff)
-                shape1.points[1] = QPointF(xcenter + xdiff, ycenter - ydiff)
-                shape1.points[2] = QPointF(xcenter + xdiff, ycenter)
-                shape1.points[3] = QPointF(xcenter, ycenter)
+                shape1[0] = QPointF(xcenter, ycenter - ydiff)
+                shape1[1] = QPointF(xcenter + xdiff, ycenter - ydiff)
+                shape1[2] = QPointF(xcenter + xdiff, ycenter)
+                shape1[3] = QPointF(xcenter, ycenter)
 
                 shape2 = self.selectedShape.copy()
-                shape2.points[0] = QPointF(xcenter - xdiff, ycenter)
-                shape2.points[1] = QPointF(xcenter, ycenter)
-                shape2.points[2] = QPointF(xcenter, ycenter + ydiff)
-                shape2.points[3] = QPointF(xcenter - xdiff, ycenter + ydiff)
+                shape2[0] = QPointF(xcenter - xdiff, ycenter)
+                shape2[1] = QPointF(xcenter, ycenter)
+                shape2[2] = QPointF(xcenter, ycenter + ydiff)
+                shape2[3] = QPointF(xcenter - xdiff, ycenter + ydiff)
 
                 shape3 = self.selectedShape.copy()
-                shape3.points[0] = QPointF(xcenter, ycenter)
-                shape3.points[1] = QPointF(xcenter + xdiff, ycenter)
-                shape3.points[2] = QPointF(xcenter + xdiff, ycenter + ydiff)
-                shape3.points[3] = QPointF(xcenter, ycenter + ydiff)
+                shape3[0] = QPointF(xcenter, ycenter)
+                shape3[1] = QPointF(xcenter + xdiff, ycenter)
+                shape3[2] = QPointF(xcenter + xdiff, ycenter + ydiff)
+                shape3[3] = QPointF(xcenter, ycenter + ydiff)
 
                 shapelist.append(shape1)
                 shapelist.append(shape2)
                 shapelist.append(shape3)
 
             else:
-                self.selectedShape.points[0] = QPointF(xcenter - xdiff, ycenter - ydiff)
-                self.selectedShape.points[1] = QPointF(clickpos.x(), ycenter - ydiff)
-                self.selectedShape.points[2] = QPointF(clickpos.x(), clickpos.y())
-                self.selectedShape.points[3] = QPointF(xcenter - xdiff, clickpos.y())
+                self.selectedShape[0] = QPointF(xcenter - xdiff, ycenter - ydiff)
+                self.selectedShape[1] = QPointF(clickpos.x(), ycenter - ydiff)
+                self.selectedShape[2] = QPointF(clickpos.x(), clickpos.y())
+                self.selectedShape[3] = QPointF(xcenter - xdiff, clickpos.y())
+                self.shapeChanged(self.selectedShape)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.updateDamage()
 
                 shape1 = self.selectedShape.copy()
-                shape1.points[0] = QPointF(clickpos.x(), ycenter - ydiff)
-                shape1.points[1] = QPointF(xcenter + xdiff, ycenter - ydiff)
-                shape1.points[2] = QPointF(xcenter + xdiff, clickpos.y())
-                shape1.points[3] = QPointF(clickpos.x(), clickpos.y())
+                shape1[0] = QPointF(clickpos.x(), ycenter - ydiff)
+                shape1[1] = QPointF(xcenter + xdiff, ycenter - ydiff)
+                shape1[2] = QPointF(xcenter + xdiff, clickpos.y())
+                shape1[3] = QPointF(clickpos.x(), clickpos.y())
 
                 shape2 = self.selectedShape.copy()
-                shape2.points[0] = QPointF(xcenter - xdiff, clickpos.y())
-                shape2.points[1] = QPointF(clickpos.x(), clickpos.y())
-                shape2.points[2] = QPointF(clickpos.x(), ycenter + ydiff)
-                shape2.points[3] = QPointF(xcenter - xdiff, ycenter + ydiff)
+                shape2[0] = QPointF(xcenter - xdiff, clickpos.y())
+                shape2[1] = QPointF(clickpos.x(), clickpos.y())
+                shape2[2] = QPointF(clickpos.x(), ycenter + ydiff)
+                shape2[3] = QPointF(xcenter - xdiff, ycenter + ydiff)
 
                 shape3 = self.selectedShape.copy()
-                shape3.points[0] = QPointF(clickpos.x(), clickpos.y())
-                shape3.points[1] = QPointF(xcenter + xdiff, clickpos.y())
-                shape3.points[2] = QPointF(xcenter + xdiff, ycenter + ydiff)
-                shape3.points[3] = QPointF(clickpos.x(), ycenter + ydiff)
+                shape3[0] = QPointF(clickpos.x(), clickpos.y())
+                shape3[1] = QPointF(xcenter + xdiff, clickpos.y())
+                shape3[2] = QPointF(xcenter + xdiff, ycenter + ydiff)
+                shape3[3] = QPointF(clickpos.x(), ycenter + ydiff)
 
                 shapelist.append(shape1)
                 shapelist.append(shape2)
@@ -1552,7 +1689,7 @@ class Canvas(QWidget):
 
             self.deSelectShape()
             for shape in shapelist:
-                self.shapes.append(shape)
+                self.appendShape(shape)
                 shape.selected = True
                 self.selectedShape = shape
                 self.deSelectShape()
@@ -1571,39 +1708,41 @@ class Canvas(QWidget):
 
             if clickpos is None:
                 if max(xlist) + xdiff < self.pixmap.width() and max(ylist) + ydiff < self.pixmap.height():
-                    self.selectedShape.points[0] = QPointF(min(xlist), min(ylist))
-                    self.selectedShape.points[1] = QPointF(max(xlist) + xdiff, min(ylist))
-                    self.selectedShape.points[2] = QPointF(max(xlist) + xdiff, max(ylist) + ydiff)
-                    self.selectedShape.points[3] = QPointF(min(xlist), max(ylist) + ydiff)
+                    self.selectedShape[0] = QPointF(min(xlist), min(ylist))
+                    self.selectedShape[1] = QPointF(max(xlist) + xdiff, min(ylist))
+                    self.selectedShape[2] = QPointF(max(xlist) + xdiff, max(ylist) + ydiff)
+                    self.selectedShape[3] = QPointF(min(xlist), max(ylist) + ydiff)
+                    self.shapeChanged(self.selectedShape)
                     self.shapeMoved.emit()
-                    self.repaint()
+                    self.updateDamage()
 
             else:
                 clickxdiff = clickpos.x() - min(xlist)
                 clickydiff = clickpos.y() - min(ylist)
 
                 if clickxdiff > 0 and clickydiff > 0:
-                    self.selectedShape.points[0] = QPointF(min(xlist), min(ylist))
-                    self.selectedShape.points[1] = QPointF(clickpos.x(), min(ylist))
-                    self.selectedShape.points[2] = QPointF(clickpos.x(), clickpos.y())
-                    self.selectedShape.points[3] = QPointF(min(xlist), clickpos.y())
+                    self.selectedShape[0] = QPointF(min(xlist), min(ylist))
+                    self.selectedShape[1] = QPointF(clickpos.x(), min(ylist))
+                    self.selectedShape[2] = QPointF(clickpos.x(), clickpos.y())
+                    self.selectedShape[3] = QPointF(min(xlist), clickpos.y())
                 elif clickxdiff < 0 and clickydiff < 0:
-                    self.selectedShape.points[0] = QPointF(clickpos.x(), clickpos.y())
-                    self.selectedShape.points[1] = QPointF(min(xlist), clickpos.y())
-                    self.selectedShape.points[2] = QPointF(min(xlist), min(ylist))
-                    self.selectedShape.points[3] = QPointF(clickpos.x(), min(ylist))
+                    self.selectedShape[0] = QPointF(clickpos.x(), clickpos.y())
+                    self.selectedShape[1] = QPointF(min(xlist), clickpos.y())
+                    self.selectedShape[2] = QPointF(min(xlist), min(ylist))
+                    self.selectedShape[3] = QPointF(clickpos.x(), min(ylist))
                 elif clickxdiff > 0 and clickydiff < 0:
-                    self.selectedShape.points[0] = QPointF(min(xlist), clickpos.y())
-                    self.selectedShape.points[1] = QPointF(clickpos.x(), clickpos.y())
-                    self.selectedShape.points[2] = QPointF(clickpos.x(), min(ylist))
-                    self.selectedShape.points[3] = QPointF(min(xlist), min(ylist))
+                    self.selectedShape[0] = QPointF(min(xlist), clickpos.y())
+                    self.selectedShape[1] = QPointF(clickpos.x(), clickpos.y())
+                    self.selectedShape[2] = QPointF(clickpos.x(), min(ylist))
+                    self.selectedShape[3] = QPointF(min(xlist), min(ylist))
                 else:
-                    self.selectedShape.points[0] = QPointF(clickpos.x(), min(ylist))
-                    self.selectedShape.points[1] = QPointF(min(xlist), min(ylist))
-                    self.selectedShape.points[2] = QPointF(min(xlist), clickpos.y())
-                    self.selectedShape.points[3] = QPointF(clickpos.x(), clickpos.y())
+                    self.selectedShape[0] = QPointF(clickpos.x(), min(ylist))
+                    self.selectedShape[1] = QPointF(min(xlist), min(ylist))
+                    self.selectedShape[2] = QPointF(min(xlist), clickpos.y())
+                    self.selectedShape[3] = QPointF(clickpos.x(), clickpos.y())
+                self.shapeChanged(self.selectedShape)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.updateDamage()
 
             self.setResizeboxStatus = False
             self.prevCutpos = None
@@ -1624,12 +1763,13 @@ class Canvas(QWidget):
                     xlist.append(p.x())
                     ylist.append(p.y())
 
-            self.shapes[min(picklist)].points[0] = QPointF(min(xlist), min(ylist))
-            self.shapes[min(picklist)].points[1] = QPointF(max(xlist), min(ylist))
-            self.shapes[min(picklist)].points[2] = QPointF(max(xlist), max(ylist))
-            self.shapes[min(picklist)].points[3] = QPointF(min(xlist), max(ylist))
+            self.shapes[min(picklist)][0] = QPointF(min(xlist), min(ylist))
+            self.shapes[min(picklist)][1] = QPointF(max(xlist), min(ylist))
+            self.shapes[min(picklist)][2] = QPointF(max(xlist), max(ylist))
+            self.shapes[min(picklist)][3] = QPointF(min(xlist), max(ylist))
+            self.shapeChanged(self.shapes[min(picklist)])
             self.shapeMoved.emit()
-            self.repaint()
+            self.updateDamage()
             return self.shapes[min(picklist)]
 
     def cancelCutShape(self):
@@ -1674,20 +1814,127 @@ class Canvas(QWidget):
 
             # condition
             if pos.x() + xdiff <= imagewidth and pos.y() + ydiff <= imageheight and pos.y() - ydiff >= 0 and pos.x() - xdiff >= 0:
-                self.selectedShape.points[0] = QPointF(pos.x() - xdiff, pos.y() - ydiff)
-                self.selectedShape.points[1] = QPointF(pos.x() + xdiff, pos.y() - ydiff)
-                self.selectedShape.points[2] = QPointF(pos.x() + xdiff, pos.y() + ydiff)
-                self.selectedShape.points[3] = QPointF(pos.x() - xdiff, pos.y() + ydiff)
+                self.selectedShape[0] = QPointF(pos.x() - xdiff, pos.y() - ydiff)
+                self.selectedShape[1] = QPointF(pos.x() + xdiff, pos.y() - ydiff)
+                self.selectedShape[2] = QPointF(pos.x() + xdiff, pos.y() + ydiff)
+                self.selectedShape[3] = QPointF(pos.x() - xdiff, pos.y() + ydiff)
+                self.shapeChanged(self.selectedShape)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.updateDamage()
 
                 self.calculateOffsets(self.selectedShape, pos)
                 self.prevPoint = pos
 
     def minmaxShapepoint(self, shape):
-        xlist = [shape.points[0].x(), shape.points[1].x(), shape.points[2].x(), shape.points[3].x()]
-        ylist = [shape.points[0].y(), shape.points[1].y(), shape.points[2].y(), shape.points[3].y()]
-        return [[min(xlist), min(ylist)], [max(xlist), max(ylist)]]
+        minX, minY, maxX, maxY = shape.extents()
+        return [[minX, minY], [maxX, maxY]]
+
+    def shapeRect(self, shape):
+        if not shape.points:
+            return (0, 0, 0, 0)
+        return shape.extents()
+
+    def rebuildShapeIndex(self):
+        # Cells of about 1/64 of the image side keep large boxes cheap to move
+        side = max(self.pixmap.width(), self.pixmap.height()) if self.pixmap else 0
+        self.shapeIndex = GridIndex(max(64, side // 64))
+        for shape in self.shapes:
+            self.shapeIndex.insert(shape, self.shapeRect(shape))
+
+    def appendShape(self, shape):
+        self.shapes.append(shape)
+        self.shapeIndex.insert(shape, self.shapeRect(shape))
+        self.damageShape(shape)
+
+    def insertShape(self, index, shape):
+        self.shapes.insert(index, shape)
+        if len(self.shapeIndex) != len(self.shapes) - 1:
+            self.rebuildShapeIndex()
+        elif index >= len(self.shapes) - 1:
+            self.shapeIndex.insert(shape, self.shapeRect(shape))
+        else:
+            # Stack it between its neighbours
+            above = self.shapeIndex.order(self.shapes[index + 1])
+            below = self.shapeIndex.order(self.shapes[index - 1]) if index > 0 else above - 1
+            order = (below + above) / 2.0
+            if below < order < above:
+                self.shapeIndex.insert(shape, self.shapeRect(shape), order)
+            else:
+                self.rebuildShapeIndex()
+        self.damageShape(shape)
+
+    def removeShape(self, shape):
+        self.damageShape(shape)
+        self.shapes.remove(shape)
+        self.shapeIndex.remove(shape)
+
+    def shapeChanged(self, shape):
+        """Must be called after the points of a shape in self.shapes change."""
+        old = self.shapeIndex.rect(shape)
+        if old is not None:
+            self.damageRect(self.paintedRect(shape, old), shape not in self._layerActive)
+        self.shapeIndex.update(shape, self.shapeRect(shape))
+        self.damageShape(shape)
+
+    def paintedRect(self, shape, extents=None):
+        """Area painted by shape in image coordinates, vertices and label included."""
+        if extents is None:
+            extents = self.shapeRect(shape)
+        minX, minY, maxX, maxY = extents
+        # Vertex markers are sized in screen pixels, up to 4x when highlighted
+        margin = (Shape.point_size * 2 + 2) / self.scale
+        rect = QRectF(minX - margin, minY - margin,
+                      maxX - minX + 2 * margin, maxY - minY + 2 * margin)
+        if shape.paintLabel and shape.label:
+            if self._labelMetrics is None:
+                # Same font as Shape.paint
+                font = QFont()
+                font.setPointSize(8)
+                font.setBold(True)
+                self._labelMetrics = QFontMetricsF(font)
+            baseline = minY + MIN_Y_LABEL if minY < MIN_Y_LABEL else minY
+            rect = rect.united(self._labelMetrics.boundingRect(shape.label)
+                               .translated(minX, baseline).adjusted(-1, -1, 1, 1))
+        return rect
+
+    def widgetRect(self, rect):
+        """Image rect to the widget pixels it covers."""
+        s = self.scale
+        offset = self.offsetToCenter()
+        widgetRect = QRectF((rect.x() + offset.x()) * s, (rect.y() + offset.y()) * s,
+                            rect.width() * s, rect.height() * s)
+        return widgetRect.toAlignedRect().adjusted(-2, -2, 2, 2)
+
+    def damageRect(self, rect, layer=True):
+        """Mark rect (image coordinates) for repainting at the next updateDamage,
+        in the background layer too unless layer is False."""
+        widgetRect = self.widgetRect(rect)
+        self._damage = self._damage.united(widgetRect)
+        if layer:
+            self._layerDirty = self._layerDirty.united(widgetRect)
+
+    def damageShape(self, shape):
+        if shape.points:
+            self.damageRect(self.paintedRect(shape), shape not in self._layerActive)
+
+    def updateDamage(self):
+        """Schedule a repaint of the damaged area only; Qt coalesces these per frame."""
+        if not self._damage.isEmpty():
+            self.update(self._damage)
+            self._damage = QRegion()
+
+    def updateHighlight(self, previous):
+        for shape in (previous, self.hShape):
+            if shape is not None:
+                self.damageShape(shape)
+        self.updateDamage()
+
+    def shapesNear(self, point, margin=0):
+        """Visible shapes whose bounding rect is within margin of point, topmost first."""
+        if len(self.shapeIndex) != len(self.shapes):
+            self.rebuildShapeIndex()
+        return [s for s in self.shapeIndex.queryPoint(point.x(), point.y(), margin)
+                if self.isVisible(s)]
 
     def selectedShapeBoundary(self, p, eps, pos):
         if p[0][0] <= pos.x() <= p[1][0] and p[0][1] <= pos.y() <= p[1][1]:
@@ -1721,6 +1968,7 @@ class Canvas(QWidget):
     def undoLastLine(self):
         assert self.shapes
         self.current = self.shapes.pop()
+        self.shapeIndex.remove(self.current)
         self.current.setOpen()
         self.line.points = [self.current[-1], self.current[0]]
         self.drawingPolygon.emit(True)
@@ -1728,6 +1976,7 @@ class Canvas(QWidget):
     def resetAllLines(self):
         assert self.shapes
         self.current = self.shapes.pop()
+        self.shapeIndex.remove(self.current)
         self.current.setOpen()
         self.line.points = [self.current[-1], self.current[0]]
         self.drawingPolygon.emit(True)
@@ -1735,19 +1984,47 @@ class Canvas(QWidget):
         self.drawingPolygon.emit(False)
         self.update()
 
+    def loadImage(self, image):
+        """Show image; very large ones are tiled rather than converted to a
+        full resolution pixmap, pixmap then only holds their size."""
+        if not needsTiles(image.width(), image.height()):
+            self.loadPixmap(QPixmap.fromImage(image))
+            return
+        self.loadPixmap(PixmapExtent(image.width(), image.height()))
+        self.tiles = TilePyramid(image)
+        self.tiles.levelReady.connect(self.tilesReady)
+        self.tiles.build()
+
+    def tilesReady(self, level):
+        if self.sender() is self.tiles:
+            self._layer = None
+            self.update()
+
+    def clearTiles(self):
+        if self.tiles is not None:
+            self.tiles.cancel()
+            self.tiles.levelReady.disconnect(self.tilesReady)
+            self.tiles = None
+
     def loadPixmap(self, pixmap):
         self.pixmap = pixmap
+        self.clearTiles()
         self.shapes = []
-        self.repaint()
+        self.rebuildShapeIndex()
+        self._layer = None
+        self.update()
 
     def loadShapes(self, shapes):
         self.shapes = list(shapes)
+        self.rebuildShapeIndex()
+        self._layer = None
         self.current = None
-        self.repaint()
+        self.update()
 
     def setShapeVisible(self, shape, value):
         self.visible[shape] = value
-        self.repaint()
+        self.damageShape(shape)
+        self.updateDamage()
 
     def currentCursor(self):
         cursor = QApplication.overrideCursor()
@@ -1768,6 +2045,8 @@ class Canvas(QWidget):
     def resetState(self):
         self.restoreCursor()
         self.pixmap = None
+        self.clearTiles()
+        self._layer = None
         self.update()
 
     def setDrawingShapeToSquare(self, status):
@@ -16,3 +16,7 @@ FORMAT_PASCALVOC='PascalVOC'
 FORMAT_YOLO='YOLO'
 SETTING_DRAW_SQUARE = 'draw/square'
 DEFAULT_ENCODING = 'utf-8'
+SETTING_PREFETCH_NEXT = 'prefetch/next'
+SETTING_PREFETCH_PREV = 'prefetch/prev'
+SETTING_CACHE_SIZE = 'cache/size'
+SETTING_UNDO_LIMIT = 'undo/limit'
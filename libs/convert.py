@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Convert the annotations of a dataset between Pascal VOC and YOLO.
+
+    labelImg-convert DIR --to yolo [--out DIR] [--images DIR] [--classes FILE]
+    labelImg-convert DIR --to voc [--out DIR] [--images DIR]
+
+Files are converted in parallel by a pool of processes, which only need
+the Qt-free libs.core. An annotation whose output is newer than it is left
+alone, so a conversion that was interrupted carries on where it stopped
+when run again. Files with boxes outside their image are reported, not
+converted.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from libs.core import Box, PascalVocReader, PascalVocWriter, PascalVocParseError, YoloReader, \
+    YOLOWriter, TXT_EXT, XML_EXT, addBoxes, classListData, imageSize, validateBoxes, writeAtomic
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tif', '.tiff', '.webp',
+                    '.pbm', '.pgm', '.ppm', '.xbm', '.xpm')
+CLASSES_FILE = 'classes.txt'
+
+# Annotations handed to a worker at a time, and seconds between progress lines
+CONVERT_CHUNK = 64
+PROGRESS_INTERVAL = 1.0
+
+CONVERTED = 'converted'
+SKIPPED = 'up to date'
+FAILED = 'failed'
+# A YOLO conversion that needs classes missing from the class list
+NEW_CLASSES = 'new classes'
+
+# Settings of the conversion in a worker process
+_classes = []
+_force = False
+
+
+def findJobs(source, out, to, images=None):
+    """[(annotation, image, target)] of the annotations under source.
+
+    image is the file beside the annotation, or at the same place under
+    images, with the same base name; None if there is none.
+    """
+    sourceExt, targetExt = (XML_EXT, TXT_EXT) if to == 'yolo' else (TXT_EXT, XML_EXT)
+    jobs = []
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        relative = os.path.relpath(root, source)
+        imageDir = root if images is None else os.path.normpath(os.path.join(images, relative))
+        if imageDir != root:
+            try:
+                imageFiles = os.listdir(imageDir)
+            except OSError:
+                imageFiles = []
+        else:
+            imageFiles = files
+        imagesByBase = {}
+        for name in sorted(imageFiles):
+            base, ext = os.path.splitext(name)
+            if ext.lower() in IMAGE_EXTENSIONS:
+                imagesByBase.setdefault(base, os.path.join(imageDir, name))
+        for name in sorted(files):
+            base, ext = os.path.splitext(name)
+            if ext != sourceExt or name == CLASSES_FILE:
+                continue
+            target = os.path.normpath(os.path.join(out, relative, base + targetExt))
+            jobs.append((os.path.join(root, name), imagesByBase.get(base), target))
+    return jobs
+
+
+def readClasses(path):
+    """Class names of a classes.txt, [] if there is none."""
+    try:
+        with open(path, 'r') as f:
+            return [line.strip() for line in f if line.strip()]
+    except (IOError, OSError):
+        return []
+
+
+def isUpToDate(target, sources):
+    try:
+        targetTime = os.stat(target).st_mtime_ns
+    except OSError:
+        return False
+    for path in sources:
+        try:
+            if os.stat(path).st_mtime_ns > targetTime:
+                return False
+        except OSError:
+            pass
+    return True
+
+
+def _initWorker(classes, force):
+    global _classes, _force
+    _classes = classes
+    _force = force
+
+
+def _imageShape(image):
+    size = imageSize(image) if image is not None else None
+    if size is None:
+        raise ValueError('size of the image unknown')
+    width, height, depth = size
+    return [height, width, depth]
+
+
+def convertToYolo(job):
+    """(status, detail) of converting a Pascal VOC annotation to YOLO."""
+    annotation, image, target = job
+    try:
+        if not _force and isUpToDate(target, [annotation]):
+            return SKIPPED, None
+        reader = PascalVocReader(annotation, strict=True)
+        boxes = [Box.fromShape(shape) for shape in reader.getShapes()]
+        missing = set(box.label for box in boxes) - set(_classes)
+        if missing:
+            return NEW_CLASSES, sorted(missing)
+        imgSize = reader.imgSize
+        if not imgSize or not imgSize[0] or not imgSize[1]:
+            imgSize = _imageShape(image)
+        validateBoxes(boxes, imgSize)
+        writer = YOLOWriter(None, reader.filename, imgSize, localImgPath=image)
+        addBoxes(writer, boxes)
+        # classes.txt is written once for all by the main process
+        path, data = writer.files(list(_classes), target)[1]
+        writeAtomic(path, data)
+        return CONVERTED, None
+    except PascalVocParseError as e:
+        return FAILED, str(e)
+    except (IOError, OSError, ValueError) as e:
+        return FAILED, '%s: %s' % (annotation, e)
+
+
+def convertToVoc(job):
+    """(status, detail) of converting a YOLO annotation to Pascal VOC."""
+    annotation, image, target = job
+    classesPath = os.path.join(os.path.dirname(annotation), CLASSES_FILE)
+    try:
+        if not _force and isUpToDate(target, [annotation, classesPath]):
+            return SKIPPED, None
+        imgSize = _imageShape(image)
+        reader = YoloReader(annotation, None, classesPath, imgSize=imgSize)
+        boxes = [Box.fromShape(shape) for shape in reader.getShapes()]
+        validateBoxes(boxes, imgSize)
+        folder = os.path.basename(os.path.dirname(image))
+        writer = PascalVocWriter(folder, os.path.basename(image), imgSize, localImgPath=image)
+        addBoxes(writer, boxes)
+        path, data = writer.files(target)[0]
+        writeAtomic(path, data)
+        return CONVERTED, None
+    except (IOError, OSError, ValueError, IndexError) as e:
+        return FAILED, '%s: %s' % (annotation, e)
+
+
+class Progress(object):
+    """Counts finished annotations and prints how far along and how fast."""
+
+    def __init__(self, total, out=None):
+        self.total = total
+        self.out = out or sys.stderr
+        self.counts = {CONVERTED: 0, SKIPPED: 0, FAILED: 0}
+        self.start = self.printed = time.time()
+
+    def done(self):
+        return sum(self.counts.values())
+
+    def update(self, status, detail=None):
+        self.counts[status] += 1
+        if status == FAILED:
+            self.out.write('%s\n' % detail)
+        now = time.time()
+        if now - self.printed >= PROGRESS_INTERVAL:
+            self.printed = now
+            self.report('%d/%d' % (self.done(), self.total))
+
+    def report(self, prefix):
+        seconds = max(time.time() - self.start, 1e-6)
+        self.out.write('%s: %d converted, %d up to date, %d failed, %.0f files/s\n' % (
+            prefix, self.counts[CONVERTED], self.counts[SKIPPED], self.counts[FAILED],
+            self.done() / seconds))
+        self.out.flush()
+
+
+def _run(jobs, convert, classes, force, workers):
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker,
+                             initargs=(classes, force)) as executor:
+        for job, result in zip(jobs, executor.map(convert, jobs, chunksize=CONVERT_CHUNK)):
+            yield job, result
+
+
+def _writeClasses(folders, classes):
+    data = classListData(classes)
+    for folder in folders:
+        path = os.path.join(folder, CLASSES_FILE)
+        try:
+            with open(path, 'rb') as f:
+                if f.read() == data:
+                    continue
+        except (IOError, OSError):
+            pass
+        writeAtomic(path, data)
+
+
+def convertToYoloAll(jobs, out, classes, force, workers, progress):
+    """Convert jobs to YOLO with one class list, written to every classes.txt.
+
+    Classes are numbered as in the classes.txt already in out, then as in
+    classes. New classes found on the way are added at the end and their
+    files converted again, so earlier files stay valid.
+    """
+    known = readClasses(os.path.join(out, CLASSES_FILE))
+    classes = known + [c for c in classes if c not in known]
+    folders = sorted(set(os.path.dirname(target) for annotation, image, target in jobs) | set([out]))
+    while jobs:
+        _writeClasses(folders, classes)
+        missing = set()
+        again = []
+        for job, (status, detail) in _run(jobs, convertToYolo, classes, force, workers):
+            if status == NEW_CLASSES:
+                missing.update(detail)
+                again.append(job)
+            else:
+                progress.update(status, detail)
+        if again:
+            classes = classes + sorted(missing)
+        jobs = again
+    return classes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='labelImg-convert',
+        description='Convert the annotations of a directory tree between Pascal VOC and YOLO.')
+    parser.add_argument('source', help='directory of the annotations to convert')
+    parser.add_argument('--to', choices=('yolo', 'voc'), required=True, help='format to convert to')
+    parser.add_argument('--out', help='directory of the converted annotations, source by default')
+    parser.add_argument('--images', help='directory of the images, source by default')
+    parser.add_argument('--classes', help='classes.txt giving the order of the YOLO classes')
+    parser.add_argument('--jobs', type=int, help='number of worker processes, one per core by default')
+    parser.add_argument('--force', action='store_true', help='convert annotations already up to date too')
+    args = parser.parse_args(argv)
+
+    source = os.path.abspath(args.source)
+    out = os.path.abspath(args.out) if args.out else source
+    images = os.path.abspath(args.images) if args.images else None
+    if not os.path.isdir(source):
+        parser.error('%s is not a directory' % args.source)
+
+    jobs = findJobs(source, out, args.to, images)
+    for folder in sorted(set(os.path.dirname(target) for annotation, image, target in jobs)):
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+    progress = Progress(len(jobs))
+    try:
+        if args.to == 'yolo':
+            classes = readClasses(args.classes) if args.classes else []
+            convertToYoloAll(jobs, out, classes, args.force, args.jobs, progress)
+        else:
+            for job, (status, detail) in _run(jobs, convertToVoc, [], args.force, args.jobs):
+                progress.update(status, detail)
+    except KeyboardInterrupt:
+        progress.report('Interrupted at %d/%d' % (progress.done(), progress.total))
+        sys.stderr.write('Run the same command again to resume.\n')
+        return 130
+    progress.report('Done')
+    return 1 if progress.counts[FAILED] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
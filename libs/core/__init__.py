@@ -0,0 +1,11 @@
+"""Annotations without Qt: the box model, the Pascal VOC and YOLO readers
+and writers, image sizes from file headers and atomic writes.
+
+Nothing here imports Qt, so batch jobs and worker processes can use it on
+machines without a display; the GUI builds on the same functions.
+"""
+from libs.core.atomicWrite import writeAtomic
+from libs.core.box import Box, BoxError, addBoxes, boxProblem, convertPoints2BndBox, validateBoxes
+from libs.core.imageHeader import imageSize, readImageHeader
+from libs.pascal_voc_io import PascalVocReader, PascalVocWriter, PascalVocParseError, XML_EXT
+from libs.yolo_io import YoloReader, YOLOWriter, TXT_EXT, classListData
@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+
+
+def writeAtomic(path, data):
+    """Write data to path through a temporary file renamed over it.
+
+    Readers see either the old or the new file, never a partial one.
+    """
+    folder = os.path.dirname(path)
+    if folder and not os.path.isdir(folder):
+        os.makedirs(folder)
+    temp = path + '.tmp'
+    try:
+        with open(temp, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+    except (IOError, OSError):
+        if os.path.isfile(temp):
+            os.remove(temp)
+        raise
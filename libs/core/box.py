@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+
+
+class BoxError(ValueError):
+    pass
+
+
+def convertPoints2BndBox(points):
+    """(xmin, ymin, xmax, ymax) in whole pixels of the bounding box of points."""
+    xmin = float('inf')
+    ymin = float('inf')
+    xmax = float('-inf')
+    ymax = float('-inf')
+    for p in points:
+        x = p[0]
+        y = p[1]
+        xmin = min(x, xmin)
+        ymin = min(y, ymin)
+        xmax = max(x, xmax)
+        ymax = max(y, ymax)
+
+    # Martin Kersner, 2015/11/12
+    # 0-valued coordinates of BB caused an error while
+    # training faster-rcnn object detector.
+    if xmin < 1:
+        xmin = 1
+
+    if ymin < 1:
+        ymin = 1
+
+    return (int(xmin), int(ymin), int(xmax), int(ymax))
+
+
+class Box(namedtuple('Box', 'label xmin ymin xmax ymax difficult')):
+    """A labelled bounding box in pixels, as annotation files hold it."""
+    __slots__ = ()
+
+    @classmethod
+    def fromPoints(cls, label, points, difficult=False):
+        xmin, ymin, xmax, ymax = convertPoints2BndBox(points)
+        return cls(label, xmin, ymin, xmax, ymax, bool(difficult))
+
+    @classmethod
+    def fromShape(cls, shape):
+        """Box of a (label, points, lineColor, fillColor, difficult) shape of a reader."""
+        label, points, lineColor, fillColor, difficult = shape
+        return cls.fromPoints(label, points, difficult)
+
+    def points(self):
+        return [(self.xmin, self.ymin), (self.xmax, self.ymin),
+                (self.xmax, self.ymax), (self.xmin, self.ymax)]
+
+
+def addBoxes(writer, boxes):
+    """Add boxes to a PascalVocWriter or a YOLOWriter."""
+    for box in boxes:
+        writer.addBndBox(box.xmin, box.ymin, box.xmax, box.ymax, box.label, int(box.difficult))
+
+
+def boxProblem(box, imgSize):
+    """Why box is not a valid box of an image of imgSize, None if it is.
+
+    imgSize is (height, width, depth), as the writers take it.
+    """
+    height, width = imgSize[0], imgSize[1]
+    if not box.label:
+        return 'box without a label'
+    if box.xmin >= box.xmax or box.ymin >= box.ymax:
+        return 'empty box %s' % (box.label,)
+    if box.xmin < 0 or box.ymin < 0 or box.xmax > width or box.ymax > height:
+        return 'box %s outside the %dx%d image' % (box.label, width, height)
+    return None
+
+
+def validateBoxes(boxes, imgSize):
+    """Raise BoxError for the first box that is not valid in an image of imgSize."""
+    for box in boxes:
+        problem = boxProblem(box, imgSize)
+        if problem is not None:
+            raise BoxError(problem)
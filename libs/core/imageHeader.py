@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+# Number of files whose size is remembered
+SIZE_CACHE_ENTRIES = 4096
+
+# JPEG start-of-frame markers, i.e. everything in C0-CF except DHT, JPG and DAC
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - set([0xC4, 0xC8, 0xCC])
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def _isGrayPalette(data, entrySize):
+    for i in range(0, len(data) - 2, entrySize):
+        b, g, r = data[i:i + 3]
+        if not (b == g == r):
+            return False
+    return True
+
+
+def _jpegHeader(f):
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = ord(byte)
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            # Markers without a payload
+            continue
+        segment = f.read(2)
+        if len(segment) < 2:
+            return None
+        length = struct.unpack('>H', segment)[0]
+        if marker in JPEG_SOF_MARKERS:
+            frame = f.read(6)
+            if len(frame) < 6:
+                return None
+            _, height, width, components = struct.unpack('>BHHB', frame)
+            return width, height, 1 if components == 1 else 3
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def _pngHeader(f):
+    f.seek(8)
+    length, chunkType = struct.unpack('>I4s', f.read(8))
+    if chunkType != b'IHDR':
+        return None
+    width, height, _, colorType = struct.unpack('>IIBB', f.read(10))
+    if colorType in (0, 4):
+        return width, height, 1
+    if colorType == 3:
+        # Paletted, grayscale if every palette entry is gray
+        f.seek(8 + 8 + length + 4)
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                break
+            length, chunkType = struct.unpack('>I4s', chunk)
+            if chunkType == b'PLTE':
+                palette = bytearray(f.read(length))
+                return width, height, 1 if _isGrayPalette(palette, 3) else 3
+            if chunkType == b'IDAT':
+                break
+            f.seek(length + 4, os.SEEK_CUR)
+    return width, height, 3
+
+
+def _bmpHeader(f):
+    f.seek(14)
+    dibSize = struct.unpack('<I', f.read(4))[0]
+    if dibSize == 12:
+        width, height, _, bpp = struct.unpack('<HHHH', f.read(8))
+        colorsUsed = 0
+        entrySize = 3
+    else:
+        width, height, _, bpp, _, _, _, _, colorsUsed = struct.unpack('<iiHHIIiiI', f.read(32))
+        entrySize = 4
+    depth = 3
+    if bpp <= 8:
+        f.seek(14 + dibSize)
+        palette = bytearray(f.read((colorsUsed or 1 << bpp) * entrySize))
+        if _isGrayPalette(palette, entrySize):
+            depth = 1
+    return abs(width), abs(height), depth
+
+
+def readImageHeader(path):
+    """(width, height, depth) from the header of a JPEG, PNG or BMP file.
+
+    depth is 1 for grayscale images and 3 otherwise. Returns None for other
+    formats or a header that cannot be parsed.
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(8)
+            if head[:2] == b'\xff\xd8':
+                return _jpegHeader(f)
+            if head == PNG_SIGNATURE:
+                return _pngHeader(f)
+            if head[:2] == b'BM':
+                return _bmpHeader(f)
+    except (IOError, OSError, struct.error, ValueError):
+        pass
+    return None
+
+
+_sizeCache = OrderedDict()
+_sizeLock = threading.Lock()
+
+
+def imageSize(path, fallback=None):
+    """(width, height, depth) of an image file, or None if it is unreadable.
+
+    Only the header is read; fallback(path), when given, sizes the formats
+    readImageHeader does not know. Results are cached by path and mtime/size.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _sizeLock:
+        entry = _sizeCache.get(path)
+        if entry is not None and entry[0] == stamp:
+            _sizeCache.move_to_end(path)
+            return entry[1]
+
+    size = readImageHeader(path)
+    if size is None and fallback is not None:
+        size = fallback(path)
+    if size is not None:
+        with _sizeLock:
+            _sizeCache[path] = (stamp, size)
+            _sizeCache.move_to_end(path)
+            while len(_sizeCache) > SIZE_CACHE_ENTRIES:
+                _sizeCache.popitem(last=False)
+    return size
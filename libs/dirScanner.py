@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    from PyQt5.QtGui import QImageReader
+    from PyQt5.QtCore import QObject, pyqtSignal
+except ImportError:
+    from PyQt4.QtGui import QImageReader
+    from PyQt4.QtCore import QObject, pyqtSignal
+
+from libs.core.atomicWrite import writeAtomic
+from libs.utils import natural_key, natural_merge
+
+# Images per batch, and seconds before a smaller batch is sent anyway
+SCAN_BATCH = 2000
+SCAN_INTERVAL = 0.1
+
+SCAN_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.labelImgScanCache')
+SCAN_CACHE_VERSION = 1
+
+_extensions = None
+
+
+def imageExtensions():
+    global _extensions
+    if _extensions is None:
+        _extensions = tuple('.%s' % fmt.data().decode("ascii").lower()
+                            for fmt in QImageReader.supportedImageFormats())
+    return _extensions
+
+
+def pathKey(path):
+    """Sort key of an image path, giving the order iterImages yields paths in."""
+    return natural_key(path.lower())
+
+
+def entryKey(entry):
+    """Sort key of a (name, isDir) directory entry."""
+    name, isDir = entry
+    return natural_key(name.lower() + os.sep if isDir else name.lower())
+
+
+def scanDirectory(folder, extensions):
+    """Unsorted (name, isDir) of the images and subdirectories of folder.
+
+    Like os.walk, symbolic links to directories are left out. Raises
+    OSError if folder cannot be listed.
+    """
+    entries = []
+    with os.scandir(folder) as scanned:
+        for entry in scanned:
+            try:
+                isDir = entry.is_dir()
+            except OSError:
+                continue
+            if isDir:
+                if not entry.is_symlink():
+                    entries.append((entry.name, True))
+            elif entry.name.lower().endswith(extensions):
+                entries.append((entry.name, False))
+    return entries
+
+
+def listDirectory(folder, extensions):
+    entries = scanDirectory(folder, extensions)
+    entries.sort(key=entryKey)
+    return entries
+
+
+def iterImages(folder, extensions, cache=None, onerror=None):
+    """Absolute paths of the images under folder, in natural order.
+
+    Files and subdirectories of each directory are sorted together, which
+    yields the order of sorting all paths at once while only one directory
+    is listed at a time. With a ScanCache, unchanged directories are not
+    listed again. Like os.walk, directories that cannot be listed are
+    left out, and their OSError is passed to onerror when it is given.
+    """
+    folder = os.path.abspath(folder)
+    try:
+        if cache is not None:
+            entries = cache.listing(folder, extensions)
+        else:
+            entries = listDirectory(folder, extensions)
+    except OSError as e:
+        if onerror is not None:
+            onerror(e)
+        return
+    for name, isDir in entries:
+        path = os.path.join(folder, name)
+        if isDir:
+            for image in iterImages(path, extensions, cache, onerror):
+                yield image
+        else:
+            yield path
+
+
+def scanCachePath(folder, cacheDir=SCAN_CACHE_DIR):
+    digest = hashlib.sha1(os.path.abspath(folder).encode('utf-8', 'surrogateescape')).hexdigest()
+    return os.path.join(cacheDir, digest + '.json')
+
+
+class ScanCache(object):
+    """Sorted listings of the directories of a tree, kept by directory mtime.
+
+    A directory whose mtime is unchanged is not listed again; a changed one
+    is listed and its new entries are merged into the cached order. Only
+    the directories looked at since loading are saved.
+    """
+
+    def __init__(self, path, extensions):
+        self.path = path
+        self.extensions = list(extensions)
+        self._dirs = {}
+        self._seen = {}
+        self._changed = True
+        try:
+            with open(path, 'rb') as f:
+                data = json.loads(f.read().decode('utf-8'))
+            if data.get('version') == SCAN_CACHE_VERSION and data.get('extensions') == self.extensions:
+                self._dirs = data['dirs']
+                self._changed = False
+        except (IOError, OSError, ValueError, KeyError, AttributeError):
+            pass
+
+    def listing(self, folder, extensions):
+        """Sorted (name, isDir) of folder, like listDirectory.
+
+        A folder that cannot be listed raises OSError and is not recorded.
+        """
+        mtime = os.stat(folder).st_mtime_ns
+        cached = self._dirs.get(folder)
+        if cached is not None and cached[0] == mtime:
+            entries = [(name, bool(isDir)) for name, isDir in cached[1]]
+        else:
+            entries = self._merge(folder, extensions, cached)
+            self._changed = True
+        self._seen[folder] = [mtime, entries]
+        return entries
+
+    def save(self):
+        """Write the directories seen, if anything changed; raises IOError/OSError."""
+        if not self._changed and len(self._seen) == len(self._dirs):
+            return
+        data = {'version': SCAN_CACHE_VERSION, 'extensions': self.extensions, 'dirs': self._seen}
+        writeAtomic(self.path, json.dumps(data, separators=(',', ':')).encode('utf-8'))
+
+    def _merge(self, folder, extensions, cached):
+        entries = scanDirectory(folder, extensions)
+        if cached is None:
+            entries.sort(key=entryKey)
+            return entries
+        current = set(entries)
+        kept = [(name, bool(isDir)) for name, isDir in cached[1]]
+        kept = [entry for entry in kept if entry in current]
+        keptSet = set(kept)
+        added = [entry for entry in entries if entry not in keptSet]
+        if not added:
+            return kept
+        merged, keys = natural_merge(kept, [entryKey(entry) for entry in kept],
+                                     added, [entryKey(entry) for entry in added])
+        return merged
+
+
+class DirScanner(QObject):
+    """Lists the images of a directory tree on a worker thread.
+
+    found(generation, paths, keys) delivers them in batches, already in
+    their final order and with their pathKey, and finished(generation)
+    follows the last batch. A new
+    scan() or cancel() stops the running scan. Listings are cached in
+    cacheDir, unless it is None. Directories that cannot be listed are left
+    out and, like a cache that cannot be written, reported through
+    failed(path, reason).
+    """
+    found = pyqtSignal(int, list, list)
+    finished = pyqtSignal(int)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, parent=None, cacheDir=SCAN_CACHE_DIR):
+        super(DirScanner, self).__init__(parent)
+        self.cacheDir = cacheDir
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def scan(self, folder):
+        """Start listing folder, returning the generation of its signals."""
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        thread = threading.Thread(target=self._run, args=(generation, folder), name='dir-scanner')
+        thread.daemon = True
+        thread.start()
+        return generation
+
+    def cancel(self):
+        with self._lock:
+            self._generation += 1
+
+    def _isCurrent(self, generation):
+        with self._lock:
+            return generation == self._generation
+
+    def _run(self, generation, folder):
+        batch = []
+        sent = time.time()
+        extensions = imageExtensions()
+        cache = None
+        if self.cacheDir is not None:
+            cache = ScanCache(scanCachePath(folder, self.cacheDir), extensions)
+
+        def onerror(e):
+            if self._isCurrent(generation):
+                self.failed.emit(e.filename or folder, str(e))
+        try:
+            for path in iterImages(folder, extensions, cache, onerror):
+                batch.append(path)
+                if len(batch) >= SCAN_BATCH or time.time() - sent >= SCAN_INTERVAL:
+                    if not self._isCurrent(generation):
+                        return
+                    self.found.emit(generation, batch, [pathKey(path) for path in batch])
+                    batch = []
+                    sent = time.time()
+            if not self._isCurrent(generation):
+                return
+            if batch:
+                self.found.emit(generation, batch, [pathKey(path) for path in batch])
+            if cache is not None:
+                try:
+                    cache.save()
+                except (IOError, OSError) as e:
+                    self.failed.emit(cache.path, str(e))
+            self.finished.emit(generation)
+        except RuntimeError:
+            # The owning window has been destroyed.
+            return
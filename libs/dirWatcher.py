@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import stat
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from PyQt5.QtCore import QObject, QTimer, QFileSystemWatcher, pyqtSignal
+except ImportError:
+    from PyQt4.QtCore import QObject, QTimer, QFileSystemWatcher, pyqtSignal
+
+from libs.core.atomicWrite import writeAtomic
+from libs.dirScanner import imageExtensions, iterImages, scanDirectory
+
+# Quiet time before a burst of changes is looked at
+WATCH_DELAY_MS = 300
+
+
+def folderStamp(folder):
+    """mtime of a directory, which every entry added or removed changes.
+
+    Whole seconds, as file systems without finer times give, may not
+    change for a second change and come back as 0: never equal to a
+    recorded stamp. None if folder is not a directory any more.
+    """
+    try:
+        st = os.stat(folder)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(st.st_mode):
+        return None
+    return st.st_mtime_ns if st.st_mtime_ns % 1000000000 else 0
+
+
+class DirWatcher(QObject):
+    """Reports images added to or removed from a directory tree.
+
+    The directories holding the watched images are watched with a
+    QFileSystemWatcher. Changes are collected until WATCH_DELAY_MS pass
+    without a new one, then the changed directories are listed again on a
+    worker thread and the differences come out as added(paths) and
+    removed(paths). New subdirectories are scanned and watched as well.
+
+    Directories whose mtime did not move since they were last listed are
+    not listed again. Annotations saved through writeAtomic() move the
+    recorded mtime along, so saving does not cost a rescan of the folder.
+    A directory that cannot be listed is reported as failed(path, reason).
+    """
+    added = pyqtSignal(list)
+    removed = pyqtSignal(list)
+    failed = pyqtSignal(str, str)
+    # generation, added, removed, directories to watch and to forget
+    _diffed = pyqtSignal(int, list, list, list, list)
+
+    def __init__(self, parent=None, extensions=None):
+        super(DirWatcher, self).__init__(parent)
+        self.extensions = extensions
+        self._watcher = None
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(WATCH_DELAY_MS)
+        self._timer.timeout.connect(self._flush)
+        self._changed = set()
+        self._diffed.connect(self._apply)
+        self._lock = threading.Lock()
+        self._generation = 0
+        # Image names per directory, owned by the worker thread
+        self._files = {}
+        # Directory mtime the names in _files are from
+        self._stamps = {}
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def watch(self, root, paths):
+        """Start watching root and the directories of paths, forgetting the previous tree."""
+        self.clear()
+        root = os.path.abspath(root)
+        files = {root: set()}
+        for path in paths:
+            folder, name = os.path.split(path)
+            if folder not in files:
+                # With the directories between it and root
+                parent = folder
+                while parent not in files and parent.startswith(root):
+                    files[parent] = set()
+                    parent = os.path.dirname(parent)
+            files[folder].add(name)
+        with self._lock:
+            generation = self._generation
+        self._put(('watch', generation, files))
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._directoryChanged)
+        self._watcher.addPaths(list(files))
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+        self._timer.stop()
+        self._changed.clear()
+        if self._watcher is not None:
+            self._watcher.directoryChanged.disconnect(self._directoryChanged)
+            self._watcher.deleteLater()
+            self._watcher = None
+
+    def writeAtomic(self, path, data):
+        """writeAtomic(path, data) for a file that is not an image.
+
+        If nothing else changed the folder since it was listed, the change
+        made by the write is taken as seen. Safe to call from any thread.
+        """
+        folder = os.path.dirname(os.path.abspath(path))
+        before = folderStamp(folder)
+        writeAtomic(path, data)
+        after = folderStamp(folder)
+        with self._lock:
+            if before and self._stamps.get(folder) == before:
+                self._stamps[folder] = after
+
+    def flush(self):
+        """Look at the pending changes now and block until they are diffed."""
+        self._timer.stop()
+        self._flush()
+        self._queue.join()
+
+    def _directoryChanged(self, folder):
+        self._changed.add(folder)
+        self._timer.start()
+
+    def _flush(self):
+        if not self._changed:
+            return
+        folders = sorted(self._changed)
+        self._changed.clear()
+        with self._lock:
+            generation = self._generation
+        self._put(('diff', generation, folders))
+
+    def _put(self, job):
+        self._queue.put(job)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='dir-watcher')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _isCurrent(self, generation):
+        with self._lock:
+            return generation == self._generation
+
+    def _run(self):
+        while True:
+            action, generation, data = self._queue.get()
+            try:
+                if not self._isCurrent(generation):
+                    continue
+                if action == 'watch':
+                    self._files = data
+                    # Unknown until each folder is listed here
+                    with self._lock:
+                        self._stamps = {}
+                else:
+                    self._diff(generation, data)
+            except RuntimeError:
+                # The owning window has been destroyed.
+                return
+            finally:
+                self._queue.task_done()
+
+    def _diff(self, generation, folders):
+        extensions = self.extensions or imageExtensions()
+        added, removed, watch, forget = [], [], [], []
+
+        def drop(folder):
+            # Gone with everything below it
+            prefix = os.path.join(folder, '')
+            for other in list(self._files):
+                if other == folder or other.startswith(prefix):
+                    removed.extend(os.path.join(other, name) for name in self._files.pop(other))
+                    forget.append(other)
+                    with self._lock:
+                        self._stamps.pop(other, None)
+
+        for folder in folders:
+            if folder not in self._files:
+                continue
+            stamp = folderStamp(folder)
+            if stamp is None:
+                drop(folder)
+                continue
+            with self._lock:
+                if stamp and self._stamps.get(folder) == stamp:
+                    continue
+                # Taken before listing, a change while listing moves it again
+                self._stamps[folder] = stamp
+            try:
+                names = set()
+                subfolders = set()
+                for name, isDir in scanDirectory(folder, extensions):
+                    path = os.path.join(folder, name)
+                    if not isDir:
+                        names.add(name)
+                        continue
+                    subfolders.add(path)
+                    if path not in self._files:
+                        # A new subdirectory, scanned whole
+                        self._files[path] = set()
+                        watch.append(path)
+                        for image in iterImages(path, extensions, onerror=self._failed):
+                            subfolder, imageName = os.path.split(image)
+                            if subfolder not in self._files:
+                                self._files[subfolder] = set()
+                                watch.append(subfolder)
+                            self._files[subfolder].add(imageName)
+                            added.append(image)
+                for other in list(self._files):
+                    if os.path.dirname(other) == folder and other != folder and other not in subfolders:
+                        drop(other)
+                known = self._files[folder]
+                added.extend(os.path.join(folder, name) for name in names - known)
+                removed.extend(os.path.join(folder, name) for name in known - names)
+                self._files[folder] = names
+            except (IOError, OSError) as e:
+                # Listed again on its next change
+                with self._lock:
+                    self._stamps.pop(folder, None)
+                self.failed.emit(folder, str(e))
+        if added or removed or watch or forget:
+            self._diffed.emit(generation, added, removed, watch, forget)
+
+    def _failed(self, error):
+        self.failed.emit(error.filename, str(error))
+
+    def _apply(self, generation, added, removed, watch, forget):
+        if not self._isCurrent(generation) or self._watcher is None:
+            return
+        if forget:
+            self._watcher.removePaths(forget)
+        if watch:
+            self._watcher.addPaths(watch)
+        if removed:
+            self.removed.emit(removed)
+        if added:
+            self.added.emit(added)
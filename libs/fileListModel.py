@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+try:
+    from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+except ImportError:
+    from PyQt4.QtCore import Qt, QAbstractListModel, QModelIndex
+
+from bisect import bisect_right
+
+from libs.dirScanner import pathKey
+from libs.imageList import ImageList
+from libs.utils import natural_merge
+
+# Above this many separate places, an insertion rebuilds the list in one merge
+MERGE_GROUPS = 64
+
+
+class FileListModel(QAbstractListModel):
+    """The image paths of the open directory, one row per path.
+
+    paths is the ImageList itself, shared with MainWindow.mImgList; change
+    it only through the model so views stay in sync. The pathKey of each
+    path is kept alongside for insertSorted(); the directory scanner hands
+    them over with the paths, so they are never computed in bulk here.
+    """
+
+    def __init__(self, parent=None):
+        super(FileListModel, self).__init__(parent)
+        self.paths = ImageList()
+        self._keys = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return self.paths[index.row()]
+        return None
+
+    def path(self, row):
+        return self.paths[row]
+
+    def clear(self):
+        self.beginResetModel()
+        self.paths.clear()
+        del self._keys[:]
+        self.endResetModel()
+
+    def append(self, paths, keys=None):
+        """Add paths at the end; keys are their pathKey, computed if None."""
+        if not paths:
+            return
+        if keys is None:
+            keys = [pathKey(path) for path in paths]
+        first = len(self.paths)
+        self.beginInsertRows(QModelIndex(), first, first + len(paths) - 1)
+        self.paths.extend(paths)
+        self._keys.extend(keys)
+        self.endInsertRows()
+
+    def insertSorted(self, paths):
+        """Insert the new ones of paths at their place in the sorted rows.
+
+        Positions are found by binary search, and paths going to the same
+        place are inserted together. When they go to many places, the rows
+        are merged in one pass and the model is reset instead.
+        """
+        keys = self._keys
+        keyed = sorted((pathKey(path), path) for path in set(paths) if path not in self.paths)
+        groups = []
+        for key, path in keyed:
+            row = bisect_right(keys, key)
+            if groups and groups[-1][0] == row:
+                groups[-1][1].append((key, path))
+            else:
+                groups.append((row, [(key, path)]))
+        if len(groups) > MERGE_GROUPS:
+            newKeys = [key for key, path in keyed]
+            newPaths = [path for key, path in keyed]
+            merged, self._keys = natural_merge(list(self.paths), keys, newPaths, newKeys)
+            self.beginResetModel()
+            self.paths.clear()
+            self.paths.extend(merged)
+            self.endResetModel()
+            return
+        # From the end, so the rows found before stay valid
+        for row, group in reversed(groups):
+            self.beginInsertRows(QModelIndex(), row, row + len(group) - 1)
+            self.paths.insertAll(row, [path for key, path in group])
+            keys[row:row] = [key for key, path in group]
+            self.endInsertRows()
+
+    def removePaths(self, paths):
+        """Remove those of paths in the list, one contiguous run at a time."""
+        rows = sorted(set(self.paths.index(path) for path in paths if path in self.paths))
+        while rows:
+            last = first = rows.pop()
+            while rows and rows[-1] == first - 1:
+                first = rows.pop()
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.paths[first:last + 1]
+            del self._keys[first:last + 1]
+            self.endRemoveRows()
+
+    def removeRow(self, row, parent=QModelIndex()):
+        if parent.isValid() or not 0 <= row < len(self.paths):
+            return False
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.paths[row]
+        del self._keys[row]
+        self.endRemoveRows()
+        return True
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+try:
+    from PyQt5.QtGui import QColor
+    from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+except ImportError:
+    from PyQt4.QtGui import QColor
+    from PyQt4.QtCore import Qt, QAbstractListModel, QModelIndex
+
+CURRENT_COLOR = QColor(255, 125, 125)
+
+
+class HistoryModel(QAbstractListModel):
+    """Rows of an UndoStack, oldest first, with the current state highlighted.
+
+    All changes to the stack go through the model, which only announces the
+    rows they affect, so views update in constant time per operation.
+    """
+
+    def __init__(self, stack, parent=None):
+        super(HistoryModel, self).__init__(parent)
+        self.stack = stack
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.stack)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.stack.name(index.row())
+        if role == Qt.BackgroundRole and index.row() == self.stack.position():
+            return CURRENT_COLOR
+        return None
+
+    def currentIndex(self):
+        return self.index(self.stack.position())
+
+    def clear(self):
+        self.beginResetModel()
+        self.stack.clear()
+        self.endResetModel()
+
+    def reset(self, name, shapes):
+        self.beginResetModel()
+        self.stack.reset(name, shapes)
+        self.endResetModel()
+
+    def record(self, name, shapes):
+        return self._append(lambda: self.stack.record(name, shapes))
+
+    def push(self, edit, apply):
+        return self._append(lambda: self.stack.push(edit, apply))
+
+    def _append(self, operation):
+        stack = self.stack
+        previous = stack.position()
+        if stack.canRedo():
+            self.beginRemoveRows(QModelIndex(), previous + 1, len(stack) - 1)
+            stack.discardRedo()
+            self.endRemoveRows()
+        if stack.limit is not None and stack.undoCount() >= stack.limit:
+            first = stack.rootCount()
+            count = stack.undoCount() - max(0, stack.limit - 1)
+            self.beginRemoveRows(QModelIndex(), first, first + count - 1)
+            stack.trim(stack.limit - 1)
+            self.endRemoveRows()
+            previous -= count
+        row = len(stack)
+        self.beginInsertRows(QModelIndex(), row, row)
+        edit = operation()
+        self.endInsertRows()
+        self._moved(previous)
+        return edit
+
+    def undo(self, apply):
+        previous = self.stack.position()
+        edit = self.stack.undo(apply)
+        self._moved(previous)
+        return edit
+
+    def redo(self, apply):
+        previous = self.stack.position()
+        edit = self.stack.redo(apply)
+        self._moved(previous)
+        return edit
+
+    def jump(self, row, apply):
+        """Undo or redo until row is the current state."""
+        previous = self.stack.position()
+        while self.stack.position() > row and self.stack.canUndo():
+            self.stack.undo(apply)
+        while self.stack.position() < row and self.stack.canRedo():
+            self.stack.redo(apply)
+        self._moved(previous)
+
+    def _moved(self, previous):
+        current = self.stack.position()
+        for row in set((previous, current)):
+            if 0 <= row < len(self.stack):
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    from PyQt5.QtGui import QImage
+except ImportError:
+    from PyQt4.QtGui import QImage
+
+from libs.pascal_voc_io import PascalVocReader
+from libs.yolo_io import YoloReader
+
+# Budget in megabytes
+DEFAULT_CACHE_SIZE = 512
+
+# Rough per-shape cost of a parsed annotation
+SHAPE_BYTES = 256
+
+
+def fileStamp(path):
+    """(mtime, size) of a file or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def imageBytes(image):
+    if hasattr(image, 'sizeInBytes'):
+        return image.sizeInBytes()
+    return image.byteCount()
+
+
+class ImageCache(object):
+    """LRU cache of decoded images and parsed annotations.
+
+    Entries are keyed by path and validated against the file's mtime/size,
+    so a file changed on disk is never served from the cache. The total
+    size is kept under `budget` bytes by evicting the least recently used
+    entries. Safe to share between the GUI and worker threads.
+    """
+
+    def __init__(self, budget=DEFAULT_CACHE_SIZE * 1024 * 1024):
+        self.budget = budget
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def setBudget(self, budget):
+        with self._lock:
+            self.budget = budget
+            self._evict()
+
+    def stats(self):
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, evictions=self.evictions,
+                        entries=len(self._entries), bytes=self._bytes, budget=self.budget)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _get(self, key, stamp):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._bytes -= entry[2]
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def _put(self, key, stamp, value, nbytes):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            if nbytes > self.budget:
+                return
+            self._entries[key] = (stamp, value, nbytes)
+            self._bytes += nbytes
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.budget and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry[2]
+            self.evictions += 1
+
+    def contains(self, path):
+        key = ('image', path)
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry is not None and entry[0] == fileStamp(path)
+
+    def getImage(self, path):
+        """Return (imageData, QImage) for path or None."""
+        return self._get(('image', path), fileStamp(path))
+
+    def putImage(self, path, imageData, image, stamp=None):
+        if stamp is None:
+            stamp = fileStamp(path)
+        self._put(('image', path), stamp, (imageData, image),
+                  len(imageData) + imageBytes(image))
+
+    def loadImage(self, path):
+        """Return (imageData, QImage) for path, decoding it on a miss."""
+        cached = self.getImage(path)
+        if cached is not None:
+            return cached
+        stamp = fileStamp(path)
+        with open(path, 'rb') as f:
+            imageData = f.read()
+        image = QImage.fromData(imageData)
+        if not image.isNull():
+            self.putImage(path, imageData, image, stamp)
+        return imageData, image
+
+    def pascalVocReader(self, xmlPath):
+        stamp = fileStamp(xmlPath)
+        key = ('voc', xmlPath)
+        reader = self._get(key, stamp)
+        if reader is None:
+            reader = PascalVocReader(xmlPath)
+            self._put(key, stamp, reader, SHAPE_BYTES * (len(reader.shapes) + 1))
+        return reader
+
+    def yoloReader(self, txtPath, image, classListPath=None):
+        # YOLO boxes are relative, so the parsed shapes also depend on the
+        # image size and on the class list.
+        if classListPath is None:
+            classListPath = os.path.join(os.path.dirname(os.path.realpath(txtPath)), "classes.txt")
+        stamp = (fileStamp(txtPath), fileStamp(classListPath), image.width(), image.height())
+        key = ('yolo', txtPath)
+        reader = self._get(key, stamp)
+        if reader is None:
+            reader = YoloReader(txtPath, image, classListPath)
+            self._put(key, stamp, reader, SHAPE_BYTES * (len(reader.shapes) + 1))
+        return reader
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from bisect import bisect_right
+from itertools import chain
+
+# Paths per block; a block growing to twice this is split
+BLOCK_SIZE = 1024
+
+
+class _Block(object):
+    __slots__ = ('paths', 'number', 'start')
+
+    def __init__(self, paths, number):
+        self.paths = paths
+        # Position in ImageList._blocks and of the first path, right while
+        # number is below ImageList._stale
+        self.number = number
+        self.start = 0
+
+
+class ImageList(object):
+    """Ordered, unique image paths with fast index(), `in` and updates.
+
+    Paths are kept in blocks of about BLOCK_SIZE, with a dict from each
+    path to its block. An insertion or deletion changes one block and marks
+    where the blocks after it start as stale; that is recomputed with one
+    step per block, not per path, on the next lookup. index() then
+    searches a single block.
+    """
+
+    def __init__(self, paths=()):
+        self._blocks = []
+        self._block = {}
+        # Start of each block, for the blocks below _stale
+        self._starts = []
+        self._stale = 0
+        self._len = 0
+        self.extend(paths)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return chain.from_iterable([block.paths for block in self._blocks])
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(self._len)
+            if step != 1:
+                return list(self)[item]
+            paths = []
+            if start >= stop:
+                return paths
+            number, local = self._locate(start)
+            while len(paths) < stop - start:
+                paths.extend(self._blocks[number].paths[local:local + stop - start - len(paths)])
+                number += 1
+                local = 0
+            return paths
+        position = self._position(item)
+        if not 0 <= position < self._len:
+            raise IndexError('image list index out of range')
+        number, local = self._locate(position)
+        return self._blocks[number].paths[local]
+
+    def __contains__(self, path):
+        return path in self._block
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'ImageList(%r)' % list(self)
+
+    def index(self, path):
+        block = self._block.get(path)
+        if block is None:
+            raise ValueError('%r is not in the image list' % (path,))
+        if block.number >= self._stale:
+            self._refresh()
+        return block.start + block.paths.index(path)
+
+    def append(self, path):
+        self.extend([path])
+
+    def extend(self, paths):
+        paths = list(paths)
+        self._len += len(paths)
+        if self._blocks:
+            last = self._blocks[-1]
+            room = max(0, BLOCK_SIZE - len(last.paths))
+            if room and paths:
+                last.paths.extend(paths[:room])
+                self._block.update(dict.fromkeys(paths[:room], last))
+                paths = paths[room:]
+                self._stale = min(self._stale, last.number + 1)
+        for first in range(0, len(paths), BLOCK_SIZE):
+            block = _Block(paths[first:first + BLOCK_SIZE], len(self._blocks))
+            self._blocks.append(block)
+            self._block.update(dict.fromkeys(block.paths, block))
+            self._stale = min(self._stale, block.number)
+
+    def insert(self, position, path):
+        self.insertAll(position, [path])
+
+    def insertAll(self, position, paths):
+        """Insert paths, in order, before position."""
+        position = max(0, min(self._len, self._position(position)))
+        if not paths:
+            return
+        if position == self._len:
+            self.extend(paths)
+            return
+        number, local = self._locate(position)
+        block = self._blocks[number]
+        block.paths[local:local] = paths
+        self._block.update(dict.fromkeys(paths, block))
+        self._len += len(paths)
+        self._stale = min(self._stale, number + 1)
+        if len(block.paths) >= 2 * BLOCK_SIZE:
+            self._split(number)
+
+    def __delitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(self._len)
+            if step != 1:
+                raise ValueError('ImageList slices are contiguous')
+            stop = max(start, stop)
+        else:
+            start = self._position(item)
+            if not 0 <= start < self._len:
+                raise IndexError('image list index out of range')
+            stop = start + 1
+        if start == stop:
+            return
+        number, local = self._locate(start)
+        self._stale = min(self._stale, number)
+        remaining = stop - start
+        self._len -= remaining
+        while remaining:
+            block = self._blocks[number]
+            removed = block.paths[local:local + remaining]
+            for path in removed:
+                del self._block[path]
+            del block.paths[local:local + len(removed)]
+            remaining -= len(removed)
+            if block.paths:
+                number += 1
+            else:
+                del self._blocks[number]
+            local = 0
+
+    def remove(self, path):
+        del self[self.index(path)]
+
+    def clear(self):
+        del self._blocks[:]
+        self._block.clear()
+        del self._starts[:]
+        self._stale = 0
+        self._len = 0
+
+    def _position(self, position):
+        return position + self._len if position < 0 else position
+
+    def _locate(self, position):
+        """(block number, position in the block) of a position below len."""
+        if self._stale < len(self._blocks) or len(self._starts) != len(self._blocks):
+            self._refresh()
+        number = bisect_right(self._starts, position) - 1
+        return number, position - self._starts[number]
+
+    def _split(self, number):
+        # The first part stays in the block, the rest move to new ones
+        block = self._blocks[number]
+        paths = block.paths
+        block.paths = paths[:BLOCK_SIZE]
+        blocks = [_Block(paths[first:first + BLOCK_SIZE], number)
+                  for first in range(BLOCK_SIZE, len(paths), BLOCK_SIZE)]
+        self._blocks[number + 1:number + 1] = blocks
+        for block in blocks:
+            self._block.update(dict.fromkeys(block.paths, block))
+        self._stale = min(self._stale, number)
+
+    def _refresh(self):
+        stale = self._stale
+        del self._starts[stale:]
+        if stale:
+            previous = self._blocks[stale - 1]
+            start = previous.start + len(previous.paths)
+        else:
+            start = 0
+        for number in range(stale, len(self._blocks)):
+            block = self._blocks[number]
+            block.number = number
+            block.start = start
+            self._starts.append(start)
+            start += len(block.paths)
+        self._stale = len(self._blocks)
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+try:
+    from PyQt5.QtGui import QImage, QImageReader
+except ImportError:
+    from PyQt4.QtGui import QImage, QImageReader
+
+from libs.core.imageHeader import imageSize as headerImageSize, readImageHeader
+
+
+def readerImageSize(path):
+    """(width, height, depth) through QImageReader, without decoding pixels."""
+    reader = QImageReader(path)
+    size = reader.size()
+    if not size.isValid():
+        return None
+    grayFormats = [getattr(QImage, name) for name in
+                   ('Format_Mono', 'Format_MonoLSB', 'Format_Grayscale8', 'Format_Grayscale16')
+                   if hasattr(QImage, name)]
+    depth = 1 if reader.imageFormat() in grayFormats else 3
+    return size.width(), size.height(), depth
+
+
+def imageSize(path):
+    """(width, height, depth) of an image file, or None if it is unreadable.
+
+    The header is read by the core library; other formats Qt can read are
+    sized through QImageReader.
+    """
+    return headerImageSize(path, readerImageSize)
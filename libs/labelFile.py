@@ -1,15 +1,12 @@
 # Copyright (c) 2016 Tzutalin
 # Create by TzuTaLin <tzu.ta.lin@gmail.com>
 
-try:
-    from PyQt5.QtGui import QImage
-except ImportError:
-    from PyQt4.QtGui import QImage
-
 from base64 import b64encode, b64decode
 from libs.pascal_voc_io import PascalVocWriter
 from libs.yolo_io import YOLOWriter
 from libs.pascal_voc_io import XML_EXT
+from libs.imageSize import imageSize
+from libs.core.box import Box, addBoxes, convertPoints2BndBox
 import os.path
 import sys
 
@@ -30,57 +27,39 @@ class LabelFile(object):
         self.verified = False
 
     def savePascalVocFormat(self, filename, shapes, imagePath, imageData,
-                            lineColor=None, fillColor=None, databaseSrc=None):
+                            lineColor=None, fillColor=None, databaseSrc=None, saveQueue=None):
         imgFolderPath = os.path.dirname(imagePath)
         imgFolderName = os.path.split(imgFolderPath)[-1]
         imgFileName = os.path.basename(imagePath)
         #imgFileNameWithoutExt = os.path.splitext(imgFileName)[0]
         # Read from file path because self.imageData might be empty if saving to
         # Pascal format
-        image = QImage()
-        image.load(imagePath)
-        imageShape = [image.height(), image.width(),
-                      1 if image.isGrayscale() else 3]
+        imageShape = LabelFile.imageShape(imagePath)
         writer = PascalVocWriter(imgFolderName, imgFileName,
                                  imageShape, localImgPath=imagePath)
         writer.verified = self.verified
 
-        for shape in shapes:
-            points = shape['points']
-            label = shape['label']
-            # Add Chris
-            difficult = int(shape['difficult'])
-            bndbox = LabelFile.convertPoints2BndBox(points)
-            writer.addBndBox(bndbox[0], bndbox[1], bndbox[2], bndbox[3], label, difficult)
+        addBoxes(writer, LabelFile.boxes(shapes))
 
-        writer.save(targetFile=filename)
+        LabelFile.write(writer.files(targetFile=filename), saveQueue)
         return
 
     def saveYoloFormat(self, filename, shapes, imagePath, imageData, classList,
-                            lineColor=None, fillColor=None, databaseSrc=None):
+                            lineColor=None, fillColor=None, databaseSrc=None, saveQueue=None):
         imgFolderPath = os.path.dirname(imagePath)
         imgFolderName = os.path.split(imgFolderPath)[-1]
         imgFileName = os.path.basename(imagePath)
         #imgFileNameWithoutExt = os.path.splitext(imgFileName)[0]
         # Read from file path because self.imageData might be empty if saving to
         # Pascal format
-        image = QImage()
-        image.load(imagePath)
-        imageShape = [image.height(), image.width(),
-                      1 if image.isGrayscale() else 3]
+        imageShape = LabelFile.imageShape(imagePath)
         writer = YOLOWriter(imgFolderName, imgFileName,
                                  imageShape, localImgPath=imagePath)
         writer.verified = self.verified
 
-        for shape in shapes:
-            points = shape['points']
-            label = shape['label']
-            # Add Chris
-            difficult = int(shape['difficult'])
-            bndbox = LabelFile.convertPoints2BndBox(points)
-            writer.addBndBox(bndbox[0], bndbox[1], bndbox[2], bndbox[3], label, difficult)
+        addBoxes(writer, LabelFile.boxes(shapes))
 
-        writer.save(targetFile=filename, classList=classList)
+        LabelFile.write(writer.files(classList=classList, targetFile=filename), saveQueue)
         return
 
     def toggleVerify(self):
@@ -115,32 +94,36 @@ class LabelFile(object):
                     f, ensure_ascii=True, indent=2)
     '''
 
+    @staticmethod
+    def write(files, saveQueue=None):
+        """Write [(path, bytes)] now, or hand them to saveQueue."""
+        for path, data in files:
+            if saveQueue is not None:
+                saveQueue.put(path, data)
+                continue
+            try:
+                with open(path, 'wb') as f:
+                    f.write(data)
+            except (IOError, OSError) as e:
+                raise LabelFileError(e)
+
     @staticmethod
     def isLabelFile(filename):
         fileSuffix = os.path.splitext(filename)[1].lower()
         return fileSuffix == LabelFile.suffix
 
     @staticmethod
-    def convertPoints2BndBox(points):
-        xmin = float('inf')
-        ymin = float('inf')
-        xmax = float('-inf')
-        ymax = float('-inf')
-        for p in points:
-            x = p[0]
-            y = p[1]
-            xmin = min(x, xmin)
-            ymin = min(y, ymin)
-            xmax = max(x, xmax)
-            ymax = max(y, ymax)
-
-        # Martin Kersner, 2015/11/12
-        # 0-valued coordinates of BB caused an error while
-        # training faster-rcnn object detector.
-        if xmin < 1:
-            xmin = 1
-
-        if ymin < 1:
-            ymin = 1
-
-        return (int(xmin), int(ymin), int(xmax), int(ymax))
+    def imageShape(imagePath):
+        """[height, width, depth] read from the image header."""
+        size = imageSize(imagePath)
+        if size is None:
+            return [0, 0, 3]
+        width, height, depth = size
+        return [height, width, depth]
+
+    @staticmethod
+    def boxes(shapes):
+        """Boxes of the shape dicts of the canvas."""
+        return [Box.fromPoints(shape['label'], shape['points'], shape['difficult']) for shape in shapes]
+
+    convertPoints2BndBox = staticmethod(convertPoints2BndBox)
@@ -1,10 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf8 -*-
 import sys
-from xml.etree import ElementTree
-from xml.etree.ElementTree import Element, SubElement
 from lxml import etree
-import codecs
 from libs.constants import DEFAULT_ENCODING
 from libs.ustr import ustr
 
@@ -12,6 +9,35 @@ from libs.ustr import ustr
 XML_EXT = '.xml'
 ENCODE_METHOD = DEFAULT_ENCODING
 
+
+def vocText(value):
+    """Element text as earlier versions wrote it: they serialized with
+    ElementTree, re-parsed the result (normalizing line ends) and turned
+    every double space of the output into a tab."""
+    if not value:
+        return None
+    return value.replace('\r\n', '\n').replace('\r', '\n').replace('  ', '\t')
+
+
+def indent(elem, level=0):
+    """Tab indent elem in place, like etree.indent(elem, space='\t') of
+    lxml 4.5 and later."""
+    if len(elem):
+        if not elem.text or not elem.text.strip():
+            elem.text = '\n' + '\t' * (level + 1)
+        for child in elem:
+            indent(child, level + 1)
+            if not child.tail or not child.tail.strip():
+                child.tail = '\n' + '\t' * (level + 1)
+        if not child.tail.strip():
+            child.tail = '\n' + '\t' * level
+
+
+def SubElement(parent, tag, text=None):
+    element = etree.SubElement(parent, tag)
+    element.text = vocText(text)
+    return element
+
 class PascalVocWriter:
 
     def __init__(self, foldername, filename, imgSize,databaseSrc='Unknown', localImgPath=None):
@@ -25,14 +51,10 @@ class PascalVocWriter:
 
     def prettify(self, elem):
         """
-            Return a pretty-printed XML string for the Element.
+            Return the tab indented XML bytes for the Element.
         """
-        rough_string = ElementTree.tostring(elem, 'utf8')
-        root = etree.fromstring(rough_string)
-        return etree.tostring(root, pretty_print=True, encoding=ENCODE_METHOD).replace("  ".encode(), "\t".encode())
-        # minidom does not support UTF-8
-        '''reparsed = minidom.parseString(rough_string)
-        return reparsed.toprettyxml(indent="\t", encoding=ENCODE_METHOD)'''
+        indent(elem)
+        return etree.tostring(elem, encoding=ENCODE_METHOD) + b'\n'
 
     def genXML(self):
         """
@@ -44,37 +66,28 @@ class PascalVocWriter:
                 self.imgSize is None:
             return None
 
-        top = Element('annotation')
+        top = etree.Element('annotation')
         if self.verified:
             top.set('verified', 'yes')
 
-        folder = SubElement(top, 'folder')
-        folder.text = self.foldername
-
-        filename = SubElement(top, 'filename')
-        filename.text = self.filename
+        SubElement(top, 'folder', self.foldername)
+        SubElement(top, 'filename', self.filename)
 
         if self.localImgPath is not None:
-            localImgPath = SubElement(top, 'path')
-            localImgPath.text = self.localImgPath
+            SubElement(top, 'path', self.localImgPath)
 
         source = SubElement(top, 'source')
-        database = SubElement(source, 'database')
-        database.text = self.databaseSrc
+        SubElement(source, 'database', self.databaseSrc)
 
         size_part = SubElement(top, 'size')
-        width = SubElement(size_part, 'width')
-        height = SubElement(size_part, 'height')
-        depth = SubElement(size_part, 'depth')
-        width.text = str(self.imgSize[1])
-        height.text = str(self.imgSize[0])
+        SubElement(size_part, 'width', str(self.imgSize[1]))
+        SubElement(size_part, 'height', str(self.imgSize[0]))
         if len(self.imgSize) == 3:
-            depth.text = str(self.imgSize[2])
+            SubElement(size_part, 'depth', str(self.imgSize[2]))
         else:
-            depth.text = '1'
+            SubElement(size_part, 'depth', '1')
 
-        segmented = SubElement(top, 'segmented')
-        segmented.text = '0'
+        SubElement(top, 'segmented', '0')
         return top
 
     def addBndBox(self, xmin, ymin, xmax, ymax, name, difficult):
@@ -85,87 +98,142 @@ class PascalVocWriter:
 
     def appendObjects(self, top):
         for each_object in self.boxlist:
-            object_item = SubElement(top, 'object')
-            name = SubElement(object_item, 'name')
-            name.text = ustr(each_object['name'])
-            pose = SubElement(object_item, 'pose')
-            pose.text = "Unspecified"
-            truncated = SubElement(object_item, 'truncated')
+            object_item = etree.SubElement(top, 'object')
+            SubElement(object_item, 'name', ustr(each_object['name']))
+            etree.SubElement(object_item, 'pose').text = "Unspecified"
             if int(float(each_object['ymax'])) == int(float(self.imgSize[0])) or (int(float(each_object['ymin']))== 1):
-                truncated.text = "1" # max == height or min
+                truncated = "1" # max == height or min
             elif (int(float(each_object['xmax']))==int(float(self.imgSize[1]))) or (int(float(each_object['xmin']))== 1):
-                truncated.text = "1" # max == width or min
+                truncated = "1" # max == width or min
             else:
-                truncated.text = "0"
-            difficult = SubElement(object_item, 'difficult')
-            difficult.text = str( bool(each_object['difficult']) & 1 )
-            bndbox = SubElement(object_item, 'bndbox')
-            xmin = SubElement(bndbox, 'xmin')
-            xmin.text = str(each_object['xmin'])
-            ymin = SubElement(bndbox, 'ymin')
-            ymin.text = str(each_object['ymin'])
-            xmax = SubElement(bndbox, 'xmax')
-            xmax.text = str(each_object['xmax'])
-            ymax = SubElement(bndbox, 'ymax')
-            ymax.text = str(each_object['ymax'])
-
-    def save(self, targetFile=None):
+                truncated = "0"
+            # Numbers need no vocText
+            etree.SubElement(object_item, 'truncated').text = truncated
+            etree.SubElement(object_item, 'difficult').text = str( bool(each_object['difficult']) & 1 )
+            bndbox = etree.SubElement(object_item, 'bndbox')
+            etree.SubElement(bndbox, 'xmin').text = str(each_object['xmin'])
+            etree.SubElement(bndbox, 'ymin').text = str(each_object['ymin'])
+            etree.SubElement(bndbox, 'xmax').text = str(each_object['xmax'])
+            etree.SubElement(bndbox, 'ymax').text = str(each_object['ymax'])
+
+    def files(self, targetFile=None):
+        """
+            Return [(path, bytes)] of the annotation file
+        """
         root = self.genXML()
         self.appendObjects(root)
-        out_file = None
         if targetFile is None:
-            out_file = codecs.open(
-                self.filename + XML_EXT, 'w', encoding=ENCODE_METHOD)
-        else:
-            out_file = codecs.open(targetFile, 'w', encoding=ENCODE_METHOD)
+            targetFile = self.filename + XML_EXT
+        return [(targetFile, self.prettify(root))]
 
-        prettifyResult = self.prettify(root)
-        out_file.write(prettifyResult.decode('utf8'))
-        out_file.close()
+    def save(self, targetFile=None):
+        for path, data in self.files(targetFile):
+            with open(path, 'wb') as out_file:
+                out_file.write(data)
+
+
+class PascalVocParseError(Exception):
+    """An annotation file that could not be read, with where and why."""
+
+    def __init__(self, path, reason, line=None):
+        super(PascalVocParseError, self).__init__(path, reason, line)
+        self.path = path
+        self.reason = reason
+        self.line = line
+
+    def __str__(self):
+        if self.line is None:
+            return '%s: %s' % (self.path, self.reason)
+        return '%s:%d: %s' % (self.path, self.line, self.reason)
 
 
 class PascalVocReader:
 
-    def __init__(self, filepath):
+    def __init__(self, filepath, strict=False):
         # shapes type:
         # [labbel, [(x1,y1), (x2,y2), (x3,y3), (x4,y4)], color, color, difficult]
         self.shapes = []
         self.filepath = filepath
         self.verified = False
+        self.filename = None
+        # (height, width, depth) like PascalVocWriter.imgSize
+        self.imgSize = None
+        # PascalVocParseError of a file that could not be read completely,
+        # raised instead when strict
+        self.error = None
         try:
             self.parseXML()
-        except:
-            pass
+        except PascalVocParseError as e:
+            if strict:
+                raise
+            self.error = e
 
     def getShapes(self):
         return self.shapes
 
     def addShape(self, label, bndbox, difficult):
-        xmin = int(float(bndbox.find('xmin').text))
-        ymin = int(float(bndbox.find('ymin').text))
-        xmax = int(float(bndbox.find('xmax').text))
-        ymax = int(float(bndbox.find('ymax').text))
+        xmin = int(float(bndbox['xmin']))
+        ymin = int(float(bndbox['ymin']))
+        xmax = int(float(bndbox['xmax']))
+        ymax = int(float(bndbox['ymax']))
         points = [(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)]
         self.shapes.append((label, points, None, None, difficult))
 
     def parseXML(self):
-        assert self.filepath.endswith(XML_EXT), "Unsupport file format"
-        parser = etree.XMLParser(encoding=ENCODE_METHOD)
-        xmltree = ElementTree.parse(self.filepath, parser=parser).getroot()
-        filename = xmltree.find('filename').text
+        """Read the file in one streaming pass, freeing elements once read."""
+        if not self.filepath.endswith(XML_EXT):
+            raise PascalVocParseError(self.filepath, 'Unsupport file format')
+        depth = 0
         try:
-            verified = xmltree.attrib['verified']
-            if verified == 'yes':
-                self.verified = True
-        except KeyError:
-            self.verified = False
-
-        for object_iter in xmltree.findall('object'):
-            bndbox = object_iter.find("bndbox")
-            label = object_iter.find('name').text
-            # Add chris
-            difficult = False
-            if object_iter.find('difficult') is not None:
-                difficult = bool(int(object_iter.find('difficult').text))
-            self.addShape(label, bndbox, difficult)
+            for event, elem in etree.iterparse(self.filepath, events=('start', 'end'),
+                                               encoding=ENCODE_METHOD, remove_comments=True):
+                if event == 'start':
+                    depth += 1
+                    if depth == 1:
+                        self.verified = elem.get('verified') == 'yes'
+                    continue
+                depth -= 1
+                if depth != 1:
+                    # Nested elements are read with their top level parent
+                    continue
+                if elem.tag == 'object':
+                    self.addObject(elem)
+                elif elem.tag == 'filename':
+                    self.filename = elem.text
+                elif elem.tag == 'size':
+                    self.imgSize = self.readSize(elem)
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+        except etree.XMLSyntaxError as e:
+            raise PascalVocParseError(self.filepath, e.msg, e.lineno)
+        except (IOError, OSError) as e:
+            raise PascalVocParseError(self.filepath, e.strerror or str(e))
         return True
+
+    def addObject(self, obj):
+        label = None
+        difficult = False
+        bndbox = None
+        try:
+            for child in obj:
+                if child.tag == 'name':
+                    label = child.text
+                elif child.tag == 'difficult':
+                    difficult = bool(int(child.text))
+                elif child.tag == 'bndbox':
+                    bndbox = dict((coord.tag, coord.text) for coord in child)
+            if bndbox is None:
+                raise PascalVocParseError(self.filepath, 'object without bndbox', obj.sourceline)
+            self.addShape(label, bndbox, difficult)
+        except KeyError as e:
+            raise PascalVocParseError(self.filepath, 'bndbox without %s' % e.args[0], obj.sourceline)
+        except (TypeError, ValueError) as e:
+            raise PascalVocParseError(self.filepath, 'invalid object: %s' % e, obj.sourceline)
+
+    def readSize(self, size):
+        values = dict((child.tag, child.text) for child in size)
+        try:
+            return (int(values['height']), int(values['width']), int(values.get('depth') or 3))
+        except (KeyError, TypeError, ValueError):
+            return None
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import itertools
+import os
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from PyQt5.QtCore import QObject, pyqtSignal
+except ImportError:
+    from PyQt4.QtCore import QObject, pyqtSignal
+
+DEFAULT_PREFETCH_NEXT = 3
+DEFAULT_PREFETCH_PREV = 1
+
+
+class Prefetcher(QObject):
+    """Reads and decodes images and annotations on a worker thread.
+
+    Results go into the shared ImageCache. `annotationPaths` is a callable
+    returning the (xmlPath, txtPath) pair that MainWindow would look at for
+    a given image path.
+
+    request() asks for the image that is about to be shown: it runs before
+    any queued prefetch, supersedes the previous request and is announced
+    through loaded(path, decoded), decoded being the (imageData, QImage)
+    read, or None if reading failed. It is passed along because an image
+    larger than the cache budget is not kept there. schedule() fills the cache with the neighbours of the
+    current image and announces them through `prefetched`. Paths that could
+    not be read are reported through failed(path, reason).
+    """
+    prefetched = pyqtSignal(str)
+    loaded = pyqtSignal(str, object)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, cache, annotationPaths, nextDepth=DEFAULT_PREFETCH_NEXT,
+                 prevDepth=DEFAULT_PREFETCH_PREV, parent=None):
+        super(Prefetcher, self).__init__(parent)
+        self.cache = cache
+        self.annotationPaths = annotationPaths
+        self.nextDepth = nextDepth
+        self.prevDepth = prevDepth
+        self._lock = threading.Lock()
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._generation = 0
+        self._wanted = set()
+        self._requested = None
+        self._thread = None
+
+    def setDepth(self, nextDepth, prevDepth):
+        self.nextDepth = max(0, int(nextDepth))
+        self.prevDepth = max(0, int(prevDepth))
+
+    def schedule(self, imgList, index):
+        """Prefetch the window around imgList[index], cancelling older requests."""
+        paths = []
+        for step in range(1, max(self.nextDepth, self.prevDepth) + 1):
+            if step <= self.nextDepth and index + step < len(imgList):
+                paths.append(imgList[index + step])
+            if step <= self.prevDepth and index - step >= 0:
+                paths.append(imgList[index - step])
+
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._wanted = set(paths)
+
+        for priority, path in enumerate(paths, 1):
+            self._put(priority, generation, path)
+
+    def request(self, path):
+        """Load path ahead of everything else, cancelling older requests."""
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._wanted = set()
+            self._requested = path
+        self._put(0, generation, path)
+
+    def cancel(self):
+        with self._lock:
+            self._generation += 1
+            self._wanted = set()
+            self._requested = None
+
+    def _put(self, priority, generation, path):
+        self._ensureThread()
+        self._queue.put((priority, next(self._counter), generation, path))
+
+    def _ensureThread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='Prefetcher')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _isCurrent(self, generation, path, foreground):
+        with self._lock:
+            if generation != self._generation:
+                return False
+            if foreground:
+                return path == self._requested
+            return path in self._wanted
+
+    def _run(self):
+        while True:
+            priority, _, generation, path = self._queue.get()
+            foreground = priority == 0
+            if not self._isCurrent(generation, path, foreground):
+                continue
+            error = decoded = None
+            try:
+                decoded = self.load(path)
+            except Exception as e:
+                error = e
+            try:
+                if error is not None:
+                    self.failed.emit(path, str(error))
+                # A failed request is still announced, loadFile reports the error.
+                if foreground:
+                    self.loaded.emit(path, decoded)
+                elif error is None:
+                    self.prefetched.emit(path)
+            except RuntimeError:
+                # The owning window has been destroyed.
+                return
+
+    def load(self, path):
+        """Return (imageData, QImage) of path, reading its annotation as well.
+
+        Annotation file priority: PascalXML > YOLO
+        """
+        imageData, image = self.cache.loadImage(path)
+        if image.isNull():
+            return imageData, image
+        xmlPath, txtPath = self.annotationPaths(path)
+        if os.path.isfile(xmlPath):
+            self.cache.pascalVocReader(xmlPath)
+        elif os.path.isfile(txtPath):
+            self.cache.yoloReader(txtPath, image)
+        return imageData, image
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    from PyQt5.QtCore import QObject, pyqtSignal
+except ImportError:
+    from PyQt4.QtCore import QObject, pyqtSignal
+
+from libs.core.atomicWrite import writeAtomic
+from libs.imageCache import fileStamp
+
+
+class SaveQueue(QObject):
+    """Writes annotation files on a worker thread.
+
+    A file queued again before the worker got to it is written once, with
+    the latest data. The worker compares the data with what the file holds
+    and skips writes that would not change it, so put() never touches the
+    disk. saved(path) or failed(path, reason) is emitted after each write.
+    Files are written with write(path, data), writeAtomic by default.
+    """
+
+    saved = pyqtSignal(str)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, parent=None, write=writeAtomic):
+        super(SaveQueue, self).__init__(parent)
+        self._write = write
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()
+        self._writing = None
+        self._writingDigest = None
+        self._failed = set()
+        # path -> (stamp, digest) of the files as last written or read,
+        # owned by the worker thread
+        self._digests = {}
+        self._thread = None
+
+    def put(self, path, data):
+        """Queue data for path; returns False if it is already on its way."""
+        digest = hashlib.sha1(data).digest()
+        with self._cond:
+            self._failed.discard(path)
+            if path in self._pending:
+                if self._pending[path][1] == digest:
+                    return False
+            elif path == self._writing and digest == self._writingDigest:
+                return False
+            self._pending[path] = (data, digest)
+            self._cond.notify_all()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='save-queue')
+                self._thread.daemon = True
+                self._thread.start()
+        return True
+
+    def wait(self, path=None):
+        """Block until path, or every file when None, is written.
+
+        Returns False if the last write of path failed.
+        """
+        with self._cond:
+            while (self._writing is not None and (path is None or path == self._writing)) or \
+                    (self._pending if path is None else path in self._pending):
+                self._cond.wait()
+            return path is None or path not in self._failed
+
+    def flush(self):
+        self.wait()
+
+    def _fileDigest(self, path):
+        """Digest of what path holds on disk, None if it cannot be read."""
+        stamp = fileStamp(path)
+        if stamp is None:
+            return None
+        cached = self._digests.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        try:
+            with open(path, 'rb') as f:
+                digest = hashlib.sha1(f.read()).digest()
+        except (IOError, OSError):
+            return None
+        self._digests[path] = (stamp, digest)
+        return digest
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                path, (data, digest) = self._pending.popitem(last=False)
+                self._writing = path
+                self._writingDigest = digest
+            error = None
+            unchanged = self._fileDigest(path) == digest
+            if not unchanged:
+                try:
+                    self._write(path, data)
+                except (IOError, OSError) as e:
+                    error = e
+                try:
+                    if error is None:
+                        self.saved.emit(path)
+                    else:
+                        self.failed.emit(path, str(error))
+                except RuntimeError:
+                    # The window owning the queue is already gone
+                    pass
+                if error is None:
+                    self._digests[path] = (fileStamp(path), digest)
+                else:
+                    self._digests.pop(path, None)
+            with self._cond:
+                self._writing = None
+                self._writingDigest = None
+                if error is not None:
+                    self._failed.add(path)
+                self._cond.notify_all()
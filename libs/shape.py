@@ -42,7 +42,10 @@ class Shape(object):
 
     def __init__(self, label=None, line_color=None, difficult=False, paintLabel=False):
         self.label = label
-        self.points = []
+        self._points = []
+        # Bumped on every change of the points
+        self.revision = 0
+        self._invalidate()
         self.fill = False
         self.multifill = False
         self.selected = False
@@ -64,6 +67,23 @@ class Shape(object):
             # is used for drawing the pending line a different color.
             self.line_color = line_color
 
+    @property
+    def points(self):
+        return self._points
+
+    @points.setter
+    def points(self, points):
+        self._points = points
+        self._invalidate()
+
+    def _invalidate(self):
+        """Drop the cached geometry. Writes to self.points[i] bypass this,
+        use shape[i] = point instead."""
+        self._path = None
+        self._rect = None
+        self._extents = None
+        self.revision += 1
+
     def close(self):
         self._closed = True
 
@@ -75,9 +95,11 @@ class Shape(object):
     def addPoint(self, point):
         if not self.reachMaxPoints():
             self.points.append(point)
+            self._invalidate()
 
     def popPoint(self):
         if self.points:
+            self._invalidate()
             return self.points.pop()
         return None
 
@@ -132,7 +154,7 @@ class Shape(object):
                         self.label = ""
                     if(min_y < MIN_Y_LABEL):
                         min_y += MIN_Y_LABEL
-                    painter.drawText(min_x, min_y, self.label)
+                    painter.drawText(QPointF(min_x, min_y), self.label)
 
             if self.fill:
                 hshape_path = QPainterPath()
@@ -181,19 +203,31 @@ class Shape(object):
         return self.makePath().contains(point)
 
     def makePath(self):
-        path = QPainterPath(self.points[0])
-        for p in self.points[1:]:
-            path.lineTo(p)
-        return path
+        if self._path is None:
+            path = QPainterPath(self.points[0])
+            for p in self.points[1:]:
+                path.lineTo(p)
+            self._path = path
+        return self._path
 
     def boundingRect(self):
-        return self.makePath().boundingRect()
+        if self._rect is None:
+            self._rect = self.makePath().boundingRect()
+        return self._rect
+
+    def extents(self):
+        """(min_x, min_y, max_x, max_y) of the points."""
+        if self._extents is None:
+            xs = [p.x() for p in self.points]
+            ys = [p.y() for p in self.points]
+            self._extents = (min(xs), min(ys), max(xs), max(ys))
+        return self._extents
 
     def moveBy(self, offset):
         self.points = [p + offset for p in self.points]
 
     def moveVertexBy(self, i, offset):
-        self.points[i] = self.points[i] + offset
+        self[i] = self.points[i] + offset
 
     def highlightVertex(self, i, action):
         self._highlightIndex = i
@@ -223,3 +257,4 @@ class Shape(object):
 
     def __setitem__(self, key, value):
         self.points[key] = value
+        self._invalidate()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import itertools
+import math
+
+DEFAULT_CELL_SIZE = 64
+
+
+class GridIndex(object):
+    """Uniform grid over the bounding rects of items.
+
+    Rects are (x1, y1, x2, y2) tuples. Every item also carries an order key,
+    by default increasing with insertion, and query results are returned
+    from the highest key down, i.e. topmost shape first.
+    """
+
+    def __init__(self, cellSize=DEFAULT_CELL_SIZE):
+        self.cellSize = float(cellSize)
+        self._cells = {}
+        self._items = {}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def clear(self):
+        self._cells.clear()
+        self._items.clear()
+
+    def _cellRange(self, rect):
+        size = self.cellSize
+        return (int(math.floor(rect[0] / size)), int(math.floor(rect[1] / size)),
+                int(math.floor(rect[2] / size)), int(math.floor(rect[3] / size)))
+
+    def _addToCells(self, item, cells):
+        for cx in range(cells[0], cells[2] + 1):
+            for cy in range(cells[1], cells[3] + 1):
+                self._cells.setdefault((cx, cy), set()).add(item)
+
+    def _removeFromCells(self, item, cells):
+        for cx in range(cells[0], cells[2] + 1):
+            for cy in range(cells[1], cells[3] + 1):
+                bucket = self._cells.get((cx, cy))
+                if bucket is not None:
+                    bucket.discard(item)
+                    if not bucket:
+                        del self._cells[(cx, cy)]
+
+    def insert(self, item, rect, order=None):
+        if item in self._items:
+            self.remove(item)
+        if order is None:
+            order = next(self._counter)
+        cells = self._cellRange(rect)
+        self._items[item] = (rect, cells, order)
+        self._addToCells(item, cells)
+
+    def remove(self, item):
+        entry = self._items.pop(item, None)
+        if entry is not None:
+            self._removeFromCells(item, entry[1])
+
+    def update(self, item, rect):
+        """Move an indexed item to rect; unknown items are ignored."""
+        entry = self._items.get(item)
+        if entry is None:
+            return
+        cells = self._cellRange(rect)
+        if cells != entry[1]:
+            self._removeFromCells(item, entry[1])
+            self._addToCells(item, cells)
+        self._items[item] = (rect, cells, entry[2])
+
+    def rect(self, item):
+        entry = self._items.get(item)
+        return entry[0] if entry is not None else None
+
+    def order(self, item):
+        return self._items[item][2]
+
+    def query(self, rect):
+        """Items whose rect intersects rect, topmost first."""
+        cells = self._cellRange(rect)
+        if (cells[2] - cells[0] + 1) * (cells[3] - cells[1] + 1) > len(self._items):
+            # Cheaper to test every item than to visit every cell
+            found = self._items
+        else:
+            found = self._collect(cells)
+        hits = []
+        for item in found:
+            r, _, order = self._items[item]
+            if r[0] <= rect[2] and rect[0] <= r[2] and r[1] <= rect[3] and rect[1] <= r[3]:
+                hits.append((order, item))
+        hits.sort(key=lambda hit: hit[0], reverse=True)
+        return [item for _, item in hits]
+
+    def _collect(self, cells):
+        found = set()
+        for cx in range(cells[0], cells[2] + 1):
+            for cy in range(cells[1], cells[3] + 1):
+                bucket = self._cells.get((cx, cy))
+                if bucket:
+                    found.update(bucket)
+        return found
+
+    def queryPoint(self, x, y, margin=0):
+        return self.query((x - margin, y - margin, x + margin, y + margin))
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import math
+import threading
+from collections import OrderedDict
+
+try:
+    from PyQt5.QtCore import Qt, QObject, QRect, QRectF, QSize, pyqtSignal
+except ImportError:
+    from PyQt4.QtCore import Qt, QObject, QRect, QRectF, QSize, pyqtSignal
+
+TILE_SIZE = 512
+
+# Images with fewer pixels are drawn in one piece
+TILED_MIN_PIXELS = 4096 * 4096
+
+# Number of tiles kept converted at once (about 1MB each)
+MAX_TILES = 256
+
+
+def needsTiles(width, height):
+    return width * height >= TILED_MIN_PIXELS
+
+
+class PixmapExtent(object):
+    """Stands in for the pixmap of a tiled image: its size, without pixels."""
+
+    def __init__(self, width, height):
+        self._size = QSize(width, height)
+
+    def width(self):
+        return self._size.width()
+
+    def height(self):
+        return self._size.height()
+
+    def size(self):
+        return QSize(self._size)
+
+    def rect(self):
+        return QRect(0, 0, self.width(), self.height())
+
+    def isNull(self):
+        return self._size.isEmpty()
+
+    def __bool__(self):
+        return not self.isNull()
+    __nonzero__ = __bool__
+
+
+class TilePyramid(QObject):
+    """Multi-resolution tiles of a large image.
+
+    Level 0 is the image itself and every following level halves its size,
+    down to a single tile. build() makes the smaller levels on a worker
+    thread and emits levelReady(level) as each is done; until then draw()
+    uses the nearest finer level that is. Tiles are cut lazily on first use, so
+    drawing costs depend on the exposed area rather than the image size.
+    """
+
+    levelReady = pyqtSignal(int)
+
+    def __init__(self, image, tileSize=TILE_SIZE, maxTiles=MAX_TILES, parent=None):
+        super(TilePyramid, self).__init__(parent)
+        self.tileSize = tileSize
+        self.maxTiles = maxTiles
+        self.width = image.width()
+        self.height = image.height()
+        self._sizes = [(self.width, self.height)]
+        width, height = self._sizes[0]
+        while max(width, height) > tileSize:
+            width, height = max(1, (width + 1) // 2), max(1, (height + 1) // 2)
+            self._sizes.append((width, height))
+        self.levelCount = len(self._sizes)
+        self._levels = [image]
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._thread = None
+
+    def build(self):
+        """Start building the smaller levels."""
+        if self._thread is None and self.levelCount > 1:
+            self._thread = threading.Thread(target=self._build, name='TilePyramid')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def cancel(self):
+        """Stop building levels, the image is not shown any more."""
+        self._cancelled = True
+
+    def wait(self):
+        """Block until build() is done or was cancelled."""
+        if self._thread is not None:
+            self._thread.join()
+
+    def levelForScale(self, scale):
+        """The smallest level still sharper than the screen at scale."""
+        if scale <= 0:
+            return self.levelCount - 1
+        level = int(math.floor(math.log(1.0 / scale, 2))) if scale < 1 else 0
+        return max(0, min(level, self.levelCount - 1))
+
+    def readyLevel(self, level):
+        """level if it is built, else the nearest finer level that is."""
+        with self._lock:
+            return min(level, len(self._levels) - 1)
+
+    def levelImage(self, level):
+        """The image of a built level, see readyLevel."""
+        with self._lock:
+            return self._levels[level]
+
+    def _build(self):
+        image = self._levels[0]
+        for level in range(1, self.levelCount):
+            if self._cancelled:
+                return
+            image = image.scaled(self._sizes[level][0], self._sizes[level][1],
+                                 Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+            with self._lock:
+                self._levels.append(image)
+            try:
+                self.levelReady.emit(level)
+            except RuntimeError:
+                # The canvas owning the pyramid is already gone
+                return
+
+    def tile(self, level, col, row):
+        key = (level, col, row)
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                return tile
+        image = self.levelImage(level)
+        tile = image.copy(QRect(col * self.tileSize, row * self.tileSize,
+                                self.tileSize, self.tileSize).intersected(image.rect()))
+        with self._lock:
+            self._tiles[key] = tile
+            while len(self._tiles) > self.maxTiles:
+                self._tiles.popitem(last=False)
+        return tile
+
+    def levelFactors(self, level):
+        """Scale from level coordinates back to image coordinates."""
+        width, height = self._sizes[level]
+        return float(self.width) / width, float(self.height) / height
+
+    def tilesIn(self, rect, level):
+        """(col, row) of the tiles of level intersecting rect, in image coordinates."""
+        width, height = self._sizes[level]
+        fx, fy = self.levelFactors(level)
+        cols = (width + self.tileSize - 1) // self.tileSize
+        rows = (height + self.tileSize - 1) // self.tileSize
+        left = max(0, int(math.floor(rect.left() / (self.tileSize * fx))))
+        top = max(0, int(math.floor(rect.top() / (self.tileSize * fy))))
+        right = min(cols - 1, int(math.floor(rect.right() / (self.tileSize * fx))))
+        bottom = min(rows - 1, int(math.floor(rect.bottom() / (self.tileSize * fy))))
+        return [(col, row) for row in range(top, bottom + 1) for col in range(left, right + 1)]
+
+    def draw(self, painter, rect, scale):
+        """Draw the part of the image inside rect (image coordinates) at scale."""
+        level = self.readyLevel(self.levelForScale(scale))
+        fx, fy = self.levelFactors(level)
+        for col, row in self.tilesIn(rect, level):
+            tile = self.tile(level, col, row)
+            target = QRectF(col * self.tileSize * fx, row * self.tileSize * fy,
+                            tile.width() * fx, tile.height() * fy)
+            painter.drawImage(target, tile, QRectF(tile.rect()))
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import json
+import os
+import struct
+import threading
+import zlib
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from PyQt5.QtCore import QObject, pyqtSignal
+except ImportError:
+    from PyQt4.QtCore import QObject, pyqtSignal
+
+from libs.undoStack import ShapeEdit
+
+JOURNAL_DIR = 'UndoJournal'
+JOURNAL_EXT = '.journal'
+MAGIC = b'LIJ1'
+
+# kind, payload length, crc32 of the payload
+FRAME = struct.Struct('<cII')
+
+BASE, RECORD, UNDO, REDO, SAVED = b'B', b'R', b'U', b'D', b'S'
+
+
+def journalPath(annotationPath):
+    """Where the journal of an annotation file lives."""
+    folder, name = os.path.split(os.path.splitext(annotationPath)[0])
+    return os.path.join(folder, JOURNAL_DIR, name + JOURNAL_EXT)
+
+
+def encodeFrame(kind, payload=None):
+    data = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return FRAME.pack(kind, len(data), zlib.crc32(data) & 0xffffffff) + data
+
+
+def encodeSaved(stamp):
+    return encodeFrame(SAVED, list(stamp) if stamp else None)
+
+
+def readJournal(path):
+    """[(kind, payload)] of a journal, None if it is missing or not a journal.
+
+    Reading stops at the first incomplete or damaged frame, which is where
+    a crash interrupted the last write.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return None
+    if not data.startswith(MAGIC):
+        return None
+    frames = []
+    offset = len(MAGIC)
+    while offset + FRAME.size <= len(data):
+        kind, length, crc = FRAME.unpack_from(data, offset)
+        start = offset + FRAME.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) & 0xffffffff != crc:
+            break
+        try:
+            frames.append((kind, json.loads(payload.decode('utf-8'))))
+        except ValueError:
+            break
+        offset = start + length
+    return frames
+
+
+def encodeState(state):
+    label, points, difficult, visible = state
+    return [label, [[x, y] for x, y in points], difficult, visible]
+
+
+def decodeState(data):
+    label, points, difficult, visible = data
+    return (label, tuple((x, y) for x, y in points), difficult, visible)
+
+
+def decodeEdit(payload, shapeFor):
+    """ShapeEdit of a RECORD payload; shapeFor(id, state) returns the shape of an id."""
+    name, removed, inserted, changed = payload
+    return ShapeEdit(
+        name,
+        [(index, shapeFor(id, decodeState(state)), decodeState(state)) for index, id, state in removed],
+        [(index, shapeFor(id, decodeState(state)), decodeState(state)) for index, id, state in inserted],
+        [(shapeFor(id, decodeState(before)), decodeState(before), decodeState(after))
+         for id, before, after in changed])
+
+
+class JournalWriter(QObject):
+    """Writes journals on a worker thread.
+
+    Appends queued while the thread is busy are written together with a
+    single flush and fsync per file. Writes that fail are reported through
+    failed(path, reason). wait(path) only waits for the jobs of one file,
+    so a replace still waiting for its stamp does not hold up the others.
+    """
+
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, parent=None):
+        super(JournalWriter, self).__init__(parent)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        # Jobs queued and not done yet, per path
+        self._pending = {}
+        self._done = threading.Condition(self._lock)
+
+    def append(self, path, data):
+        self._put(('append', path, data))
+
+    def replace(self, path, data):
+        """Rewrite path; data may be a callable returning the bytes on the worker thread."""
+        self._put(('replace', path, data))
+
+    def remove(self, path):
+        self._put(('remove', path, None))
+
+    def flush(self):
+        """Block until everything queued so far is on disk."""
+        self._queue.join()
+
+    def wait(self, path):
+        """Block until everything queued so far for path is on disk."""
+        with self._lock:
+            while self._pending.get(path):
+                self._done.wait()
+
+    def _put(self, job):
+        with self._lock:
+            self._pending[job[1]] = self._pending.get(job[1], 0) + 1
+        self._queue.put(job)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='undo-journal')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            jobs = [self._queue.get()]
+            while True:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            pending = []
+            for job in jobs:
+                if job[0] == 'append' and (not pending or pending[-1][1] == job[1]):
+                    pending.append(job)
+                    continue
+                self._write(pending)
+                pending = [job] if job[0] == 'append' else []
+                if job[0] != 'append':
+                    self._apply(job)
+            self._write(pending)
+            with self._lock:
+                for job in jobs:
+                    count = self._pending.pop(job[1]) - 1
+                    if count:
+                        self._pending[job[1]] = count
+                self._done.notify_all()
+            for _ in jobs:
+                self._queue.task_done()
+
+    def _write(self, appends):
+        if not appends:
+            return
+        path = appends[0][1]
+        try:
+            folder = os.path.dirname(path)
+            if folder and not os.path.isdir(folder):
+                os.makedirs(folder)
+            with open(path, 'ab') as f:
+                if f.tell() == 0:
+                    f.write(MAGIC)
+                for _, _, data in appends:
+                    f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        except (IOError, OSError) as e:
+            self._failed(path, e)
+
+    def _apply(self, job):
+        action, path, data = job
+        try:
+            if action == 'remove':
+                if os.path.exists(path):
+                    os.remove(path)
+                return
+            folder = os.path.dirname(path)
+            if folder and not os.path.isdir(folder):
+                os.makedirs(folder)
+            if callable(data):
+                data = data()
+            temp = path + '.tmp'
+            with open(temp, 'wb') as f:
+                f.write(MAGIC + data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp, path)
+        except (IOError, OSError) as e:
+            self._failed(path, e)
+
+    def _failed(self, path, error):
+        try:
+            self.failed.emit(path, str(error))
+        except RuntimeError:
+            # The window owning the writer is already gone
+            pass
+
+
+class UndoJournal(object):
+    """Append-only log of the operations of an UndoStack on one annotation.
+
+    The journal starts with the shapes at the root of the history, written
+    together with the first operation so images that are only looked at do
+    not get one. Shapes are numbered in the order the journal first sees
+    them. Set it as the stack's journal to log every operation.
+    """
+
+    def __init__(self, path, writer):
+        self.path = path
+        self.writer = writer
+        self._ids = {}
+        self._pending = None
+
+    def begin(self, root, shapes):
+        """Start over from shapes, a list of (shape, state)."""
+        self._ids = {}
+        self._pending = encodeFrame(BASE, self._encodeBase(root, shapes))
+
+    def attach(self, ids):
+        """Continue a journal already on disk; ids maps its shapes to their numbers."""
+        self._ids = dict(ids)
+        self._pending = None
+
+    def recorded(self, edit):
+        self._append(encodeFrame(RECORD, self._encodeEdit(edit)))
+
+    def undone(self):
+        self._append(encodeFrame(UNDO))
+
+    def redone(self):
+        self._append(encodeFrame(REDO))
+
+    def compact(self, stack, stamp):
+        """Rewrite the journal as the history of stack, saved as stamp.
+
+        Only the operations still in the stack are kept; without any the
+        journal is removed. stamp may be a callable, called by the writer
+        once the annotation it describes is on disk.
+        """
+        done, undone = stack.doneEdits(), stack.undoneEdits()
+        if not done and not undone:
+            self.discard()
+            return
+        self._ids = {}
+        frames = [encodeFrame(BASE, self._encodeBase(stack.root, stack.rootShapes()))]
+        frames.extend(encodeFrame(RECORD, self._encodeEdit(edit)) for edit in done)
+        frames.extend(encodeFrame(RECORD, self._encodeEdit(edit)) for edit in reversed(undone))
+        frames.extend(encodeFrame(UNDO) for _ in undone)
+        self._pending = None
+        data = b''.join(frames)
+        if callable(stamp):
+            self.writer.replace(self.path, lambda: data + encodeSaved(stamp()))
+        else:
+            self.writer.replace(self.path, data + encodeSaved(stamp))
+
+    def discard(self):
+        self._pending = None
+        self.writer.remove(self.path)
+
+    def _append(self, data):
+        if self._pending is not None:
+            data = self._pending + data
+            self._pending = None
+        self.writer.append(self.path, data)
+
+    def _id(self, shape):
+        id = self._ids.get(shape)
+        if id is None:
+            id = self._ids[shape] = len(self._ids)
+        return id
+
+    def _encodeBase(self, root, shapes):
+        return {'root': root,
+                'shapes': [[self._id(shape), encodeState(state)] for shape, state in shapes]}
+
+    def _encodeEdit(self, edit):
+        return [edit.name,
+                [[index, self._id(shape), encodeState(state)] for index, shape, state in edit.removed],
+                [[index, self._id(shape), encodeState(state)] for index, shape, state in edit.inserted],
+                [[self._id(shape), encodeState(before), encodeState(after)]
+                 for shape, before, after in edit.changed]]
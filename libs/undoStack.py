@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Operations kept in memory per image
+DEFAULT_UNDO_LIMIT = 500
+
+
+class ShapeEdit(object):
+    """The shapes touched by one operation.
+
+    removed holds (index, shape, state) for the shapes taken out, indexed in
+    the list before the edit; inserted holds the same for the shapes added,
+    indexed in the list after it. Both are in ascending index order.
+    changed holds (shape, before, after) for shapes edited in place.
+    """
+
+    def __init__(self, name, removed=(), inserted=(), changed=()):
+        self.name = name
+        self.removed = list(removed)
+        self.inserted = list(inserted)
+        self.changed = list(changed)
+
+    def __len__(self):
+        return len(self.removed) + len(self.inserted) + len(self.changed)
+
+    def reversed(self):
+        return ShapeEdit(self.name, self.inserted, self.removed,
+                         [(shape, after, before) for shape, before, after in self.changed])
+
+    def applyTo(self, shapes):
+        """Replay the insertions and removals on the list shapes."""
+        for index, _, _ in reversed(self.removed):
+            del shapes[index]
+        for index, shape, _ in self.inserted:
+            shapes.insert(index, shape)
+
+
+class UndoStack(object):
+    """Undo history that stores only the shapes each operation touched.
+
+    capture(shape) returns the full, comparable state of a shape and
+    version(shape) a cheap value that changes whenever that state does, so
+    recording an operation only captures the shapes that actually changed.
+    The stack keeps at most limit operations; older ones are dropped.
+    Operations are also logged to journal when one is set.
+    """
+
+    def __init__(self, capture, version, limit=DEFAULT_UNDO_LIMIT):
+        self.capture = capture
+        self.version = version
+        self.limit = limit
+        self.journal = None
+        self.clear()
+
+    def clear(self):
+        self.root = None
+        self._done = []
+        self._undone = []
+        self._shapes = []
+        self._known = {}
+
+    def reset(self, name, shapes):
+        """Start a new history from the current shapes."""
+        self.clear()
+        self.root = name
+        self._shapes = list(shapes)
+        for shape in self._shapes:
+            self._known[shape] = (self.version(shape), self.capture(shape))
+
+    def canUndo(self):
+        return bool(self._done)
+
+    def canRedo(self):
+        return bool(self._undone)
+
+    def undoCount(self):
+        return len(self._done)
+
+    def doneEdits(self):
+        return list(self._done)
+
+    def undoneEdits(self):
+        """Undone operations, the next one to redo last."""
+        return list(self._undone)
+
+    def rootShapes(self):
+        """[(shape, state)] at the root of the history."""
+        shapes = list(self._shapes)
+        states = dict((shape, self._known[shape][1]) for shape in shapes)
+        for edit in reversed(self._done):
+            edit = edit.reversed()
+            edit.applyTo(shapes)
+            for _, shape, state in edit.inserted:
+                states[shape] = state
+            for shape, _, state in edit.changed:
+                states[shape] = state
+        return [(shape, states[shape]) for shape in shapes]
+
+    def __len__(self):
+        """Number of entries in names()."""
+        return self.rootCount() + len(self._done) + len(self._undone)
+
+    def rootCount(self):
+        return 1 if self.root is not None else 0
+
+    def name(self, row):
+        """Entry row of names() without building the list."""
+        row -= self.rootCount()
+        if row < 0:
+            return self.root
+        if row < len(self._done):
+            return self._done[row].name
+        return self._undone[len(self._done) + len(self._undone) - 1 - row].name
+
+    def names(self):
+        """Names of the root and of all done and undone operations, oldest first."""
+        names = [self.root] if self.root is not None else []
+        names.extend(edit.name for edit in self._done)
+        names.extend(edit.name for edit in reversed(self._undone))
+        return names
+
+    def position(self):
+        """Index in names() of the current state."""
+        return self.rootCount() + len(self._done) - 1
+
+    def discardRedo(self):
+        del self._undone[:]
+
+    def trim(self, limit):
+        """Drop the oldest operations beyond limit, returning how many went."""
+        count = max(0, len(self._done) - limit)
+        del self._done[:count]
+        return count
+
+    def record(self, name, shapes):
+        """Record the difference between the last known shapes and shapes."""
+        return self._push(self._diff(name, list(shapes)))
+
+    def push(self, edit, apply):
+        """Apply an edit recorded elsewhere, e.g. read back from a journal."""
+        return self._push(self._apply(edit, apply))
+
+    def _push(self, edit):
+        self.discardRedo()
+        self._done.append(edit)
+        if self.limit is not None:
+            self.trim(self.limit)
+        if self.journal is not None:
+            self.journal.recorded(edit)
+        return edit
+
+    def undo(self, apply):
+        """Revert the last operation, passing the reverting edit to apply."""
+        if not self._done:
+            return None
+        edit = self._done.pop()
+        self._undone.append(edit)
+        if self.journal is not None:
+            self.journal.undone()
+        return self._apply(edit.reversed(), apply)
+
+    def redo(self, apply):
+        if not self._undone:
+            return None
+        edit = self._undone.pop()
+        self._done.append(edit)
+        if self.journal is not None:
+            self.journal.redone()
+        return self._apply(edit, apply)
+
+    def _apply(self, edit, apply):
+        edit.applyTo(self._shapes)
+        apply(edit)
+        for _, shape, _ in edit.removed:
+            self._known.pop(shape, None)
+        for _, shape, state in edit.inserted:
+            self._known[shape] = (self.version(shape), state)
+        for shape, _, state in edit.changed:
+            self._known[shape] = (self.version(shape), state)
+        return edit
+
+    def _diff(self, name, shapes):
+        known = self._known
+        current = set(shapes)
+        kept = [shape for shape in self._shapes if shape in current]
+        if kept != [shape for shape in shapes if shape in known]:
+            # Reordered, record it as a replacement of everything
+            kept = []
+            current = set()
+        keptSet = set(kept)
+
+        removed = [(index, shape, known.pop(shape)[1])
+                   for index, shape in enumerate(self._shapes) if shape not in current]
+        inserted = []
+        changed = []
+        for index, shape in enumerate(shapes):
+            if shape not in keptSet:
+                state = self.capture(shape)
+                known[shape] = (self.version(shape), state)
+                inserted.append((index, shape, state))
+                continue
+            version = self.version(shape)
+            oldVersion, before = known[shape]
+            if version == oldVersion:
+                continue
+            after = self.capture(shape)
+            known[shape] = (version, after)
+            if after != before:
+                changed.append((shape, before, after))
+
+        self._shapes = shapes
+        return ShapeEdit(name, removed, inserted, changed)
@@ -1,3 +1,4 @@
+from bisect import bisect_right
 from math import sqrt
 from libs.ustr import ustr
 import hashlib
@@ -92,12 +93,55 @@ def have_qstring():
 def util_qt_strlistclass():
     return QStringList if have_qstring() else list
 
-def natural_sort(list, key=lambda s:s):
+_digits = re.compile('[0-9]+')
+
+
+def _encode_number(match):
+    digits = match.group().lstrip('0')
+    return '\x00' + chr(len(digits)) + digits
+
+
+def natural_key(s):
+    """
+    Key of s in natural alphanumeric order, as one string.
+
+    Each run of digits becomes a NUL, its length and the digits without
+    leading zeros, so plain string comparison orders the numbers by value
+    and a text ending early sorts first. Keys are compared in C and take
+    little more room than s itself.
+    """
+    return _digits.sub(_encode_number, s) + '\x00'
+
+def natural_sort(list, key=None):
     """
     Sort the list into natural alphanumeric order.
     """
-    def get_alphanum_key_func(key):
-        convert = lambda text: int(text) if text.isdigit() else text
-        return lambda s: [convert(c) for c in re.split('([0-9]+)', key(s))]
-    sort_key = get_alphanum_key_func(key)
-    list.sort(key=sort_key)
+    if key is None:
+        list.sort(key=natural_key)
+    else:
+        list.sort(key=lambda s: natural_key(key(s)))
+
+def natural_merge(items, keys, newItems, newKeys):
+    """
+    Merge newItems into items, both sorted by their keys.
+
+    Returns the merged items and keys. Each new item costs one binary
+    search; the runs of items between them are copied as slices. Items
+    already there come before new ones with an equal key.
+    """
+    order = sorted(range(len(newItems)), key=newKeys.__getitem__)
+    mergedItems = []
+    mergedKeys = []
+    start = 0
+    for i in order:
+        key = newKeys[i]
+        position = bisect_right(keys, key, start)
+        if position > start:
+            mergedItems.extend(items[start:position])
+            mergedKeys.extend(keys[start:position])
+            start = position
+        mergedItems.append(newItems[i])
+        mergedKeys.append(key)
+    mergedItems.extend(items[start:])
+    mergedKeys.extend(keys[start:])
+    return mergedItems, mergedKeys
@@ -1,16 +1,18 @@
 #!/usr/bin/env python
 # -*- coding: utf8 -*-
-import sys
 import os
-from xml.etree import ElementTree
-from xml.etree.ElementTree import Element, SubElement
-from lxml import etree
-import codecs
+import locale
 from libs.constants import DEFAULT_ENCODING
 
 TXT_EXT = '.txt'
 ENCODE_METHOD = DEFAULT_ENCODING
 
+def classListData(classList):
+    """Bytes of a classes.txt listing classList."""
+    # A text file in the platform encoding, as YoloReader reads it
+    return ''.join(c + os.linesep for c in classList).encode(locale.getpreferredencoding(False))
+
+
 class YOLOWriter:
 
     def __init__(self, foldername, filename, imgSize, databaseSrc='Unknown', localImgPath=None):
@@ -49,41 +51,35 @@ class YOLOWriter:
 
         return classIndex, xcen, ycen, w, h
 
-    def save(self, classList=[], targetFile=None):
-
-        out_file = None #Update yolo .txt
-        out_class_file = None   #Update class list .txt
-
+    def files(self, classList=[], targetFile=None):
+        """
+            Return [(path, bytes)] of the .txt file and of classes.txt
+        """
         if targetFile is None:
-            out_file = open(
-            self.filename + TXT_EXT, 'w', encoding=ENCODE_METHOD)
-            classesFile = os.path.join(os.path.dirname(os.path.abspath(self.filename)), "classes.txt")
-            out_class_file = open(classesFile, 'w')
-
-        else:
-            out_file = codecs.open(targetFile, 'w', encoding=ENCODE_METHOD)
-            classesFile = os.path.join(os.path.dirname(os.path.abspath(targetFile)), "classes.txt")
-            out_class_file = open(classesFile, 'w')
-
+            targetFile = self.filename + TXT_EXT
+        classesFile = os.path.join(os.path.dirname(os.path.abspath(targetFile)), "classes.txt")
 
+        lines = []
         for box in self.boxlist:
             classIndex, xcen, ycen, w, h = self.BndBox2YoloLine(box, classList)
-            # print (classIndex, xcen, ycen, w, h)
-            out_file.write("%d %.6f %.6f %.6f %.6f\n" % (classIndex, xcen, ycen, w, h))
+            lines.append("%d %.6f %.6f %.6f %.6f\n" % (classIndex, xcen, ycen, w, h))
 
-        # print (classList)
-        # print (out_class_file)
-        for c in classList:
-            out_class_file.write(c+'\n')
+        # classes.txt first, so the .txt is never on disk before its classes
+        return [(classesFile, classListData(classList)),
+                (targetFile, ''.join(lines).encode(ENCODE_METHOD))]
 
-        out_class_file.close()
-        out_file.close()
+    def save(self, classList=[], targetFile=None):
+        for path, data in self.files(classList, targetFile):
+            with open(path, 'wb') as out_file:
+                out_file.write(data)
 
 
 
 class YoloReader:
 
-    def __init__(self, filepath, image, classListPath=None):
+    def __init__(self, filepath, image, classListPath=None, imgSize=None):
+        # imgSize is (height, width, depth) like YOLOWriter.imgSize, used
+        # instead of image when the image is not loaded
         # shapes type:
         # [labbel, [(x1,y1), (x2,y2), (x3,y3), (x4,y4)], color, color, difficult]
         self.shapes = []
@@ -102,8 +98,9 @@ class YoloReader:
 
         # print (self.classes)
 
-        imgSize = [image.height(), image.width(),
-                      1 if image.isGrayscale() else 3]
+        if imgSize is None:
+            imgSize = [image.height(), image.width(),
+                          1 if image.isGrayscale() else 3]
 
         self.imgSize = imgSize
 
@@ -46,7 +46,8 @@ setup(
     packages=required_packages,
     entry_points={
         'console_scripts': [
-            'labelImg=labelImg.labelImg:main'
+            'labelImg=labelImg.labelImg:main',
+            'labelImg-convert=libs.convert:main'
         ]
     },
     include_package_data=True,
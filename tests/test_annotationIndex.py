@@ -0,0 +1,140 @@
+import gc
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from PyQt5.QtWidgets import QApplication
+except ImportError:
+    from PyQt4.QtGui import QApplication
+
+from libs.annotationIndex import AnnotationIndex, AnnotationIndexer, indexPath
+from libs.pascal_voc_io import PascalVocWriter
+
+TEST_IMAGE = os.path.join(os.path.dirname(__file__), 'test.512.512.bmp')
+
+
+class TestAnnotationIndex(unittest.TestCase):
+
+    app = None
+
+    @classmethod
+    def setUpClass(cls):
+        if QApplication.instance() is None:
+            cls.app = QApplication([])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app = None
+        gc.collect()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.images = []
+        for i in range(3):
+            path = os.path.join(self.tmpdir, 'img%d.bmp' % i)
+            shutil.copy(TEST_IMAGE, path)
+            self.images.append(path)
+        self.index = AnnotationIndex(indexPath(self.tmpdir), self.annotationPaths)
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmpdir)
+
+    def annotationPaths(self, imagePath):
+        base = os.path.splitext(imagePath)[0]
+        return base + '.xml', base + '.txt'
+
+    def writeVoc(self, imagePath, labels, verified=False):
+        writer = PascalVocWriter('tmp', os.path.basename(imagePath), [512, 512, 3], localImgPath=imagePath)
+        writer.verified = verified
+        for i, label in enumerate(labels):
+            writer.addBndBox(i, i, i + 10, i + 10, label, 0)
+        writer.save(self.annotationPaths(imagePath)[0])
+
+    def test_entry(self):
+        entry = self.index.entry(self.images[0])
+        self.assertEqual((entry.width, entry.height, entry.depth), (512, 512, 3))
+        self.assertIsNone(entry.annotation)
+        self.assertEqual(entry.boxes, 0)
+
+        self.writeVoc(self.images[0], ['cat', 'dog', 'cat'], verified=True)
+        self.assertFalse(self.index.isCurrent(self.images[0]))
+        entry = self.index.entry(self.images[0])
+        self.assertEqual(entry.annotation, self.annotationPaths(self.images[0])[0])
+        self.assertTrue(entry.verified)
+        self.assertEqual(entry.boxes, 3)
+        self.assertEqual(entry.classes, {'cat': 2, 'dog': 1})
+        self.assertTrue(self.index.isCurrent(self.images[0]))
+
+        # Stored entries survive reopening
+        self.index.close()
+        self.index = AnnotationIndex(indexPath(self.tmpdir), self.annotationPaths)
+        self.assertTrue(self.index.isCurrent(self.images[0]))
+        self.assertEqual(self.index.entry(self.images[0]).classes, {'cat': 2, 'dog': 1})
+
+        self.index.remove(self.images[0])
+        self.assertFalse(self.index.isCurrent(self.images[0]))
+
+        # A closed index still answers, from the files
+        self.index.close()
+        self.assertEqual(self.index.entry(self.images[0]).classes, {'cat': 2, 'dog': 1})
+        self.index.remove(self.images[0])
+        self.assertEqual(self.index.classCounts(), {})
+
+    def test_yolo(self):
+        txtPath = self.annotationPaths(self.images[1])[1]
+        with open(os.path.join(self.tmpdir, 'classes.txt'), 'w') as f:
+            f.write('cat\ndog\n')
+        with open(txtPath, 'w') as f:
+            f.write('1 0.5 0.5 0.1 0.1\nx 0.1 0.1 0.1 0.1\n\n1.5 0.1 0.1 0.1 0.1\n1 0.2 0.2 0.1 0.1\n')
+        entry = self.index.entry(self.images[1])
+        self.assertEqual(entry.annotation, txtPath)
+        # Malformed lines are skipped, not the whole file
+        self.assertEqual(entry.classes, {'dog': 2})
+
+        # Renaming a class makes the entry out of date
+        with open(os.path.join(self.tmpdir, 'classes.txt'), 'w') as f:
+            f.write('cat\nbird\n')
+        self.assertFalse(self.index.isCurrent(self.images[1]))
+        self.assertEqual(self.index.entry(self.images[1]).classes, {'bird': 2})
+
+    def test_indexer(self):
+        self.writeVoc(self.images[0], ['cat'])
+        self.writeVoc(self.images[2], ['dog', 'dog'])
+        indexer = AnnotationIndexer()
+        indexer.schedule(self.index, self.images)
+        indexer.flush()
+        self.assertTrue(all(self.index.isCurrent(path) for path in self.images))
+        self.assertEqual(self.index.classCounts(), {'cat': 1, 'dog': 2})
+
+        self.writeVoc(self.images[1], ['cat'])
+        indexer.update(self.index, self.images[1])
+        indexer.flush()
+        self.assertEqual(self.index.classCounts(), {'cat': 2, 'dog': 2})
+
+    def test_failuresAreReported(self):
+        failed = []
+        self.index.failed = lambda path, reason: failed.append(path)
+        xmlPath = self.annotationPaths(self.images[0])[0]
+        with open(xmlPath, 'w') as f:
+            f.write('<annotation><object>')
+        self.assertEqual(self.index.entry(self.images[0]).boxes, 0)
+        self.assertEqual(failed, [xmlPath])
+
+        indexer = AnnotationIndexer()
+        indexer.failed.connect(lambda path, reason: failed.append(path))
+        self.index._db.execute('DROP TABLE images')
+        indexer.schedule(self.index, self.images)
+        indexer.flush()
+        QApplication.processEvents()
+        self.assertEqual(failed, [xmlPath, self.index.path])
+
+        # Removing runs on the caller's thread, and reports the same way
+        self.index.remove(self.images[1])
+        self.assertEqual(failed, [xmlPath, self.index.path, self.index.path])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+"""Micro-benchmarks, only run when LABELIMG_BENCHMARK is set:
+
+    LABELIMG_BENCHMARK=1 python -m pytest -s tests/test_benchmarks.py
+"""
+import codecs
+import gc
+import os
+import random
+import shutil
+import tempfile
+import timeit
+import unittest
+
+try:
+    from PyQt5.QtCore import QPointF
+    from PyQt5.QtWidgets import QApplication
+except ImportError:
+    from PyQt4.QtCore import QPointF
+    from PyQt4.QtGui import QApplication
+
+from libs.fileListModel import FileListModel
+from libs.imageList import ImageList
+from libs.pascal_voc_io import PascalVocWriter
+from libs.utils import natural_key, natural_merge, natural_sort
+from tests.test_canvas import dragSelect, legacyDragSelection, makeCanvas
+from tests.test_io import legacyVocBytes
+from tests.test_shape import makeBox
+from tests.test_utils import legacyNaturalKey
+
+
+def report(name, seconds, count, unit='event'):
+    print('\n%-40s %10.1f us/%s' % (name, seconds / count * 1e6, unit))
+
+
+@unittest.skipUnless(os.environ.get('LABELIMG_BENCHMARK'), 'set LABELIMG_BENCHMARK=1 to run')
+class BenchmarkShapeGeometry(unittest.TestCase):
+    """Hover-style hit test over 2,000 boxes, uncached vs cached geometry."""
+
+    def setUp(self):
+        self.shapes = [makeBox((i * 37) % 1900, (i * 53) % 1000, 30, 20) for i in range(2000)]
+        self.pos = QPointF(955.5, 505.5)
+
+    def event(self, invalidate):
+        pos = self.pos
+        for shape in self.shapes:
+            if invalidate:
+                # What every call used to cost
+                shape._invalidate()
+            shape.containsPoint(pos)
+            shape.boundingRect()
+            shape.extents()
+
+    def test_hitTest(self):
+        rounds = 20
+        before = timeit.timeit(lambda: self.event(True), number=rounds)
+        after = timeit.timeit(lambda: self.event(False), number=rounds)
+        report('shape geometry, recomputed', before, rounds)
+        report('shape geometry, cached', after, rounds)
+        self.assertLess(after, before)
+
+
+@unittest.skipUnless(os.environ.get('LABELIMG_BENCHMARK'), 'set LABELIMG_BENCHMARK=1 to run')
+class BenchmarkDragSelection(unittest.TestCase):
+    """Rubber-band selection over 5,000 boxes on an 8K frame."""
+
+    app = None
+
+    @classmethod
+    def setUpClass(cls):
+        if QApplication.instance() is None:
+            cls.app = QApplication([])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app = None
+        gc.collect()
+
+    def setUp(self):
+        rng = random.Random(7)
+        self.shapes = [makeBox(rng.uniform(0, 7600), rng.uniform(0, 4250),
+                               rng.uniform(8, 80), rng.uniform(8, 60)) for _ in range(5000)]
+        self.canvas = makeCanvas(self.shapes)
+        self.drags = [(QPointF(x, y), QPointF(x + 600, y + 400))
+                      for x, y in ((100, 100), (3000, 1800), (6900, 3800))]
+
+    def tearDown(self):
+        self.canvas.deleteLater()
+
+    def test_dragSelection(self):
+        before = timeit.timeit(lambda: [legacyDragSelection(self.shapes, p1, p2)
+                                        for p1, p2 in self.drags], number=1)
+        after = timeit.timeit(lambda: [dragSelect(self.canvas, p1, p2)
+                                       for p1, p2 in self.drags], number=5)
+        report('drag selection, range sets', before, len(self.drags), 'drag')
+        report('drag selection, grid index', after, 5 * len(self.drags), 'drag')
+        self.assertLess(after / 5, before)
+
+
+@unittest.skipUnless(os.environ.get('LABELIMG_BENCHMARK'), 'set LABELIMG_BENCHMARK=1 to run')
+class BenchmarkVocWriter(unittest.TestCase):
+    """Saving a Pascal VOC file, old serialize/re-parse path vs direct lxml."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'a.xml')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def makeWriter(self, count):
+        writer = PascalVocWriter('images', 'a.jpg', (4320, 7680, 3), localImgPath='/data/images/a.jpg')
+        for i in range(count):
+            writer.addBndBox(i % 7000, i % 4000, i % 7000 + 50, i % 4000 + 40, 'label %d' % (i % 20), i % 2)
+        return writer
+
+    def legacySave(self, writer):
+        out_file = codecs.open(self.path, 'w', encoding='utf-8')
+        out_file.write(legacyVocBytes(writer).decode('utf8'))
+        out_file.close()
+
+    def test_save(self):
+        for count, rounds in ((1, 2000), (1000, 20)):
+            writer = self.makeWriter(count)
+            before = timeit.timeit(lambda: self.legacySave(writer), number=rounds)
+            after = timeit.timeit(lambda: writer.save(self.path), number=rounds)
+            report('voc save %d objects, re-parsed' % count, before, rounds, 'file')
+            report('voc save %d objects, direct' % count, after, rounds, 'file')
+            self.assertLess(after, before)
+
+
+@unittest.skipUnless(os.environ.get('LABELIMG_BENCHMARK'), 'set LABELIMG_BENCHMARK=1 to run')
+class BenchmarkImageList(unittest.TestCase):
+    """Position of an image in a 1,000,000 image list, list vs ImageList, with edits."""
+
+    def setUp(self):
+        self.paths = ['/data/set/img%07d.jpg' % i for i in range(1000000)]
+        self.images = ImageList(self.paths)
+
+    def test_index(self):
+        path = self.paths[-1000]
+        n = 20
+        listSeconds = timeit.timeit(lambda: self.paths.index(path), number=n) / n
+        report('list.index, 1M images', listSeconds, 1, 'lookup')
+        n = 100000
+        seconds = timeit.timeit(lambda: self.images.index(path), number=n)
+        report('ImageList.index, 1M images', seconds, n, 'lookup')
+
+        # An edit only moves the starts of the blocks after it
+        def deleteAndLookUp():
+            del self.images[500000]
+            self.images.index(path)
+        n = 200
+        seconds = timeit.timeit(deleteAndLookUp, number=n) / n
+        report('ImageList delete + index, 1M images', seconds, 1, 'delete')
+        self.assertLess(seconds, listSeconds)
+
+        def insertAndLookUp():
+            self.images.insert(1000, '/data/set/new%07d.jpg' % len(self.images))
+            self.images.index(path)
+        seconds = timeit.timeit(insertAndLookUp, number=n) / n
+        report('ImageList insert + index, 1M images', seconds, 1, 'insert')
+        self.assertLess(seconds, listSeconds)
+
+
+@unittest.skipUnless(os.environ.get('LABELIMG_BENCHMARK'), 'set LABELIMG_BENCHMARK=1 to run')
+class BenchmarkNaturalSort(unittest.TestCase):
+    """Natural ordering of 1,000,000 paths, list keys vs string keys, re-sort vs merge."""
+
+    def setUp(self):
+        rng = random.Random(7)
+        self.paths = ['/data/set%d/Img_%d-%d.jpg' % (rng.randint(0, 99), rng.randint(0, 99999), rng.randint(0, 9))
+                      for _ in range(1000000)]
+
+    def test_sort(self):
+        before = timeit.timeit(lambda: sorted(self.paths, key=legacyNaturalKey), number=1)
+        after = timeit.timeit(lambda: natural_sort(list(self.paths)), number=1)
+        report('natural sort 1M paths, list keys', before, len(self.paths), 'path')
+        report('natural sort 1M paths, string keys', after, len(self.paths), 'path')
+        self.assertLess(after, before)
+
+    def test_merge(self):
+        paths = self.paths[:990000]
+        natural_sort(paths)
+        keys = [natural_key(path) for path in paths]
+        batch = self.paths[990000:]
+
+        def resort():
+            merged = paths + batch
+            natural_sort(merged)
+        before = timeit.timeit(resort, number=1)
+        after = timeit.timeit(lambda: natural_merge(paths, keys, batch, [natural_key(path) for path in batch]),
+                              number=1)
+        report('10k into 1M paths, re-sorted', before, len(batch), 'path')
+        report('10k into 1M paths, merged', after, len(batch), 'path')
+        self.assertLess(after, before)
+
+        model = FileListModel()
+        model.append(paths)
+        model.insertSorted(batch[:1])
+        n = 100
+        seconds = timeit.timeit(lambda: model.insertSorted(['/data/set50/Img_%d-x.jpg' % len(model.paths)]), number=n)
+        report('FileListModel.insertSorted, 1M paths', seconds, n, 'path')
+        seconds = timeit.timeit(lambda: model.insertSorted(batch), number=1)
+        report('FileListModel.insertSorted 10k, 1M paths', seconds, len(batch), 'path')
+
+
+if __name__ == '__main__':
+    unittest.main()
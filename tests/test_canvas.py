@@ -0,0 +1,238 @@
+import gc
+import random
+import sys
+import unittest
+
+try:
+    from PyQt5.QtGui import QColor, QImage, QPainter, QPixmap, QRegion
+    from PyQt5.QtCore import QPointF, QRect, Qt
+    from PyQt5.QtWidgets import QApplication
+except ImportError:
+    from PyQt4.QtGui import QColor, QImage, QPainter, QPixmap, QRegion
+    from PyQt4.QtCore import QPointF, QRect, Qt
+    from PyQt4.QtGui import QApplication
+
+from libs import tilePyramid
+from libs.canvas import Canvas
+from libs.shape import Shape
+from tests.test_shape import makeBox
+
+
+def legacyDragSelection(shapes, pos1, pos2):
+    """The set based overlap test dragSelectionShape used to do."""
+    xlist = [pos1.x(), pos2.x()]
+    ylist = [pos1.y(), pos2.y()]
+    hits = []
+    for shape in shapes:
+        xsetlist = set(range(int(min(xlist)), int(max(xlist))))
+        ysetlist = set(range(int(min(ylist)), int(max(ylist))))
+        xs = [p.x() for p in shape.points]
+        ys = [p.y() for p in shape.points]
+        shapexlist = set(range(int(min(xs)), int(max(xs))))
+        shapeylist = set(range(int(min(ys)), int(max(ys))))
+        if xsetlist & shapexlist and ysetlist & shapeylist:
+            hits.append(shape)
+    return hits
+
+
+def makeCanvas(shapes):
+    canvas = Canvas()
+    canvas.loadShapes(shapes)
+    return canvas
+
+
+def imageCanvas(shapes, width=400, height=300):
+    """Canvas showing a white image of width x height, all of it in view."""
+    canvas = Canvas()
+    pixmap = QPixmap(width, height)
+    pixmap.fill(Qt.white)
+    canvas.loadPixmap(pixmap)
+    canvas.resize(width, height)
+    canvas.loadShapes(shapes)
+    canvas._damage = QRegion()
+    return canvas
+
+
+def paintedBounds(canvas, shape):
+    """Widget pixels shape actually paints, as paintEvent draws it."""
+    image = QImage(canvas.size(), QImage.Format_ARGB32)
+    image.fill(Qt.transparent)
+    p = QPainter(image)
+    p.setRenderHint(QPainter.Antialiasing)
+    p.scale(canvas.scale, canvas.scale)
+    p.translate(canvas.offsetToCenter())
+    Shape.scale = canvas.scale
+    shape.paint(p)
+    p.end()
+    width = image.width()
+    bits = image.constBits()
+    bits.setsize(image.byteCount())
+    # The alpha byte of each pixel, premultiplied ARGB32 being BGRA in memory
+    alpha = bytes(bits)[3::4] if sys.byteorder == 'little' else bytes(bits)[0::4]
+    xs, ys = [], []
+    for y in range(image.height()):
+        row = alpha[y * width:(y + 1) * width]
+        if row.strip(b'\0'):
+            ys.append(y)
+            xs.append(width - len(row.lstrip(b'\0')))
+            xs.append(len(row.rstrip(b'\0')) - 1)
+    return QRect(min(xs), min(ys), max(xs) - min(xs) + 1, max(ys) - min(ys) + 1)
+
+
+def dragSelect(canvas, pos1, pos2):
+    canvas.deSelectShape()
+    canvas.startDragpos, canvas.endDragpos = pos1, pos2
+    canvas.dragSelectionShape()
+    return canvas.selectedMultishape
+
+
+class TestCanvas(unittest.TestCase):
+
+    app = None
+
+    @classmethod
+    def setUpClass(cls):
+        if QApplication.instance() is None:
+            cls.app = QApplication([])
+
+    @classmethod
+    def tearDownClass(cls):
+        # Other tests create their own QApplication
+        cls.app = None
+        gc.collect()
+    def test_dragSelectionMatchesLegacyOverlap(self):
+        rng = random.Random(4)
+        shapes = [makeBox(rng.uniform(0, 900), rng.uniform(0, 500),
+                          rng.uniform(0.2, 80), rng.uniform(0.2, 80)) for _ in range(300)]
+        canvas = makeCanvas(shapes)
+        for _ in range(30):
+            pos1 = QPointF(rng.uniform(0, 1000), rng.uniform(0, 600))
+            pos2 = QPointF(rng.uniform(0, 1000), rng.uniform(0, 600))
+            expected = legacyDragSelection(shapes, pos1, pos2)
+            self.assertEqual(dragSelect(canvas, pos1, pos2), expected)
+
+    def test_dragSelectionFollowsMovedShapes(self):
+        shapes = [makeBox(0, 0, 10, 10), makeBox(50, 50, 10, 10)]
+        canvas = makeCanvas(shapes)
+        shapes[0].moveBy(QPointF(100, 100))
+        canvas.shapeChanged(shapes[0])
+        self.assertEqual(dragSelect(canvas, QPointF(95, 95), QPointF(120, 120)), [shapes[0]])
+        self.assertEqual(dragSelect(canvas, QPointF(-5, -5), QPointF(20, 20)), [])
+
+    def test_largeImagesAreTiled(self):
+        canvas = Canvas()
+        image = QImage(1000, 600, QImage.Format_RGB32)
+        image.fill(0)
+        minPixels = tilePyramid.TILED_MIN_PIXELS
+        tilePyramid.TILED_MIN_PIXELS = 1000 * 600
+        try:
+            canvas.loadImage(image)
+        finally:
+            tilePyramid.TILED_MIN_PIXELS = minPixels
+        self.assertNotIsInstance(canvas.pixmap, QPixmap)
+        self.assertEqual((canvas.pixmap.width(), canvas.pixmap.height()), (1000, 600))
+        self.assertTrue(canvas.pixmap)
+
+        # The layer is redrawn as the smaller levels become ready
+        tiles = canvas.tiles
+        tiles.wait()
+        canvas._layer = object()
+        QApplication.processEvents()
+        self.assertIsNone(canvas._layer)
+
+        canvas.loadImage(QImage(10, 10, QImage.Format_RGB32))
+        self.assertIsInstance(canvas.pixmap, QPixmap)
+        self.assertIsNone(canvas.tiles)
+
+
+    def test_paintedRectCoversPainting(self):
+        shape = makeBox(40, 30, 60, 40)
+        shape.label = 'a long label'
+        shape.paintLabel = True
+        shape.fill = shape.selected = True
+        canvas = imageCanvas([shape])
+        for scale in (0.5, 1.0, 2.5):
+            canvas.scale = scale
+            for mode in (Shape.NEAR_VERTEX, Shape.MOVE_VERTEX):
+                # The largest vertex handle
+                shape.highlightVertex(0, mode)
+                damaged = canvas.widgetRect(canvas.paintedRect(shape))
+                painted = paintedBounds(canvas, shape)
+                self.assertTrue(damaged.contains(painted), (scale, mode, damaged, painted))
+
+        # Near the top the label is drawn below the box
+        shape = makeBox(40, 2, 60, 40)
+        shape.label = 'a long label'
+        shape.paintLabel = True
+        canvas = imageCanvas([shape])
+        painted = paintedBounds(canvas, shape)
+        self.assertTrue(canvas.widgetRect(canvas.paintedRect(shape)).contains(painted))
+
+    def test_movesDamageOldAndNewRects(self):
+        shape = makeBox(40, 30, 60, 40)
+        shape.label = 'box'
+        shape.paintLabel = True
+        canvas = imageCanvas([shape, makeBox(300, 200, 20, 20)])
+
+        # A vertex dragged
+        old = canvas.widgetRect(canvas.paintedRect(shape))
+        canvas.hShape, canvas.hVertex = shape, 2
+        shape.highlightVertex(2, Shape.MOVE_VERTEX)
+        canvas.boundedMoveVertex(QPointF(150, 120))
+        new = canvas.widgetRect(canvas.paintedRect(shape))
+        self.assertEqual(canvas._damage, QRegion(old).united(QRegion(new)))
+        canvas.updateDamage()
+        self.assertTrue(canvas._damage.isEmpty())
+
+        # The whole shape dragged
+        old = new
+        canvas.selectedShape = shape
+        canvas.calculateOffsets(shape, QPointF(60, 40))
+        canvas.prevPoint = QPointF(60, 40)
+        self.assertTrue(canvas.boundedMoveShape(shape, QPointF(240, 170)))
+        new = canvas.widgetRect(canvas.paintedRect(shape))
+        self.assertEqual(canvas._damage, QRegion(old).united(QRegion(new)))
+        self.assertFalse(old.intersects(new))
+
+    def test_backgroundLayerInvalidation(self):
+        inactive = makeBox(40, 30, 60, 40)
+        active = makeBox(200, 150, 60, 40)
+        canvas = imageCanvas([inactive, active])
+        canvas.hShape = active
+
+        layer = canvas.backgroundLayer()
+        self.assertIsNotNone(layer)
+        self.assertIs(canvas.backgroundLayer(), layer)
+        edge = layer.toImage().pixel(70, 30)
+        self.assertNotEqual(edge, QColor(Qt.white).rgb())
+        # Hovered shapes are drawn on top, not into the layer
+        self.assertEqual(layer.toImage().pixel(230, 150), QColor(Qt.white).rgb())
+
+        # Changing the active shape leaves the layer alone
+        active.moveBy(QPointF(10, 10))
+        canvas.shapeChanged(active)
+        self.assertTrue(canvas._layerDirty.isEmpty())
+
+        # An inactive shape moved is patched in the same layer
+        inactive.moveBy(QPointF(0, 100))
+        canvas.shapeChanged(inactive)
+        self.assertFalse(canvas._layerDirty.isEmpty())
+        self.assertIs(canvas.backgroundLayer(), layer)
+        image = layer.toImage()
+        self.assertEqual(image.pixel(70, 30), QColor(Qt.white).rgb())
+        self.assertEqual(image.pixel(70, 130), edge)
+        self.assertTrue(canvas._layerDirty.isEmpty())
+
+        # A new scale or image starts over
+        canvas.scale = 0.5
+        scaled = canvas.backgroundLayer()
+        self.assertIsNot(scaled, layer)
+        point = (QPointF(70, 130) + canvas.offsetToCenter()) * canvas.scale
+        self.assertNotIn(scaled.toImage().pixel(int(point.x()), int(point.y())), (0, QColor(Qt.white).rgb()))
+        canvas.loadPixmap(QPixmap(400, 300))
+        self.assertIsNone(canvas._layer)
+        self.assertIsNot(canvas.backgroundLayer(), scaled)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+
+from libs.convert import main, readClasses
+from libs.pascal_voc_io import PascalVocReader, PascalVocWriter
+
+TEST_IMAGE = os.path.join(os.path.dirname(__file__), 'test.512.512.bmp')
+
+
+class TestConvert(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmpdir, 'voc')
+        os.makedirs(os.path.join(self.source, 'sub'))
+        self.boxes = {'a': [('cat', 10, 20, 100, 200), ('dog', 50, 60, 300, 400)],
+                      os.path.join('sub', 'b'): [('bird', 1, 1, 511, 511)]}
+        for name, boxes in self.boxes.items():
+            image = os.path.join(self.source, name + '.bmp')
+            shutil.copy(TEST_IMAGE, image)
+            writer = PascalVocWriter('voc', os.path.basename(image), [512, 512, 3], localImgPath=image)
+            for label, xmin, ymin, xmax, ymax in boxes:
+                writer.addBndBox(xmin, ymin, xmax, ymax, label, 0)
+            writer.save(os.path.join(self.source, name + '.xml'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def convert(self, *args):
+        err = io.StringIO()
+        with redirect_stderr(err):
+            code = main(list(args) + ['--jobs', '2'])
+        return code, err.getvalue()
+
+    def test_roundTrip(self):
+        yolo = os.path.join(self.tmpdir, 'yolo')
+        code, output = self.convert(self.source, '--to', 'yolo', '--out', yolo)
+        self.assertEqual(code, 0)
+        self.assertIn('2 converted', output)
+        self.assertEqual(readClasses(os.path.join(yolo, 'classes.txt')), ['bird', 'cat', 'dog'])
+        self.assertEqual(readClasses(os.path.join(yolo, 'sub', 'classes.txt')), ['bird', 'cat', 'dog'])
+        with open(os.path.join(yolo, 'a.txt')) as f:
+            self.assertEqual(f.read().split('\n')[0], '1 0.107422 0.214844 0.175781 0.351562')
+
+        # Nothing to do until a source changes
+        code, output = self.convert(self.source, '--to', 'yolo', '--out', yolo)
+        self.assertIn('0 converted, 2 up to date', output)
+        os.utime(os.path.join(self.source, 'a.xml'), (0, os.stat(os.path.join(yolo, 'a.txt')).st_mtime + 10))
+        code, output = self.convert(self.source, '--to', 'yolo', '--out', yolo)
+        self.assertIn('1 converted, 1 up to date', output)
+
+        voc = os.path.join(self.tmpdir, 'back')
+        code, output = self.convert(yolo, '--to', 'voc', '--out', voc, '--images', self.source)
+        self.assertEqual(code, 0)
+        for name, boxes in self.boxes.items():
+            reader = PascalVocReader(os.path.join(voc, name + '.xml'), strict=True)
+            self.assertEqual(tuple(reader.imgSize), (512, 512, 3))
+            shapes = reader.getShapes()
+            self.assertEqual([shape[0] for shape in shapes], [box[0] for box in boxes])
+            for shape, box in zip(shapes, boxes):
+                points = shape[1]
+                for got, expected in zip(points[0] + points[2], box[1:]):
+                    self.assertLessEqual(abs(got - expected), 1)
+
+    def test_classOrder(self):
+        yolo = os.path.join(self.tmpdir, 'yolo')
+        os.makedirs(yolo)
+        with open(os.path.join(yolo, 'classes.txt'), 'w') as f:
+            f.write('fish\n')
+        classes = os.path.join(self.tmpdir, 'classes.txt')
+        with open(classes, 'w') as f:
+            f.write('dog\nfish\n')
+        code, output = self.convert(self.source, '--to', 'yolo', '--out', yolo, '--classes', classes)
+        self.assertEqual(code, 0)
+        # Existing output classes first, then the given ones, then new ones
+        self.assertEqual(readClasses(os.path.join(yolo, 'classes.txt')), ['fish', 'dog', 'bird', 'cat'])
+        with open(os.path.join(yolo, 'a.txt')) as f:
+            self.assertEqual([line.split(' ')[0] for line in f.read().splitlines()], ['3', '1'])
+
+    def test_failures(self):
+        with open(os.path.join(self.source, 'broken.xml'), 'w') as f:
+            f.write('<annotation><object>')
+        writer = PascalVocWriter('voc', 'c.bmp', [512, 512, 3])
+        writer.addBndBox(10, 10, 600, 100, 'cat', 0)
+        writer.save(os.path.join(self.source, 'c.xml'))
+        code, output = self.convert(self.source, '--to', 'yolo')
+        self.assertEqual(code, 1)
+        self.assertIn('broken.xml', output)
+        self.assertIn('c.xml: box cat outside the 512x512 image', output)
+        self.assertIn('2 converted, 0 up to date, 2 failed', output)
+        self.assertTrue(os.path.isfile(os.path.join(self.source, 'a.txt')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from libs.core import Box, BoxError, boxProblem, convertPoints2BndBox, imageSize, validateBoxes, \
+    PascalVocReader, PascalVocWriter, addBoxes
+
+TEST_IMAGE = os.path.join(os.path.dirname(__file__), 'test.512.512.bmp')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestCore(unittest.TestCase):
+
+    def test_withoutQt(self):
+        code = ('import sys, libs.core, libs.convert; '
+                'print([m for m in sys.modules if m.startswith(("PyQt4", "PyQt5"))])')
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT)
+        self.assertEqual(output.strip(), b'[]')
+
+    def test_box(self):
+        box = Box.fromPoints('cat', [(0.5, 20.7), (100.2, 20.7), (100.2, 200.9), (0.5, 200.9)], 1)
+        self.assertEqual(box, Box('cat', 1, 20, 100, 200, True))
+        self.assertEqual(convertPoints2BndBox(box.points()), (1, 20, 100, 200))
+        self.assertEqual(Box.fromShape(('cat', box.points(), None, None, True)), box)
+
+    def test_validation(self):
+        imgSize = [300, 400, 3]
+        self.assertIsNone(boxProblem(Box('cat', 1, 1, 400, 300, False), imgSize))
+        self.assertIn('outside the 400x300 image', boxProblem(Box('cat', 1, 1, 401, 300, False), imgSize))
+        self.assertIn('empty', boxProblem(Box('cat', 10, 1, 10, 300, False), imgSize))
+        self.assertIn('label', boxProblem(Box('', 1, 1, 10, 10, False), imgSize))
+        self.assertRaises(BoxError, validateBoxes, [Box('cat', 1, 1, 10, 10, False),
+                                                    Box('dog', 1, -5, 10, 10, False)], imgSize)
+
+    def test_imageSize(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'a.bmp')
+            shutil.copy(TEST_IMAGE, path)
+            self.assertEqual(imageSize(path), (512, 512, 3))
+            other = os.path.join(tmpdir, 'a.tga')
+            with open(other, 'wb') as f:
+                f.write(b'\x00' * 32)
+            self.assertIsNone(imageSize(other))
+            self.assertEqual(imageSize(other, lambda p: (3, 2, 1)), (3, 2, 1))
+
+            xmlPath = os.path.join(tmpdir, 'a.xml')
+            writer = PascalVocWriter('tmp', 'a.bmp', [512, 512, 3], localImgPath=path)
+            addBoxes(writer, [Box('cat', 10, 20, 30, 40, True)])
+            writer.save(xmlPath)
+            reader = PascalVocReader(xmlPath, strict=True)
+            self.assertEqual([Box.fromShape(shape) for shape in reader.getShapes()],
+                             [Box('cat', 10, 20, 30, 40, True)])
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
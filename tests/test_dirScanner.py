@@ -0,0 +1,185 @@
+import gc
+import os
+import random
+import shutil
+import tempfile
+import time
+import unittest
+
+try:
+    from PyQt5.QtWidgets import QApplication
+except ImportError:
+    from PyQt4.QtGui import QApplication
+
+import libs.dirScanner
+from libs.dirScanner import DirScanner, ScanCache, iterImages, imageExtensions, pathKey, scanCachePath
+from libs.utils import natural_sort
+
+
+def walkImages(folder, extensions):
+    """The images of folder as listed before the scanner."""
+    images = []
+    for root, dirs, files in os.walk(folder):
+        for file in files:
+            if file.lower().endswith(extensions):
+                images.append(os.path.abspath(os.path.join(root, file)))
+    natural_sort(images, key=lambda x: x.lower())
+    return images
+
+
+class TestDirScanner(unittest.TestCase):
+
+    app = None
+
+    @classmethod
+    def setUpClass(cls):
+        if QApplication.instance() is None:
+            cls.app = QApplication([])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app = None
+        gc.collect()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        rng = random.Random(3)
+        names = ['a', 'B', 'img', 'img_', 'x.y', '10', '9']
+        for _ in range(300):
+            parts = [rng.choice(names) + str(rng.randint(0, 12)) for _ in range(rng.randint(0, 3))]
+            folder = os.path.join(self.tmpdir, *parts)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            name = rng.choice(names) + str(rng.randint(0, 120)) + rng.choice(['.jpg', '.PNG', '.txt'])
+            open(os.path.join(folder, name), 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_orderMatchesSortingAllPaths(self):
+        extensions = ('.jpg', '.png')
+        images = list(iterImages(self.tmpdir, extensions))
+        self.assertTrue(images)
+        self.assertEqual(images, walkImages(self.tmpdir, extensions))
+
+    def test_scanCache(self):
+        extensions = ('.jpg', '.png')
+        cacheDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cacheDir)
+        cachePath = os.path.join(cacheDir, 'scan.json')
+        cache = ScanCache(cachePath, extensions)
+        images = list(iterImages(self.tmpdir, extensions, cache))
+        self.assertEqual(images, walkImages(self.tmpdir, extensions))
+        cache.save()
+
+        listed = []
+        scanDirectory = libs.dirScanner.scanDirectory
+
+        def countingScan(folder, extensions):
+            listed.append(folder)
+            return scanDirectory(folder, extensions)
+        libs.dirScanner.scanDirectory = countingScan
+        try:
+            cache = ScanCache(cachePath, extensions)
+            self.assertEqual(list(iterImages(self.tmpdir, extensions, cache)), images)
+            self.assertEqual(listed, [])
+
+            # Only the changed directory is listed again
+            folder = os.path.dirname(images[len(images) // 2])
+            for name in ('img5.jpg', '0.png', 'zz.jpg', 'b77.jpg'):
+                open(os.path.join(folder, name), 'w').close()
+            os.remove(images[len(images) // 2])
+            self.assertEqual(list(iterImages(self.tmpdir, extensions, cache)),
+                             walkImages(self.tmpdir, extensions))
+            self.assertEqual(listed, [folder])
+        finally:
+            libs.dirScanner.scanDirectory = scanDirectory
+
+        # A different set of extensions starts over
+        cache = ScanCache(cachePath, ('.png',))
+        self.assertEqual(list(iterImages(self.tmpdir, ('.png',), cache)), walkImages(self.tmpdir, ('.png',)))
+
+    def test_failedListingIsNotCached(self):
+        cache = ScanCache(os.path.join(self.tmpdir, 'scan.json'), ('.jpg',))
+        notFolder = os.path.join(self.tmpdir, 'file.jpg')
+        open(notFolder, 'w').close()
+        with self.assertRaises(OSError):
+            cache.listing(notFolder, ('.jpg',))
+        errors = []
+        self.assertEqual(list(iterImages(notFolder, ('.jpg',), cache, errors.append)), [])
+        self.assertEqual([e.filename for e in errors], [notFolder])
+
+    @unittest.skipIf(hasattr(os, 'geteuid') and os.geteuid() == 0, 'root can list any directory')
+    def test_unlistableFolders(self):
+        extensions = ('.jpg', '.png')
+        cachePath = os.path.join(tempfile.mkdtemp(), 'scan.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(cachePath))
+        images = walkImages(self.tmpdir, extensions)
+        folder = os.path.dirname(images[len(images) // 2])
+        os.chmod(folder, 0)
+        try:
+            cache = ScanCache(cachePath, extensions)
+            errors = []
+            partial = list(iterImages(self.tmpdir, extensions, cache, errors.append))
+            self.assertEqual([e.filename for e in errors], [folder])
+            self.assertEqual(partial, [image for image in images
+                                       if not image.startswith(os.path.join(folder, ''))])
+            cache.save()
+
+            scanner = DirScanner(cacheDir=None)
+            done = []
+            failed = []
+            scanner.finished.connect(done.append)
+            scanner.failed.connect(lambda path, reason: failed.append(path))
+            generation = scanner.scan(self.tmpdir)
+            end = time.time() + 10
+            while generation not in done and time.time() < end:
+                QApplication.processEvents()
+                time.sleep(0.01)
+            self.assertIn(generation, done)
+            self.assertEqual(failed, [folder])
+        finally:
+            os.chmod(folder, 0o755)
+
+        # The folder that failed was not cached as empty
+        cache = ScanCache(cachePath, extensions)
+        self.assertEqual(list(iterImages(self.tmpdir, extensions, cache)), images)
+
+    def test_batches(self):
+        scanner = DirScanner(cacheDir=None)
+        batches = []
+        done = []
+        scanner.found.connect(lambda generation, paths, keys: batches.append((generation, paths, keys)))
+        scanner.finished.connect(done.append)
+        scanner.scan(os.path.join(self.tmpdir, 'missing'))
+        generation = scanner.scan(self.tmpdir)
+        end = time.time() + 10
+        while generation not in done and time.time() < end:
+            QApplication.processEvents()
+            time.sleep(0.01)
+        paths = [path for g, batch, keys in batches if g == generation for path in batch]
+        self.assertEqual(paths, list(iterImages(self.tmpdir, imageExtensions())))
+        keys = [key for g, batch, keys in batches if g == generation for key in keys]
+        self.assertEqual(keys, [pathKey(path) for path in paths])
+        self.assertEqual(keys, sorted(keys))
+
+    def test_cacheFailuresAreReported(self):
+        # The cache directory cannot be created under a file
+        blocker = os.path.join(self.tmpdir, 'blocker')
+        open(blocker, 'w').close()
+        scanner = DirScanner(cacheDir=os.path.join(blocker, 'cache'))
+        done = []
+        failed = []
+        scanner.finished.connect(done.append)
+        scanner.failed.connect(lambda path, reason: failed.append(path))
+        generation = scanner.scan(self.tmpdir)
+        end = time.time() + 10
+        while generation not in done and time.time() < end:
+            QApplication.processEvents()
+            time.sleep(0.01)
+        self.assertIn(generation, done)
+        self.assertEqual(failed, [scanCachePath(self.tmpdir, scanner.cacheDir)])
+
+
+if __name__ == '__main__':
+    unittest.main()
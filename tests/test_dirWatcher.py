@@ -0,0 +1,163 @@
+import gc
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from PyQt5.QtWidgets import QApplication
+except ImportError:
+    from PyQt4.QtGui import QApplication
+
+from libs import dirWatcher
+from libs.dirWatcher import DirWatcher
+
+
+class TestDirWatcher(unittest.TestCase):
+
+    app = None
+
+    @classmethod
+    def setUpClass(cls):
+        if QApplication.instance() is None:
+            cls.app = QApplication([])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app = None
+        gc.collect()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.sub = os.path.join(self.tmpdir, 'a', 'b')
+        os.makedirs(self.sub)
+        self.images = [self.touch(self.tmpdir, 'img1.jpg'), self.touch(self.sub, 'img2.jpg')]
+        self.watcher = DirWatcher(extensions=('.jpg',))
+        self.added = []
+        self.removed = []
+        self.watcher.added.connect(self.added.extend)
+        self.watcher.removed.connect(self.removed.extend)
+        self.watcher.watch(self.tmpdir, self.images)
+
+    def tearDown(self):
+        self.watcher.clear()
+        shutil.rmtree(self.tmpdir)
+
+    def touch(self, folder, name):
+        path = os.path.join(folder, name)
+        open(path, 'wb').close()
+        return path
+
+    def changed(self, *folders):
+        for folder in folders:
+            self.watcher._directoryChanged(folder)
+        self.watcher.flush()
+        QApplication.processEvents()
+
+    def test_changes(self):
+        new = self.touch(self.tmpdir, 'img0.jpg')
+        self.touch(self.tmpdir, 'notes.txt')
+        os.remove(self.images[1])
+        self.changed(self.tmpdir, self.sub)
+        self.assertEqual(self.added, [new])
+        self.assertEqual(self.removed, [self.images[1]])
+
+        # A new subdirectory, and one in between root and the images
+        os.makedirs(os.path.join(self.tmpdir, 'c', 'd'))
+        deep = self.touch(os.path.join(self.tmpdir, 'c', 'd'), 'x.jpg')
+        middle = self.touch(os.path.join(self.tmpdir, 'a'), 'y.jpg')
+        del self.added[:]
+        self.changed(self.tmpdir, os.path.join(self.tmpdir, 'a'))
+        self.assertEqual(sorted(self.added), sorted([deep, middle]))
+
+        # Removing a tree removes everything below it
+        del self.removed[:]
+        shutil.rmtree(os.path.join(self.tmpdir, 'c'))
+        self.changed(self.tmpdir)
+        self.assertEqual(self.removed, [deep])
+
+    def test_savesAreNotRescanned(self):
+        self.changed(self.tmpdir)
+        listed = []
+        scanDirectory = dirWatcher.scanDirectory
+
+        def countingScan(folder, extensions):
+            listed.append(folder)
+            return scanDirectory(folder, extensions)
+        dirWatcher.scanDirectory = countingScan
+        try:
+            self.watcher.writeAtomic(os.path.join(self.tmpdir, 'img1.xml'), b'<annotation/>')
+            self.changed(self.tmpdir)
+            self.assertEqual(listed, [])
+
+            new = self.touch(self.tmpdir, 'img0.jpg')
+            self.watcher.writeAtomic(os.path.join(self.tmpdir, 'img1.xml'), b'<annotation/>')
+            self.changed(self.tmpdir)
+            self.assertEqual(listed, [self.tmpdir])
+            self.assertEqual(self.added, [new])
+        finally:
+            dirWatcher.scanDirectory = scanDirectory
+
+    def test_failuresAreReported(self):
+        failed = []
+        self.watcher.failed.connect(lambda path, reason: failed.append(path))
+        scanDirectory = dirWatcher.scanDirectory
+
+        def failingScan(folder, extensions):
+            if folder == self.sub:
+                raise OSError('cannot list %s' % folder)
+            return scanDirectory(folder, extensions)
+        dirWatcher.scanDirectory = failingScan
+        try:
+            new = self.touch(self.tmpdir, 'img0.jpg')
+            later = self.touch(self.sub, 'img3.jpg')
+            self.changed(self.sub, self.tmpdir)
+            self.assertEqual(failed, [self.sub])
+            self.assertEqual(self.added, [new])
+        finally:
+            dirWatcher.scanDirectory = scanDirectory
+
+        # Listed again on the next change, though its mtime did not move
+        self.changed(self.sub)
+        self.assertEqual(self.added, [new, later])
+
+    @unittest.skipIf(hasattr(os, 'geteuid') and os.geteuid() == 0, 'root can list any directory')
+    def test_unlistableFolders(self):
+        failed = []
+        self.watcher.failed.connect(lambda path, reason: failed.append(path))
+        os.chmod(self.sub, 0)
+        try:
+            self.changed(self.sub)
+            # Its images are not taken for removed
+            self.assertEqual(failed, [self.sub])
+            self.assertEqual(self.removed, [])
+
+            # Nor those of a new subdirectory
+            locked = os.path.join(self.tmpdir, 'c', 'd')
+            os.makedirs(locked)
+            image = self.touch(locked, 'x.jpg')
+            os.chmod(locked, 0)
+            try:
+                self.changed(self.tmpdir)
+            finally:
+                os.chmod(locked, 0o755)
+            # The chmod above may have the locked self.sub listed again
+            self.assertEqual(set(failed), set([self.sub, locked]))
+        finally:
+            os.chmod(self.sub, 0o755)
+        later = self.touch(self.sub, 'img3.jpg')
+        self.changed(self.sub)
+        self.assertEqual(self.added, [later])
+        self.assertEqual(self.removed, [])
+
+    def test_cleared(self):
+        self.touch(self.tmpdir, 'img0.jpg')
+        self.watcher._directoryChanged(self.tmpdir)
+        self.watcher.clear()
+        self.watcher.flush()
+        QApplication.processEvents()
+        self.assertEqual(self.added, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
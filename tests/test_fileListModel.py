@@ -0,0 +1,79 @@
+import unittest
+
+try:
+    from PyQt5.QtTest import QAbstractItemModelTester
+except ImportError:
+    QAbstractItemModelTester = None
+
+from libs.fileListModel import FileListModel
+
+
+class TestFileListModel(unittest.TestCase):
+
+    def test_sharedList(self):
+        model = FileListModel()
+        if QAbstractItemModelTester is not None:
+            tester = QAbstractItemModelTester(model, QAbstractItemModelTester.FailureReportingMode.Fatal)
+        paths = model.paths
+        events = []
+        model.rowsInserted.connect(lambda parent, first, last: events.append(('+', first, last)))
+        model.rowsRemoved.connect(lambda parent, first, last: events.append(('-', first, last)))
+
+        model.append(['a', 'b'])
+        model.append([])
+        model.append(['c'])
+        self.assertEqual(events, [('+', 0, 1), ('+', 2, 2)])
+        self.assertEqual(model.data(model.index(2)), 'c')
+
+        self.assertTrue(model.removeRow(1))
+        self.assertFalse(model.removeRow(5))
+        self.assertEqual(paths, ['a', 'c'])
+        self.assertEqual(paths.index('c'), 1)
+        self.assertEqual(model.rowCount(), 2)
+
+        model.clear()
+        self.assertIs(model.paths, paths)
+        self.assertEqual(paths, [])
+
+    def test_sortedChanges(self):
+        model = FileListModel()
+        if QAbstractItemModelTester is not None:
+            tester = QAbstractItemModelTester(model, QAbstractItemModelTester.FailureReportingMode.Fatal)
+        model.append(['/d/img2.jpg', '/d/img10.jpg', '/d/sub/a.jpg'])
+        events = []
+        model.rowsInserted.connect(lambda parent, first, last: events.append(('+', first, last)))
+        model.rowsRemoved.connect(lambda parent, first, last: events.append(('-', first, last)))
+
+        model.insertSorted(['/d/img3.jpg', '/d/Img1.jpg', '/d/img11.jpg', '/d/img2.jpg', '/d/z.jpg'])
+        self.assertEqual(model.paths, ['/d/Img1.jpg', '/d/img2.jpg', '/d/img3.jpg', '/d/img10.jpg',
+                                       '/d/img11.jpg', '/d/sub/a.jpg', '/d/z.jpg'])
+        # One insertion per place, made from the end
+        self.assertEqual(events, [('+', 3, 3), ('+', 2, 2), ('+', 1, 1), ('+', 0, 0)])
+
+        del events[:]
+        model.removePaths(['/d/img2.jpg', '/d/img3.jpg', '/d/missing.jpg', '/d/z.jpg'])
+        self.assertEqual(events, [('-', 6, 6), ('-', 1, 2)])
+        self.assertEqual(model.paths, ['/d/Img1.jpg', '/d/img10.jpg', '/d/img11.jpg', '/d/sub/a.jpg'])
+        self.assertEqual(model.paths.index('/d/sub/a.jpg'), 3)
+
+    def test_mergedInsertion(self):
+        model = FileListModel()
+        model.append(['/d/img%d.jpg' % i for i in range(0, 400, 2)])
+        model.insertSorted(['/d/img%d.jpg' % i for i in range(1, 10, 2)])
+        resets = []
+        model.modelReset.connect(lambda: resets.append(True))
+        # Too many places for one insertion each
+        model.insertSorted(['/d/img%d.jpg' % i for i in range(11, 400, 2)])
+        self.assertEqual(resets, [True])
+        self.assertEqual(model.paths, ['/d/img%d.jpg' % i for i in range(400)])
+        self.assertEqual(model.paths.index('/d/img399.jpg'), 399)
+
+        model.removePaths(['/d/img%d.jpg' % i for i in range(100, 200)])
+        model.removeRow(0)
+        model.insertSorted(['/d/img150.jpg', '/d/img0.jpg'])
+        expected = ['/d/img%d.jpg' % i for i in list(range(100)) + [150] + list(range(200, 400))]
+        self.assertEqual(model.paths, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+
+try:
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtTest import QAbstractItemModelTester
+except ImportError:
+    from PyQt4.QtCore import Qt
+    QAbstractItemModelTester = None
+
+from libs.historyModel import HistoryModel, CURRENT_COLOR
+from libs.undoStack import UndoStack
+from tests.test_undoStack import Box, state
+
+
+class TestHistoryModel(unittest.TestCase):
+
+    def setUp(self):
+        self.shapes = [Box('a', 0)]
+        self.model = HistoryModel(UndoStack(state, state, limit=4))
+        if QAbstractItemModelTester is not None:
+            self.tester = QAbstractItemModelTester(
+                self.model, QAbstractItemModelTester.FailureReportingMode.Fatal)
+        self.model.reset('open', self.shapes)
+        self.events = []
+        self.model.rowsInserted.connect(lambda parent, first, last: self.events.append(('+', first, last)))
+        self.model.rowsRemoved.connect(lambda parent, first, last: self.events.append(('-', first, last)))
+        self.model.modelReset.connect(lambda: self.events.append('reset'))
+
+    def apply(self, edit):
+        for box, _, (label, x) in edit.changed:
+            box.label, box.x = label, x
+
+    def move(self, x):
+        self.shapes[0].x = x
+        self.model.record('move %d' % x, self.shapes)
+
+    def rows(self):
+        return [self.model.data(self.model.index(row)) for row in range(self.model.rowCount())]
+
+    def current(self):
+        return [row for row in range(self.model.rowCount())
+                if self.model.data(self.model.index(row), Qt.BackgroundRole) == CURRENT_COLOR]
+
+    def test_onlyAffectedRowsChange(self):
+        self.move(1)
+        self.move(2)
+        self.assertEqual(self.events, [('+', 1, 1), ('+', 2, 2)])
+        self.assertEqual(self.current(), [2])
+
+        self.model.undo(self.apply)
+        self.assertEqual(self.current(), [1])
+        self.assertEqual(self.rows(), ['open', 'move 1', 'move 2'])
+
+        # Recording drops the redo rows
+        del self.events[:]
+        self.move(3)
+        self.assertEqual(self.events, [('-', 2, 2), ('+', 2, 2)])
+        self.assertEqual(self.rows(), ['open', 'move 1', 'move 3'])
+
+        # Past the limit the oldest operation goes
+        self.move(4)
+        self.move(5)
+        del self.events[:]
+        self.move(6)
+        self.assertEqual(self.events, [('-', 1, 1), ('+', 4, 4)])
+        self.assertEqual(self.rows(), ['open', 'move 3', 'move 4', 'move 5', 'move 6'])
+        self.assertEqual(self.current(), [4])
+
+    def test_jump(self):
+        for x in range(1, 4):
+            self.move(x)
+        self.model.jump(1, self.apply)
+        self.assertEqual(self.shapes[0].x, 1)
+        self.assertEqual(self.current(), [1])
+        self.model.jump(3, self.apply)
+        self.assertEqual(self.shapes[0].x, 3)
+        self.model.jump(0, self.apply)
+        self.assertEqual(self.shapes[0].x, 0)
+        self.assertEqual(self.rows(), ['open', 'move 1', 'move 2', 'move 3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from PyQt5.QtGui import QImage
+except ImportError:
+    from PyQt4.QtGui import QImage
+
+from libs.imageCache import ImageCache, imageBytes
+
+
+class TestImageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.paths = []
+        for i in range(3):
+            image = QImage(64, 64, QImage.Format_RGB32)
+            image.fill(0)
+            path = os.path.join(self.tmpdir, 'img%d.png' % i)
+            image.save(path)
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_hitMissAndEviction(self):
+        _, image = ImageCache().loadImage(self.paths[0])
+        entryBytes = imageBytes(image) + os.path.getsize(self.paths[0])
+        cache = ImageCache(budget=2 * entryBytes + 10)
+
+        cache.loadImage(self.paths[0])
+        cache.loadImage(self.paths[1])
+        self.assertEqual(cache.misses, 2)
+        cache.loadImage(self.paths[0])
+        self.assertEqual(cache.hits, 1)
+
+        # paths[1] is the least recently used entry
+        cache.loadImage(self.paths[2])
+        self.assertEqual(cache.evictions, 1)
+        self.assertTrue(cache.contains(self.paths[0]))
+        self.assertFalse(cache.contains(self.paths[1]))
+
+    def test_changedFileIsReloaded(self):
+        cache = ImageCache()
+        cache.loadImage(self.paths[0])
+        QImage(32, 16, QImage.Format_RGB32).save(self.paths[0])
+        os.utime(self.paths[0], ns=(0, 0))
+        _, image = cache.loadImage(self.paths[0])
+        self.assertEqual(image.width(), 32)
+        self.assertEqual(cache.hits, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
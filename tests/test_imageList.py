@@ -0,0 +1,83 @@
+import random
+import unittest
+
+import libs.imageList
+from libs.imageList import ImageList
+
+
+class TestImageList(unittest.TestCase):
+
+    def check(self, images, expected):
+        self.assertEqual(images, expected)
+        self.assertEqual(len(images), len(expected))
+        for position, path in enumerate(expected):
+            self.assertEqual(images.index(path), position)
+            self.assertIn(path, images)
+
+    def test_matchesList(self):
+        self.randomEdits(random.Random(1))
+
+    def test_smallBlocks(self):
+        blockSize = libs.imageList.BLOCK_SIZE
+        libs.imageList.BLOCK_SIZE = 4
+        try:
+            for seed in range(20):
+                self.randomEdits(random.Random(seed))
+        finally:
+            libs.imageList.BLOCK_SIZE = blockSize
+
+    def randomEdits(self, rng):
+        expected = ['img%d.jpg' % i for i in range(50)]
+        images = ImageList(expected)
+        self.check(images, expected)
+        counter = len(expected)
+        for _ in range(300):
+            action = rng.random()
+            if action < 0.3 and expected:
+                position = rng.randrange(-len(expected), len(expected))
+                del expected[position]
+                del images[position]
+            elif action < 0.6:
+                position = rng.randint(0, len(expected))
+                path = 'new%d.jpg' % counter
+                counter += 1
+                expected.insert(position, path)
+                images.insert(position, path)
+            elif action < 0.7:
+                paths = ['more%d.jpg' % (counter + i) for i in range(rng.randint(0, 3))]
+                counter += len(paths)
+                if rng.random() < 0.5:
+                    expected.extend(paths)
+                    images.extend(paths)
+                else:
+                    position = rng.randint(0, len(expected))
+                    expected[position:position] = paths
+                    images.insertAll(position, paths)
+            elif action < 0.8:
+                start = rng.randint(0, len(expected))
+                stop = start + rng.randint(0, 3)
+                del expected[start:stop]
+                del images[start:stop]
+            elif expected:
+                path = rng.choice(expected)
+                self.assertEqual(images.index(path), expected.index(path))
+                position = rng.randrange(-len(expected), len(expected))
+                self.assertEqual(images[position], expected[position])
+                start = rng.randint(-3, len(expected))
+                stop = rng.randint(-3, len(expected) + 3)
+                self.assertEqual(images[start:stop], expected[start:stop])
+            if rng.random() < 0.2:
+                self.check(images, expected)
+        self.check(images, expected)
+
+        path = expected[0]
+        images.remove(path)
+        self.assertNotIn(path, images)
+        self.assertRaises(ValueError, images.index, path)
+        self.assertRaises(IndexError, images.__delitem__, len(images))
+        images.clear()
+        self.assertFalse(images)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from PyQt5.QtGui import QImage, qRgb
+except ImportError:
+    from PyQt4.QtGui import QImage, qRgb
+
+from libs.imageSize import imageSize, readImageHeader
+from libs.labelFile import LabelFile
+
+
+class TestImageSize(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def save(self, image, name):
+        path = os.path.join(self.tmpdir, name)
+        self.assertTrue(image.save(path))
+        return path
+
+    def decodedShape(self, path):
+        image = QImage()
+        image.load(path)
+        return [image.height(), image.width(), 1 if image.isGrayscale() else 3]
+
+    def test_headerMatchesDecodedImage(self):
+        color = QImage(37, 21, QImage.Format_RGB32)
+        color.fill(qRgb(200, 10, 10))
+        gray = QImage(37, 21, QImage.Format_Indexed8)
+        gray.setColorTable([qRgb(i, i, i) for i in range(256)])
+        gray.fill(7)
+        paths = [self.save(image, name + ext)
+                 for image, name in ((color, 'color'), (gray, 'gray'))
+                 for ext in ('.jpg', '.png', '.bmp')]
+        for path in paths:
+            self.assertIsNotNone(readImageHeader(path), path)
+            self.assertEqual(LabelFile.imageShape(path), self.decodedShape(path), path)
+
+    def test_changedFileIsReprobed(self):
+        path = self.save(QImage(10, 20, QImage.Format_RGB32), 'a.png')
+        self.assertEqual(imageSize(path), (10, 20, 3))
+        self.save(QImage(30, 40, QImage.Format_RGB32), 'a.png')
+        os.utime(path, ns=(0, 0))
+        self.assertEqual(imageSize(path), (30, 40, 3))
+
+    def test_unreadableFile(self):
+        path = os.path.join(self.tmpdir, 'broken.jpg')
+        with open(path, 'wb') as f:
+            f.write(b'\xff\xd8\xff')
+        self.assertIsNone(imageSize(path))
+        self.assertIsNone(imageSize(os.path.join(self.tmpdir, 'missing.jpg')))
+
+
+if __name__ == '__main__':
+    unittest.main()
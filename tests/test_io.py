@@ -1,6 +1,48 @@
 import os
+import random
+import shutil
 import sys
+import tempfile
 import unittest
+from xml.etree import ElementTree
+from xml.etree.ElementTree import Element, SubElement
+
+from lxml import etree
+
+
+def legacyVocBytes(writer):
+    """What PascalVocWriter.save used to write: an ElementTree serialized,
+    re-parsed and pretty printed by lxml, with double spaces made tabs."""
+    top = Element('annotation')
+    if writer.verified:
+        top.set('verified', 'yes')
+    SubElement(top, 'folder').text = writer.foldername
+    SubElement(top, 'filename').text = writer.filename
+    if writer.localImgPath is not None:
+        SubElement(top, 'path').text = writer.localImgPath
+    SubElement(SubElement(top, 'source'), 'database').text = writer.databaseSrc
+    size = SubElement(top, 'size')
+    SubElement(size, 'width').text = str(writer.imgSize[1])
+    SubElement(size, 'height').text = str(writer.imgSize[0])
+    SubElement(size, 'depth').text = str(writer.imgSize[2]) if len(writer.imgSize) == 3 else '1'
+    SubElement(top, 'segmented').text = '0'
+    for box in writer.boxlist:
+        item = SubElement(top, 'object')
+        SubElement(item, 'name').text = box['name']
+        SubElement(item, 'pose').text = 'Unspecified'
+        if int(float(box['ymax'])) == int(float(writer.imgSize[0])) or int(float(box['ymin'])) == 1:
+            truncated = '1'
+        elif int(float(box['xmax'])) == int(float(writer.imgSize[1])) or int(float(box['xmin'])) == 1:
+            truncated = '1'
+        else:
+            truncated = '0'
+        SubElement(item, 'truncated').text = truncated
+        SubElement(item, 'difficult').text = str(bool(box['difficult']) & 1)
+        bndbox = SubElement(item, 'bndbox')
+        for key in ('xmin', 'ymin', 'xmax', 'ymax'):
+            SubElement(bndbox, key).text = str(box[key])
+    root = etree.fromstring(ElementTree.tostring(top, 'utf8'))
+    return etree.tostring(root, pretty_print=True, encoding='utf-8').replace(b'  ', b'\t')
 
 class TestPascalVocRW(unittest.TestCase):
 
@@ -28,5 +70,79 @@ class TestPascalVocRW(unittest.TestCase):
         self.assertEqual(face[0], 'face')
         self.assertEqual(face[1], [(113, 40), (450, 40), (450, 403), (113, 403)])
 
+    def test_writerOutputIsUnchanged(self):
+        from libs.pascal_voc_io import PascalVocWriter
+        rng = random.Random(3)
+        pieces = ['a', 'person', ' ', '  ', '   ', '&', '<b>', '"q"', "'", '\t', '\n', '\r\n', '\uc0ac\ub78c', '\U0001f600']
+
+        def text():
+            return ''.join(rng.choice(pieces) for _ in range(rng.randint(0, 4)))
+
+        for i in range(200):
+            imgSize = (rng.randint(1, 999), rng.randint(1, 999)) + ((3,) if i % 2 else ())
+            writer = PascalVocWriter(text(), text() or 'x', imgSize,
+                                     localImgPath=text() if i % 3 else None)
+            writer.verified = bool(i % 4)
+            for _ in range(rng.randint(0, 3)):
+                writer.addBndBox(rng.randint(0, 9), 1, imgSize[1], rng.randint(2, 99), text(), rng.randint(0, 1))
+            root = writer.genXML()
+            writer.appendObjects(root)
+            self.assertEqual(writer.prettify(root), legacyVocBytes(writer), repr(writer.boxlist))
+
+
+class TestPascalVocReader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, text, name='a.xml'):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def test_onePassReadsEverything(self):
+        from libs.pascal_voc_io import PascalVocReader
+        objects = ''.join('<object><name>n%d</name><difficult>%d</difficult><bndbox>'
+                          '<xmin>%d</xmin><ymin>1</ymin><xmax>%d.6</xmax><ymax>9</ymax>'
+                          '</bndbox></object>' % (i, i % 2, i, i + 5) for i in range(1000))
+        path = self.write('<annotation verified="yes"><folder>f</folder><filename>a.jpg</filename>'
+                          '<size><width>640</width><height>480</height><depth>3</depth></size>'
+                          + objects + '</annotation>')
+        reader = PascalVocReader(path, strict=True)
+        self.assertTrue(reader.verified)
+        self.assertEqual(reader.filename, 'a.jpg')
+        self.assertEqual(reader.imgSize, (480, 640, 3))
+        self.assertEqual(len(reader.shapes), 1000)
+        self.assertEqual(reader.shapes[7], ('n7', [(7, 1), (12, 1), (12, 9), (7, 9)], None, None, True))
+
+    def test_structuredErrors(self):
+        from libs.pascal_voc_io import PascalVocReader, PascalVocParseError
+        good = '<object><name>a</name><bndbox><xmin>1</xmin><ymin>1</ymin><xmax>2</xmax><ymax>2</ymax></bndbox></object>'
+        cases = [
+            ('<annotation>\n' + good + '\n<object>\n</annotation>', 4),
+            ('<annotation>\n' + good + '\n<object><name>b</name>\n<bndbox><xmin>x</xmin></bndbox></object></annotation>', 3),
+            ('<annotation>\n' + good + '\n<object><name>b</name></object></annotation>', 3),
+        ]
+        for text, line in cases:
+            path = self.write(text)
+            with self.assertRaises(PascalVocParseError) as caught:
+                PascalVocReader(path, strict=True)
+            self.assertEqual(caught.exception.line, line, text)
+            self.assertEqual(caught.exception.path, path)
+
+            # Not strict: what was read before the error is kept
+            reader = PascalVocReader(path)
+            self.assertEqual(reader.error.line, line)
+            self.assertEqual([shape[0] for shape in reader.shapes], ['a'])
+
+        reader = PascalVocReader(os.path.join(self.tmpdir, 'missing.xml'))
+        self.assertIsNone(reader.error.line)
+        self.assertEqual(reader.shapes, [])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,156 @@
+import gc
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+try:
+    from PyQt5.QtGui import QImage
+    from PyQt5.QtWidgets import QApplication
+except ImportError:
+    from PyQt4.QtGui import QImage, QApplication
+
+from libs.imageCache import ImageCache
+from libs.pascal_voc_io import PascalVocWriter
+from libs.prefetcher import Prefetcher
+
+
+class TestPrefetcher(unittest.TestCase):
+
+    app = None
+
+    @classmethod
+    def setUpClass(cls):
+        if QApplication.instance() is None:
+            cls.app = QApplication([])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app = None
+        gc.collect()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.images = []
+        for i in range(6):
+            path = os.path.join(self.tmpdir, 'img%d.png' % i)
+            image = QImage(8, 8, QImage.Format_RGB32)
+            image.fill(0)
+            image.save(path)
+            self.images.append(path)
+        self.cache = ImageCache()
+        self.prefetcher = Prefetcher(self.cache, self.annotationPaths, nextDepth=2, prevDepth=1)
+        self.loaded = []
+        self.prefetched = []
+        self.failed = []
+        self.decoded = {}
+        self.prefetcher.loaded.connect(self.announced)
+        self.prefetcher.prefetched.connect(self.prefetched.append)
+        self.prefetcher.failed.connect(lambda path, reason: self.failed.append(path))
+
+        # Loads are recorded and held back until released
+        self.loads = []
+        self.release = threading.Event()
+        load = self.prefetcher.load
+
+        def heldLoad(path):
+            self.loads.append(path)
+            self.release.wait()
+            return load(path)
+        self.prefetcher.load = heldLoad
+
+    def tearDown(self):
+        self.release.set()
+        self.prefetcher.cancel()
+        shutil.rmtree(self.tmpdir)
+
+    def announced(self, path, decoded):
+        self.loaded.append(path)
+        self.decoded[path] = decoded
+
+    def annotationPaths(self, path):
+        base = os.path.splitext(path)[0]
+        return base + '.xml', base + '.txt'
+
+    def waitFor(self, condition):
+        # The signals reach the UI thread through its event loop
+        end = time.time() + 10
+        while not condition() and time.time() < end:
+            QApplication.processEvents()
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def settle(self):
+        """Wait until everything queued before is done."""
+        path = self.images[-1]
+        self.prefetcher.request(path)
+        self.release.set()
+        self.waitFor(lambda: self.loaded and self.loaded[-1] == path)
+
+    def test_requestFillsCache(self):
+        writer = PascalVocWriter('d', 'img0.png', (8, 8, 3))
+        writer.addBndBox(1, 1, 5, 5, 'cat', 0)
+        writer.save(self.annotationPaths(self.images[0])[0])
+        self.release.set()
+        self.prefetcher.request(self.images[0])
+        self.waitFor(lambda: self.loaded == [self.images[0]])
+        self.assertTrue(self.cache.contains(self.images[0]))
+        hits = self.cache.stats()['hits']
+        self.assertEqual(len(self.cache.pascalVocReader(self.annotationPaths(self.images[0])[0]).shapes), 1)
+        self.assertEqual(self.cache.stats()['hits'], hits + 1)
+
+    def test_priorityOrdering(self):
+        self.prefetcher.request(self.images[0])
+        self.waitFor(lambda: self.loads == [self.images[0]])
+        # Queued while the worker is busy: nearest first, ahead before behind
+        self.prefetcher.schedule(self.images, 2)
+        self.release.set()
+        expected = [self.images[3], self.images[1], self.images[4]]
+        self.waitFor(lambda: len(self.prefetched) == 3)
+        self.assertEqual(self.loads[1:], expected)
+        self.assertEqual(self.prefetched, expected)
+        for path in expected:
+            self.assertTrue(self.cache.contains(path))
+        self.assertFalse(self.cache.contains(self.images[5]))
+
+    def test_staleRequestsAreDropped(self):
+        self.prefetcher.request(self.images[0])
+        self.waitFor(lambda: self.loads == [self.images[0]])
+        self.prefetcher.schedule(self.images, 0)
+        self.prefetcher.request(self.images[1])
+        # Superseded before the worker got to them
+        self.prefetcher.request(self.images[2])
+        self.release.set()
+        self.waitFor(lambda: self.loaded == [self.images[0], self.images[2]])
+        self.settle()
+        self.assertEqual(self.loads, [self.images[0], self.images[2], self.images[-1]])
+        self.assertEqual(self.prefetched, [])
+
+    def test_failuresAreReported(self):
+        missing = os.path.join(self.tmpdir, 'missing.png')
+        self.release.set()
+        self.prefetcher.schedule([self.images[0], missing], 0)
+        self.waitFor(lambda: self.failed == [missing])
+        self.settle()
+        self.assertEqual(self.prefetched, [])
+
+        # A failed request is still announced
+        self.prefetcher.request(missing)
+        self.waitFor(lambda: self.loaded[-1] == missing)
+        self.assertEqual(self.failed, [missing, missing])
+        self.assertIsNone(self.decoded[missing])
+
+    def test_requestPassesImagesTooLargeToCache(self):
+        self.cache.setBudget(1)
+        self.release.set()
+        self.prefetcher.request(self.images[0])
+        self.waitFor(lambda: self.loaded == [self.images[0]])
+        self.assertFalse(self.cache.contains(self.images[0]))
+        imageData, image = self.decoded[self.images[0]]
+        self.assertEqual((image.width(), image.height()), (8, 8))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,40 @@
-
+import os
+import shutil
+import tempfile
+import threading
+import time
 from unittest import TestCase
 
+try:
+    from PyQt5.QtGui import QImage
+except ImportError:
+    from PyQt4.QtGui import QImage
+
 from labelImg import get_main_app
+from libs.pascal_voc_io import PascalVocWriter
+from libs.imageCache import fileStamp
+from libs.undoJournal import MAGIC, BASE, RECORD, SAVED, encodeFrame, encodeSaved, journalPath
+
+_window = None
+
+
+def sharedWindow():
+    """(app, window) shared by the tests below.
+
+    One window for all of them, a second QApplication would inherit its
+    worker threads.
+    """
+    global _window
+    if _window is None:
+        _window = get_main_app()
+    return _window
+
+
+def tearDownModule():
+    if _window is not None:
+        app, win = _window
+        win.close()
+        app.quit()
 
 
 class TestMainWindow(TestCase):
@@ -18,3 +51,199 @@ class TestMainWindow(TestCase):
 
     def test_noop(self):
         pass
+
+
+class TestAsyncLoad(TestCase):
+
+    app = None
+    win = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app, cls.win = sharedWindow()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.images = []
+        for i in range(2):
+            path = os.path.join(self.tmpdir, 'img%d.png' % i)
+            image = QImage(40, 30, QImage.Format_RGB32)
+            image.fill(0)
+            image.save(path)
+            self.images.append(path)
+        self.errors = []
+        self.win.errorMessage = lambda title, message: self.errors.append(title)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def waitForLoad(self):
+        end = time.time() + 10
+        while self.win.pendingLoad is not None and time.time() < end:
+            self.app.processEvents()
+            time.sleep(0.01)
+        self.assertIsNone(self.win.pendingLoad)
+
+    def test_staleResultIsDiscarded(self):
+        self.win.loadFileAsync(self.images[0])
+        self.win.loadFileAsync(self.images[1])
+        self.assertFalse(self.win.canvas.isEnabled())
+        # The superseded image arrives first
+        self.win.asyncLoaded(self.images[0])
+        self.assertNotEqual(self.win.filePath, self.images[0])
+        self.waitForLoad()
+        self.assertEqual(self.win.filePath, self.images[1])
+        self.assertTrue(self.win.canvas.isEnabled())
+
+    def test_canvasEnabledAfterFailedLoad(self):
+        broken = os.path.join(self.tmpdir, 'broken.png')
+        with open(broken, 'wb') as f:
+            f.write(b'not an image')
+        self.win.loadFileAsync(broken)
+        self.assertFalse(self.win.canvas.isEnabled())
+        self.waitForLoad()
+        self.assertEqual(len(self.errors), 1)
+        self.assertTrue(self.win.canvas.isEnabled())
+
+    def test_imageTooLargeToCacheIsDecodedOnce(self):
+        threads = []
+        loadImage = self.win.imageCache.loadImage
+
+        def recordingLoad(path):
+            threads.append(threading.current_thread().name)
+            return loadImage(path)
+        budget = self.win.imageCache.budget
+        self.win.imageCache.setBudget(1)
+        self.win.imageCache.loadImage = recordingLoad
+        try:
+            self.win.loadFileAsync(self.images[0])
+            self.waitForLoad()
+        finally:
+            del self.win.imageCache.loadImage
+            self.win.imageCache.setBudget(budget)
+        self.assertEqual(self.win.filePath, self.images[0])
+        self.assertEqual(set(threads), set(['Prefetcher']))
+
+    def test_navigationAfterRemoval(self):
+        for i in range(2, 5):
+            path = os.path.join(self.tmpdir, 'img%d.png' % i)
+            image = QImage(40, 30, QImage.Format_RGB32)
+            image.fill(0)
+            image.save(path)
+            self.images.append(path)
+        self.win.autoSaving.setChecked(False)
+        self.win.xmlautocopyMode.setChecked(False)
+        self.win.useAutoInputCheckbox.setChecked(False)
+        # Nothing is read ahead, so the last step finds its image still loading
+        self.addCleanup(self.win.prefetcher.setDepth, self.win.prefetcher.nextDepth,
+                        self.win.prefetcher.prevDepth)
+        self.win.prefetcher.setDepth(0, 0)
+        self.win.fileListModel.clear()
+        self.win.fileListModel.append(self.images)
+        self.addCleanup(self.win.fileListModel.clear)
+        self.win.loadFileAsync(self.images[1])
+        self.waitForLoad()
+
+        # The image on screen is deleted from outside
+        os.remove(self.images[1])
+        self.win.imagesRemoved([self.images[1]])
+        self.assertEqual(self.win.filePath, self.images[1])
+        self.win.openNextImg()
+        self.waitForLoad()
+        self.assertEqual(self.win.filePath, self.images[2])
+
+        os.remove(self.images[2])
+        self.win.imagesRemoved([self.images[2]])
+        self.win.openPrevImg()
+        self.waitForLoad()
+        self.assertEqual(self.win.filePath, self.images[0])
+
+        # So is the one still loading: the next one left is loaded instead
+        self.win.loadFileAsync(self.images[3])
+        self.assertIsNotNone(self.win.pendingLoad)
+        os.remove(self.images[3])
+        self.win.imagesRemoved([self.images[3]])
+        self.waitForLoad()
+        self.assertEqual(self.win.filePath, self.images[4])
+        self.assertTrue(self.win.canvas.isEnabled())
+        self.assertEqual(self.errors, [])
+
+
+class TestJournalRestore(TestCase):
+
+    app = None
+    win = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app, cls.win = sharedWindow()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.image = os.path.join(self.tmpdir, 'img.png')
+        image = QImage(40, 30, QImage.Format_RGB32)
+        image.fill(0)
+        image.save(self.image)
+        self.xmlPath = os.path.join(self.tmpdir, 'img.xml')
+        writer = PascalVocWriter(self.tmpdir, 'img.png', (30, 40, 3), localImgPath=self.image)
+        writer.addBndBox(1, 1, 10, 10, 'cat', 0)
+        writer.save(self.xmlPath)
+        self.journal = journalPath(self.xmlPath)
+        self.asked = []
+        self.win.recoverJournalDialog = lambda: self.asked.append(True)
+        self.win.defaultSaveDir = None
+        self.win.usingYoloFormat = False
+        self.win.usingPascalVocFormat = True
+
+    def tearDown(self):
+        self.win.closeJournal()
+        self.win.journalWriter.flush()
+        shutil.rmtree(self.tmpdir)
+
+    def writeJournal(self, *frames):
+        cat = ['cat', [[1, 1], [10, 1], [10, 10], [1, 10]], False, True]
+        dog = ['dog', [[2, 2], [20, 2], [20, 20], [2, 20]], False, True]
+        data = [encodeFrame(BASE, {'root': 'open', 'shapes': [[0, cat]]})]
+        for frame in frames:
+            if frame == RECORD:
+                data.append(encodeFrame(RECORD, ['add', [], [[1, 1, dog]], []]))
+            else:
+                data.append(frame)
+        os.makedirs(os.path.dirname(self.journal))
+        with open(self.journal, 'wb') as f:
+            f.write(MAGIC + b''.join(data))
+
+    def load(self):
+        self.assertTrue(self.win.loadFile(self.image))
+        self.win.journalWriter.flush()
+
+    def labels(self):
+        return [shape.label for shape in self.win.canvas.shapes]
+
+    def test_savedJournalIsRestored(self):
+        self.writeJournal(RECORD, encodeSaved(fileStamp(self.xmlPath)))
+        self.load()
+        self.assertEqual(self.asked, [])
+        self.assertEqual(self.labels(), ['cat', 'dog'])
+        self.assertFalse(self.win.dirty)
+
+    def test_fileRewrittenSinceSaveIsNotOffered(self):
+        # Saved, then the file was replaced, e.g. by auto copy
+        self.writeJournal(RECORD, encodeSaved(('0', '0')))
+        self.load()
+        self.assertEqual(self.asked, [])
+        self.assertEqual(self.labels(), ['cat'])
+        self.assertFalse(os.path.exists(self.journal))
+
+    def test_unsavedChangesAreOffered(self):
+        self.writeJournal(RECORD, encodeSaved(fileStamp(self.xmlPath)), RECORD)
+        self.load()
+        self.assertEqual(self.asked, [True])
+
+        # A save that failed did not save anything
+        self.win.closeJournal()
+        self.win.journalWriter.flush()
+        shutil.rmtree(os.path.dirname(self.journal))
+        self.writeJournal(RECORD, encodeSaved(None))
+        self.load()
+        self.assertEqual(self.asked, [True, True])
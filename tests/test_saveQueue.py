@@ -0,0 +1,133 @@
+import gc
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+try:
+    from PyQt5.QtWidgets import QApplication
+except ImportError:
+    from PyQt4.QtGui import QApplication
+
+from libs.saveQueue import SaveQueue, writeAtomic
+
+
+class TestSaveQueue(unittest.TestCase):
+
+    app = None
+
+    @classmethod
+    def setUpClass(cls):
+        if QApplication.instance() is None:
+            cls.app = QApplication([])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app = None
+        gc.collect()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.queue = SaveQueue()
+        self.saved = []
+        self.failed = []
+        self.queue.saved.connect(self.saved.append)
+        self.queue.failed.connect(lambda path, reason: self.failed.append(path))
+
+    def tearDown(self):
+        self.queue.flush()
+        shutil.rmtree(self.tmpdir)
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_repeatedSavesAreCoalesced(self):
+        a = os.path.join(self.tmpdir, 'a.xml')
+        b = os.path.join(self.tmpdir, 'sub', 'b.xml')
+        # Hold the worker back until everything is queued
+        with self.queue._cond:
+            for i in range(5):
+                self.queue.put(a, b'a%d' % i)
+            self.queue.put(b, b'b')
+        self.assertTrue(self.queue.wait(a))
+        self.queue.flush()
+        # The signals reach the UI thread through its event loop
+        QApplication.processEvents()
+        self.assertEqual(self.read(a), b'a4')
+        self.assertEqual(self.read(b), b'b')
+        self.assertEqual(self.saved, [a, b])
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['a.xml', 'sub'])
+
+    def test_failureIsReported(self):
+        blocker = os.path.join(self.tmpdir, 'file')
+        writeAtomic(blocker, b'')
+        path = os.path.join(blocker, 'a.xml')
+        self.queue.put(path, b'a')
+        self.assertFalse(self.queue.wait(path))
+        QApplication.processEvents()
+        self.assertEqual(self.failed, [path])
+
+        # The next write of the file succeeds again
+        path = os.path.join(self.tmpdir, 'a.xml')
+        self.queue.put(path, b'a')
+        self.assertTrue(self.queue.wait(path))
+        self.assertEqual(self.read(path), b'a')
+
+    def test_unchangedDataIsNotWritten(self):
+        path = os.path.join(self.tmpdir, 'a.xml')
+        with self.queue._cond:
+            self.assertTrue(self.queue.put(path, b'a'))
+            self.assertFalse(self.queue.put(path, b'a'))
+        self.queue.flush()
+        stamp = os.stat(path).st_mtime_ns
+        # Compared with the file by the worker, not by put()
+        self.assertTrue(self.queue.put(path, b'a'))
+        self.queue.flush()
+        QApplication.processEvents()
+        self.assertEqual(self.saved, [path])
+        self.assertEqual(os.stat(path).st_mtime_ns, stamp)
+
+        # Changed on disk by someone else: the file is read again
+        with open(path, 'wb') as f:
+            f.write(b'other')
+        self.queue.put(path, b'a')
+        self.queue.flush()
+        self.assertEqual(self.read(path), b'a')
+
+        other = os.path.join(self.tmpdir, 'b.xml')
+        writeAtomic(other, b'b')
+        with self.queue._cond:
+            self.queue.put(other, b'c')
+            self.queue.put(other, b'b')
+        self.queue.flush()
+        QApplication.processEvents()
+        self.assertEqual(self.read(other), b'b')
+        self.assertEqual(self.saved, [path, path])
+
+    def test_putDoesNotReadFiles(self):
+        path = os.path.join(self.tmpdir, 'a.xml')
+        writeAtomic(path, b'a')
+        threads = []
+        fileDigest = self.queue._fileDigest
+
+        def recordingDigest(path):
+            threads.append(threading.current_thread())
+            return fileDigest(path)
+        self.queue._fileDigest = recordingDigest
+        self.queue.put(path, b'a')
+        self.queue.flush()
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_writeAtomicReplaces(self):
+        path = os.path.join(self.tmpdir, 'a.xml')
+        writeAtomic(path, b'old')
+        writeAtomic(path, b'new')
+        self.assertEqual(self.read(path), b'new')
+        self.assertEqual(os.listdir(self.tmpdir), ['a.xml'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+try:
+    from PyQt5.QtCore import QPointF
+except ImportError:
+    from PyQt4.QtCore import QPointF
+
+from libs.shape import Shape
+
+
+def makeBox(x, y, w, h):
+    shape = Shape(label='box')
+    for px, py in ((x, y), (x + w, y), (x + w, y + h), (x, y + h)):
+        shape.addPoint(QPointF(px, py))
+    shape.close()
+    return shape
+
+
+class TestShapeGeometry(unittest.TestCase):
+
+    def test_cacheFollowsMutations(self):
+        shape = makeBox(0, 0, 10, 10)
+        self.assertEqual(shape.extents(), (0, 0, 10, 10))
+        self.assertTrue(shape.containsPoint(QPointF(5, 5)))
+
+        shape.moveBy(QPointF(100, 0))
+        self.assertEqual(shape.extents(), (100, 0, 110, 10))
+        self.assertFalse(shape.containsPoint(QPointF(5, 5)))
+
+        shape.moveVertexBy(2, QPointF(5, 5))
+        self.assertEqual(shape.boundingRect().bottomRight(), QPointF(115, 15))
+
+        shape[0] = QPointF(50, 0)
+        self.assertEqual(shape.extents()[0], 50)
+
+        shape.points = [QPointF(1, 1), QPointF(2, 1), QPointF(2, 2), QPointF(1, 2)]
+        self.assertEqual(shape.extents(), (1, 1, 2, 2))
+        shape.popPoint()
+        shape.popPoint()
+        self.assertEqual(shape.extents(), (1, 1, 2, 1))
+
+    def test_copyHasOwnCache(self):
+        shape = makeBox(0, 0, 10, 10)
+        shape.boundingRect()
+        copy = shape.copy()
+        copy.moveBy(QPointF(20, 20))
+        self.assertEqual(shape.extents(), (0, 0, 10, 10))
+        self.assertEqual(copy.extents(), (20, 20, 30, 30))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+from libs.spatialIndex import GridIndex
+
+
+class TestGridIndex(unittest.TestCase):
+
+    def test_queryReturnsTopmostFirst(self):
+        index = GridIndex(cellSize=10)
+        index.insert('bottom', (0, 0, 50, 50))
+        index.insert('top', (20, 20, 30, 30))
+        index.insert('far', (200, 200, 210, 210))
+        self.assertEqual(index.queryPoint(25, 25), ['top', 'bottom'])
+        self.assertEqual(index.queryPoint(5, 5), ['bottom'])
+        self.assertEqual(index.queryPoint(100, 100), [])
+        self.assertEqual(index.queryPoint(195, 195, margin=5), ['far'])
+        self.assertEqual(len(index.query((-1000, -1000, 1000, 1000))), 3)
+
+    def test_updateAndRemove(self):
+        index = GridIndex(cellSize=10)
+        index.insert('a', (0, 0, 5, 5))
+        index.insert('b', (0, 0, 5, 5))
+        index.update('a', (100, 100, 105, 105))
+        self.assertEqual(index.queryPoint(2, 2), ['b'])
+        self.assertEqual(index.queryPoint(102, 102), ['a'])
+        # Moving keeps the stacking order
+        index.update('a', (0, 0, 5, 5))
+        self.assertEqual(index.queryPoint(2, 2), ['b', 'a'])
+
+        index.remove('b')
+        index.update('unknown', (0, 0, 5, 5))
+        self.assertEqual(index.queryPoint(2, 2), ['a'])
+        self.assertNotIn('unknown', index)
+        self.assertEqual(len(index), 1)
+        index.remove('a')
+        self.assertEqual(index._cells, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
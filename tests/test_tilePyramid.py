@@ -0,0 +1,81 @@
+import unittest
+
+try:
+    from PyQt5.QtGui import QImage, QPainter, QColor, qRgb
+    from PyQt5.QtCore import QRectF
+except ImportError:
+    from PyQt4.QtGui import QImage, QPainter, QColor, qRgb
+    from PyQt4.QtCore import QRectF
+
+from libs.tilePyramid import TilePyramid
+
+
+class TestTilePyramid(unittest.TestCase):
+
+    def setUp(self):
+        # Four solid quadrants
+        self.image = QImage(1000, 600, QImage.Format_RGB32)
+        self.image.fill(QColor(255, 0, 0))
+        painter = QPainter(self.image)
+        painter.fillRect(500, 0, 500, 300, QColor(0, 255, 0))
+        painter.fillRect(0, 300, 500, 300, QColor(0, 0, 255))
+        painter.fillRect(500, 300, 500, 300, QColor(255, 255, 255))
+        painter.end()
+        self.pyramid = TilePyramid(self.image, tileSize=128)
+        self.pyramid.build()
+        self.pyramid.wait()
+
+    def render(self, scale, rect):
+        target = QImage(int(1000 * scale), int(600 * scale), QImage.Format_RGB32)
+        target.fill(0)
+        painter = QPainter(target)
+        painter.scale(scale, scale)
+        self.pyramid.draw(painter, rect, scale)
+        painter.end()
+        return target
+
+    def test_levels(self):
+        self.assertEqual(self.pyramid.levelCount, 4)
+        self.assertEqual(self.pyramid.levelForScale(2.0), 0)
+        self.assertEqual(self.pyramid.levelForScale(0.5), 1)
+        self.assertEqual(self.pyramid.levelForScale(0.3), 1)
+        self.assertEqual(self.pyramid.levelForScale(0.001), 3)
+        self.assertEqual(self.pyramid.levelImage(1).width(), 500)
+
+    def test_onlyExposedTilesAreDrawn(self):
+        self.assertEqual(self.pyramid.tilesIn(QRectF(0, 0, 100, 100), 0), [(0, 0)])
+        self.assertEqual(len(self.pyramid.tilesIn(QRectF(0, 0, 1000, 600), 0)), 8 * 5)
+        self.render(1.0, QRectF(520, 400, 50, 50))
+        self.assertEqual(list(self.pyramid._tiles), [(0, 4, 3)])
+
+    def test_drawsNearestReadyLevel(self):
+        # As if levels 1 and up were still being built
+        del self.pyramid._levels[1:]
+        self.assertEqual(self.pyramid.readyLevel(2), 0)
+        small = self.render(0.25, QRectF(0, 0, 1000, 600))
+        self.assertEqual(set(level for level, col, row in self.pyramid._tiles), set([0]))
+        self.assertEqual(small.pixel(230, 130), qRgb(255, 255, 255))
+
+    def test_cancel(self):
+        pyramid = TilePyramid(self.image, tileSize=16)
+        pyramid.cancel()
+        pyramid.build()
+        pyramid.wait()
+        self.assertEqual(pyramid.readyLevel(pyramid.levelCount - 1), 0)
+        pyramid = TilePyramid(self.image, tileSize=16)
+        pyramid.build()
+        pyramid.wait()
+        self.assertEqual(pyramid.readyLevel(pyramid.levelCount - 1), pyramid.levelCount - 1)
+
+    def test_drawMatchesImage(self):
+        full = self.render(1.0, QRectF(0, 0, 1000, 600))
+        self.assertEqual(full, self.image)
+
+        small = self.render(0.25, QRectF(0, 0, 1000, 600))
+        for x, y, color in ((20, 20, qRgb(255, 0, 0)), (230, 20, qRgb(0, 255, 0)),
+                            (20, 130, qRgb(0, 0, 255)), (230, 130, qRgb(255, 255, 255))):
+            self.assertEqual(small.pixel(x, y), color)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+import gc
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+try:
+    from PyQt5.QtWidgets import QApplication
+except ImportError:
+    from PyQt4.QtGui import QApplication
+
+from libs.undoJournal import JournalWriter, UndoJournal, readJournal, decodeEdit, decodeState, \
+    BASE, RECORD, UNDO, REDO, SAVED
+from libs.undoStack import UndoStack
+
+
+class Box(object):
+
+    def __init__(self, label, points):
+        self.label = label
+        self.points = points
+
+
+def state(box):
+    return (box.label, tuple(box.points), False, True)
+
+
+def apply(edit):
+    for _, box, (label, points, _, _) in edit.inserted:
+        box.label, box.points = label, list(points)
+    for box, _, (label, points, _, _) in edit.changed:
+        box.label, box.points = label, list(points)
+
+
+class TestUndoJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'UndoJournal', 'a.journal')
+        self.writer = JournalWriter()
+        self.shapes = [Box('a', [(0, 0), (1, 1)])]
+        self.stack = UndoStack(state, state)
+        self.stack.reset('open', self.shapes)
+        self.journal = UndoJournal(self.path, self.writer)
+        self.journal.begin(self.stack.root, self.stack.rootShapes())
+        self.stack.journal = self.journal
+
+    def tearDown(self):
+        self.writer.flush()
+        shutil.rmtree(self.tmpdir)
+
+    def edit(self):
+        self.shapes[0].points = [(2, 2), (3, 3)]
+        self.stack.record('move', self.shapes)
+        self.shapes.append(Box('b', [(5, 5), (6, 6)]))
+        self.stack.record('add', self.shapes)
+        self.shapes[1].label = 'c'
+        self.stack.record('rename', self.shapes)
+        self.stack.undo(lambda edit: (edit.applyTo(self.shapes), apply(edit)))
+
+    def replay(self, frames):
+        """Final shape states and stack rebuilt from frames."""
+        boxes = {}
+
+        def shapeFor(id, state):
+            if id not in boxes:
+                boxes[id] = Box(state[0], list(state[1]))
+            return boxes[id]
+
+        base = frames[0][1]
+        shapes = [shapeFor(id, decodeState(s)) for id, s in base['shapes']]
+        stack = UndoStack(state, state)
+        stack.reset(base['root'], shapes)
+
+        def applyEdit(edit):
+            edit.applyTo(shapes)
+            apply(edit)
+        for kind, payload in frames[1:]:
+            if kind == RECORD:
+                stack.push(decodeEdit(payload, shapeFor), applyEdit)
+            elif kind == UNDO:
+                stack.undo(applyEdit)
+            elif kind == REDO:
+                stack.redo(applyEdit)
+        return [state(box) for box in shapes], stack
+
+    def test_replayRestoresStateAndHistory(self):
+        self.assertFalse(os.path.exists(self.path))
+        self.edit()
+        self.writer.flush()
+        frames = readJournal(self.path)
+        self.assertEqual([kind for kind, _ in frames], [BASE, RECORD, RECORD, RECORD, UNDO])
+
+        states, stack = self.replay(frames)
+        self.assertEqual(states, [state(box) for box in self.shapes])
+        self.assertEqual(stack.names(), self.stack.names())
+        self.assertEqual(stack.position(), self.stack.position())
+
+    def test_tornTailIsIgnored(self):
+        self.edit()
+        self.writer.flush()
+        with open(self.path, 'rb+') as f:
+            f.truncate(os.path.getsize(self.path) - 3)
+        frames = readJournal(self.path)
+        self.assertEqual([kind for kind, _ in frames], [BASE, RECORD, RECORD, RECORD])
+        states, _ = self.replay(frames)
+        self.assertEqual(states[1][0], 'c')
+        self.assertIsNone(readJournal(os.path.join(self.tmpdir, 'missing.journal')))
+
+    def test_compact(self):
+        self.edit()
+        for _ in range(20):
+            self.stack.undo(lambda edit: (edit.applyTo(self.shapes), apply(edit)))
+            self.stack.redo(lambda edit: (edit.applyTo(self.shapes), apply(edit)))
+        self.writer.flush()
+        before = os.path.getsize(self.path)
+
+        self.journal.compact(self.stack, (12, 34))
+        self.writer.flush()
+        self.assertLess(os.path.getsize(self.path), before)
+        frames = readJournal(self.path)
+        self.assertEqual(frames[-1], (SAVED, [12, 34]))
+        states, stack = self.replay(frames)
+        self.assertEqual(states, [state(box) for box in self.shapes])
+        self.assertEqual(stack.names(), ['open', 'move', 'add', 'rename'])
+        self.assertTrue(stack.canRedo())
+
+        # Appends continue the compacted journal
+        self.stack.redo(lambda edit: (edit.applyTo(self.shapes), apply(edit)))
+        self.writer.flush()
+        self.assertEqual(readJournal(self.path)[-1][0], REDO)
+
+        while self.stack.canUndo():
+            self.stack.undo(lambda edit: (edit.applyTo(self.shapes), apply(edit)))
+        self.stack.reset('open', self.shapes)
+        self.journal.compact(self.stack, None)
+        self.writer.flush()
+        self.assertFalse(os.path.exists(self.path))
+
+
+class TestJournalWriter(unittest.TestCase):
+
+    app = None
+
+    @classmethod
+    def setUpClass(cls):
+        if QApplication.instance() is None:
+            cls.app = QApplication([])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app = None
+        gc.collect()
+
+    def test_failuresAreReported(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            # A file where the journal directory should be
+            blocked = os.path.join(tmpdir, 'UndoJournal')
+            open(blocked, 'wb').close()
+            writer = JournalWriter()
+            failed = []
+            writer.failed.connect(lambda path, reason: failed.append(path))
+            path = os.path.join(blocked, 'a.journal')
+            writer.append(path, b'x')
+            writer.replace(path, b'y')
+            writer.append(os.path.join(tmpdir, 'ok.journal'), b'x')
+            writer.flush()
+            QApplication.processEvents()
+            self.assertEqual(failed, [path, path])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_waitOnlyWaitsForItsPath(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        writer = JournalWriter()
+        release = threading.Event()
+        first = os.path.join(tmpdir, 'a.journal')
+        other = os.path.join(tmpdir, 'b.journal')
+
+        def stamped():
+            # Like a compact waiting for its annotation to be saved
+            release.wait()
+            return b'x'
+        writer.replace(first, stamped)
+        start = time.time()
+        writer.wait(other)
+        self.assertLess(time.time() - start, 1)
+        self.assertFalse(os.path.exists(first))
+
+        threading.Timer(0.1, release.set).start()
+        writer.wait(first)
+        self.assertEqual(readJournal(first), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+from libs.undoStack import UndoStack
+
+
+class Box(object):
+
+    def __init__(self, label, x):
+        self.label = label
+        self.x = x
+
+
+def state(box):
+    return (box.label, box.x)
+
+
+class TestUndoStack(unittest.TestCase):
+
+    def setUp(self):
+        self.shapes = [Box('a', 0), Box('b', 1), Box('c', 2)]
+        self.stack = UndoStack(state, state, limit=3)
+        self.stack.reset('open', self.shapes)
+
+    def apply(self, edit):
+        edit.applyTo(self.shapes)
+        for _, box, (label, x) in edit.inserted:
+            box.label, box.x = label, x
+        for box, _, (label, x) in edit.changed:
+            box.label, box.x = label, x
+
+    def snapshot(self):
+        return [state(box) for box in self.shapes]
+
+    def test_recordsOnlyTouchedShapes(self):
+        self.shapes[1].x = 10
+        edit = self.stack.record('move', self.shapes)
+        self.assertEqual(edit.changed, [(self.shapes[1], ('b', 1), ('b', 10))])
+        self.assertEqual((edit.removed, edit.inserted), ([], []))
+
+        merged = self.shapes[0]
+        merged.x = 5
+        del self.shapes[1:]
+        self.shapes.append(Box('d', 3))
+        edit = self.stack.record('merge', self.shapes)
+        self.assertEqual([(i, s.label) for i, s, _ in edit.removed], [(1, 'b'), (2, 'c')])
+        self.assertEqual([(i, s.label) for i, s, _ in edit.inserted], [(1, 'd')])
+        self.assertEqual(len(edit.changed), 1)
+
+    def test_undoRedoRoundTrip(self):
+        states = [self.snapshot()]
+        self.shapes[2].label = 'z'
+        self.stack.record('rename', self.shapes)
+        states.append(self.snapshot())
+        del self.shapes[0]
+        self.stack.record('delete', self.shapes)
+        states.append(self.snapshot())
+        self.shapes.insert(1, Box('e', 4))
+        self.stack.record('insert', self.shapes)
+        states.append(self.snapshot())
+        self.assertEqual(self.stack.names(), ['open', 'rename', 'delete', 'insert'])
+
+        for expected in reversed(states[:-1]):
+            self.stack.undo(self.apply)
+            self.assertEqual(self.snapshot(), expected)
+        self.assertFalse(self.stack.canUndo())
+        self.assertEqual(self.stack.position(), 0)
+
+        for expected in states[1:]:
+            self.stack.redo(self.apply)
+            self.assertEqual(self.snapshot(), expected)
+        self.assertFalse(self.stack.canRedo())
+
+        # Undone shapes keep being tracked after they come back
+        self.stack.undo(self.apply)
+        self.stack.undo(self.apply)
+        self.shapes[0].x = 7
+        edit = self.stack.record('move', self.shapes)
+        self.assertEqual(len(edit), 1)
+        self.assertEqual(self.stack.names(), ['open', 'rename', 'move'])
+
+    def test_historyIsCapped(self):
+        for x in range(10):
+            self.shapes[0].x = x + 100
+            self.stack.record('move %d' % x, self.shapes)
+        self.assertEqual(self.stack.names(), ['open', 'move 7', 'move 8', 'move 9'])
+        while self.stack.canUndo():
+            self.stack.undo(self.apply)
+        self.assertEqual(self.shapes[0].x, 106)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,15 @@
 import os
+import random
+import re
 import sys
 import unittest
-from libs.utils import struct, newAction, newIcon, addActions, fmtShortcut, generateColorByText, natural_sort
+from libs.utils import struct, newAction, newIcon, addActions, fmtShortcut, generateColorByText, natural_sort, \
+    natural_key, natural_merge
+
+
+def legacyNaturalKey(s):
+    """natural_key as a list, before it was encoded into one string."""
+    return [int(c) if c.isdigit() else c for c in re.split('([0-9]+)', s)]
 
 class TestUtils(unittest.TestCase):
 
@@ -18,5 +26,22 @@ class TestUtils(unittest.TestCase):
         for idx, val in enumerate(l1):
             self.assertTrue(val == exptected_l1[idx])
 
+    def test_naturalKey_matchesList(self):
+        rng = random.Random(5)
+        alphabet = 'aB._/ -0123456789\u00e9'
+        for _ in range(20000):
+            a, b = [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 8))) for _ in range(2)]
+            self.assertEqual(natural_key(a) < natural_key(b), legacyNaturalKey(a) < legacyNaturalKey(b), (a, b))
+            self.assertEqual(natural_key(a) == natural_key(b), legacyNaturalKey(a) == legacyNaturalKey(b), (a, b))
+
+    def test_naturalMerge(self):
+        items = ['f1', 'f3', 'f3', 'f11']
+        newItems = ['f12', 'f03', 'f0', 'f2']
+        merged, keys = natural_merge(items, [natural_key(s) for s in items],
+                                     newItems, [natural_key(s) for s in newItems])
+        self.assertEqual(merged, ['f0', 'f1', 'f2', 'f3', 'f3', 'f03', 'f11', 'f12'])
+        self.assertEqual(keys, [natural_key(s) for s in merged])
+        self.assertEqual(natural_merge([], [], [], []), ([], []))
+
 if __name__ == '__main__':
     unittest.main()